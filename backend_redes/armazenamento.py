@@ -0,0 +1,89 @@
+# armazenamento.py
+"""
+Acesso ao SQLite comum aos três backends (mesmo arquivo em cada um; o database.py
+de cada backend só informa o caminho do banco).
+- WAL: o ETL grava enquanto a API segue lendo a versão anterior, sem "database is locked".
+- Pragmas por conexão: cache_size e mmap_size maiores, synchronous=NORMAL (seguro em WAL)
+  e tabelas temporárias em memória.
+- Escrita: um único writer (pool de 1 conexão), usado pelo ETL e pelas migrações da subida.
+- Leitura: pool de conexões read-only (mode=ro) para o tráfego da API, sync e async (aiosqlite).
+"""
+
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
+
+CACHE_KIB = int(os.getenv("LEDAX_SQLITE_CACHE_MB", "64")) * 1024
+MMAP_BYTES = int(os.getenv("LEDAX_SQLITE_MMAP_MB", "256")) * 1024 * 1024
+POOL_LEITURA = int(os.getenv("LEDAX_POOL_LEITURA", "8"))
+BUSY_TIMEOUT_S = 30
+
+
+def _pragmas(escrita):
+    pragmas = [
+        f"PRAGMA cache_size = -{CACHE_KIB}",
+        f"PRAGMA mmap_size = {MMAP_BYTES}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if escrita:
+        # journal_mode fica gravado no arquivo; conexões read-only não podem alterá-lo
+        pragmas = ["PRAGMA journal_mode = WAL", "PRAGMA synchronous = NORMAL"] + pragmas
+    return pragmas
+
+
+def _configurar(engine, escrita):
+    comandos = _pragmas(escrita)
+
+    @event.listens_for(engine, "connect")
+    def _ao_conectar(conexao, _registro):
+        cursor = conexao.cursor()
+        for comando in comandos:
+            cursor.execute(comando)
+        cursor.close()
+
+    return engine
+
+
+def _url_leitura(db_path, dialeto="sqlite"):
+    return f"{dialeto}:///file:{db_path}?mode=ro&uri=true"
+
+
+def criar_engine_escrita(db_path):
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False, "timeout": BUSY_TIMEOUT_S},
+        poolclass=QueuePool, pool_size=1, max_overflow=0,
+    )
+    return _configurar(engine, escrita=True)
+
+
+def criar_engine_leitura(db_path):
+    engine = create_engine(
+        _url_leitura(db_path),
+        connect_args={"check_same_thread": False, "timeout": BUSY_TIMEOUT_S},
+        poolclass=QueuePool, pool_size=POOL_LEITURA, max_overflow=POOL_LEITURA,
+    )
+    return _configurar(engine, escrita=False)
+
+
+def criar_engine_async_leitura(db_path):
+    engine = create_async_engine(
+        _url_leitura(db_path, "sqlite+aiosqlite"),
+        connect_args={"timeout": BUSY_TIMEOUT_S},
+        pool_size=POOL_LEITURA, max_overflow=POOL_LEITURA,
+    )
+    _configurar(engine.sync_engine, escrita=False)
+    return engine
+
+
+def stat_banco(db_path):
+    """(mtime_ns, tamanho) do banco somando o -wal: em WAL as gravações só chegam ao .db no checkpoint."""
+    st = os.stat(db_path)
+    mtime, tamanho = st.st_mtime_ns, st.st_size
+    try:
+        wal = os.stat(db_path + "-wal")
+        mtime, tamanho = max(mtime, wal.st_mtime_ns), tamanho + wal.st_size
+    except OSError:
+        pass
+    return mtime, tamanho
@@ -1,14 +1,18 @@
 # etl.py
 
+import argparse
 import os
 import re
-import json
 import time
 import pandas as pd
 from sqlalchemy import Column, Boolean # Importação extra para a verificação, caso o models não esteja disponível
 from sqlalchemy.orm import sessionmaker
-from database import Base, engine 
+from database import Base, engine, nova_versao_dataset
 from models import LojaRede
+from migracoes import aplicar_migracoes
+import espacial
+import geocache
+import incremental
 from geopy.geocoders import Nominatim
 from geopy.extra.rate_limiter import RateLimiter
 from tqdm import tqdm
@@ -16,7 +20,6 @@ from tqdm import tqdm
 # ---------------------------
 # Config
 # ---------------------------
-GEOCACHE_PATH = "data/redes_geocache.json" 
 EXCEL_PATH = "data/MAPEAMENTO_REDES.xlsx"
 SAVE_CACHE_EVERY = 100
 USER_AGENT = "ledax-redes-etl/1.0"
@@ -25,18 +28,14 @@ geolocator = Nominatim(user_agent=USER_AGENT, timeout=10)
 # Limite a 1 requisição a cada 1.5 segundos
 geocode_remote = RateLimiter(geolocator.geocode, min_delay_seconds=1.5) 
 
-GEOCACHE = {}
-if os.path.exists(GEOCACHE_PATH):
-    with open(GEOCACHE_PATH, "r", encoding="utf-8") as f:
-        GEOCACHE = json.load(f)
+# Colunas da planilha lidas pelo ETL: o hash da linha (carga incremental) cobre só estas
+COLUNAS_ORIGEM = (
+    "rede", "loja", "endere_o", "endereço", "cnpj", "ltimo_pv", "data_da_ltima_venda", "valor",
+    "funil_da_ltima_venda", "checklist_de_projeto_ltima_venda",
+)
 
-def save_cache(path=GEOCACHE_PATH):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(GEOCACHE, f, ensure_ascii=False, indent=4)
-
-def chave_cache(tipo, valor):
-    return f"{tipo}::{valor.strip().upper()}"
+# Cache SQLite compartilhado com os outros ETLs (ver geocache.py)
+GEOCACHE = geocache.Geocache()
 
 # ---------------------------
 # Geocoding Único (Endereço)
@@ -46,11 +45,9 @@ def geocode_loja(endereco):
     Geocodifica o endereço da loja (prioridade única) usando cache.
     """
     if isinstance(endereco, str) and endereco.strip():
-        chave = chave_cache("ENDERECO_LOJA", endereco.strip())
-        
-        if chave in GEOCACHE:
-            lat, lon, endereco_g = GEOCACHE[chave]
-            return lat, lon, endereco_g
+        c = GEOCACHE.obter("NOMINATIM", endereco.strip())
+        if c is not None:
+            return c["lat"], c["lon"], c["endereco"]
 
         try:
             location = geocode_remote(endereco.strip())
@@ -59,19 +56,45 @@ def geocode_loja(endereco):
                 lon = location.longitude
                 endereco_g = location.address
                 
-                GEOCACHE[chave] = [lat, lon, endereco_g]
+                GEOCACHE.gravar("NOMINATIM", endereco.strip(), lat, lon, endereco=endereco_g)
                 return lat, lon, endereco_g
+            GEOCACHE.gravar("NOMINATIM", endereco.strip())
         except Exception as e:
             print(f"⚠️ Erro no Nominatim para '{endereco}': {e}")
             time.sleep(5) 
 
     return None, None, None
 
+def geocodificar_enderecos(enderecos):
+    """
+    (lat, lon, endereço geocodificado) de cada endereço da lista, buscando cada endereço
+    distinto (mesma chave de cache) uma vez só e juntando o resultado de volta às linhas
+    pelos códigos do pd.factorize.
+    """
+    chaves = pd.Series([
+        geocache.normalizar(e) if isinstance(e, str) and e.strip() else None for e in enderecos
+    ], dtype=object)
+    codigos, distintas = pd.factorize(chaves)
+    representante = {}
+    for endereco, chave in zip(enderecos, chaves):
+        if chave is not None:
+            representante.setdefault(chave, endereco)
+
+    resolvidos = []
+    for n, chave in enumerate(tqdm(distintas, desc=f"Geocoding ({len(distintas)} endereços distintos)"), start=1):
+        resolvidos.append(geocode_loja(representante[chave]))
+        if n % SAVE_CACHE_EVERY == 0:
+            GEOCACHE.salvar()
+    GEOCACHE.salvar()
+
+    resolvidos.append((None, None, None)) # código -1: linha sem endereço
+    return [resolvidos[c] for c in codigos]
+
 
 # ---------------------------
 # Processamento Principal
 # ---------------------------
-def processar_excel_redes(excel_path=EXCEL_PATH): 
+def processar_excel_redes(excel_path=EXCEL_PATH, completo=False):
     print(f"\n===== PROCESSANDO: {excel_path} (Lojas de Rede) =====")
     
     try:
@@ -83,16 +106,36 @@ def processar_excel_redes(excel_path=EXCEL_PATH):
     # Normalizar nomes das colunas
     df.columns = [re.sub(r"[^a-z0-9]+", "_", c.lower()) for c in df.columns]
     
+    # Caches JSON dos ETLs antigos (idempotente: o que já está no geocache é mantido)
+    GEOCACHE.importar_legados()
+
+    # Carga incremental (ver incremental.py): só linhas novas/alteradas são geocodificadas
+    # e inseridas; lojas que sumiram da planilha saem do banco na mesma transação dos inserts
+    linhas = [row for _, row in df.iterrows()]
+    hashes = [incremental.hash_linha(row, COLUNAS_ORIGEM) for row in linhas]
+    with engine.connect() as conn:
+        a_inserir, a_apagar = incremental.planejar(conn, LojaRede, hashes, completo)
+    print(incremental.resumo(len(linhas), a_inserir, a_apagar))
+    if not a_inserir and not a_apagar:
+        print("✅ Nada mudou na planilha: banco e versão do dataset mantidos.")
+        return
+    linhas = [linhas[i] for i in a_inserir]
+    hashes = [hashes[i] for i in a_inserir]
+
     Session = sessionmaker(bind=engine)
     db = Session()
     
     try:
-        for idx, row in tqdm(df.iterrows(), total=len(df), desc="Processando Lojas de Rede"):
+        # Tenta a forma normalizada ou com acento para endereço
+        enderecos = [row.get("endere_o") or row.get("endereço") for row in linhas]
+        coordenadas = geocodificar_enderecos(enderecos)
+
+        for idx, (row, h, endereco_loja, (lat, lon, endereco_usado)) in enumerate(
+            tqdm(zip(linhas, hashes, enderecos, coordenadas), total=len(linhas), desc="Processando Lojas de Rede")
+        ):
             
             rede = row.get("rede")
             loja = row.get("loja")
-            # Tenta a forma normalizada ou com acento para endereço
-            endereco_loja = row.get("endere_o") or row.get("endereço") 
             cnpj = row.get("cnpj")
             ultimo_pv = row.get("ltimo_pv")
             data_venda = row.get("data_da_ltima_venda")
@@ -121,24 +164,25 @@ def processar_excel_redes(excel_path=EXCEL_PATH):
             teve_venda_final = bool(houve_valor or houve_data) 
             # ===========================================
             
-            lat, lon, endereco_usado = geocode_loja(endereco_loja) 
-            
             loja_rede = LojaRede(
                 rede=rede, loja=loja, endereco=endereco_loja, cnpj=cnpj,
                 ultimo_pv=ultimo_pv, data_ultima_venda=data_formatada, valor=valor,
                 funil_ultima_venda=funil, checklist_projeto=checklist,
-                endereco_usado_geocode=endereco_usado, latitude=lat, longitude=lon,
+                endereco_usado_geocode=endereco_usado, hash_origem=h, latitude=lat, longitude=lon,
                 teve_venda=teve_venda_final # NOVO CAMPO ATUALIZADO
             )
 
             db.add(loja_rede)
 
-            if (idx + 1) % SAVE_CACHE_EVERY == 0:
-                db.commit()
-                save_cache() 
-
-        db.commit() 
-        save_cache() 
+        # Um commit só (inserts + deletes): com erro no meio, o rollback abaixo desfaz tudo
+        incremental.apagar(db, LojaRede, a_apagar)
+        db.commit()
+        aplicar_migracoes(engine)
+        # Índice espacial (R*Tree) do filtro bbox: refeito na carga completa (o drop_all apagou
+        # os triggers); na incremental os triggers já acompanharam os inserts/deletes
+        espacial.garantir_rtree(engine, LojaRede.__tablename__, reconstruir=completo)
+        # Nova versão do dataset: a API descarta caches e ETags da carga anterior
+        nova_versao_dataset()
 
     except Exception as e:
         print(f"\n🚨 ERRO FATAL ao processar Lojas de Rede. Rollback: {e}")
@@ -151,8 +195,16 @@ def processar_excel_redes(excel_path=EXCEL_PATH):
 # Execução Principal
 # ---------------------------
 if __name__ == "__main__":
-    # Limpa e recria todas as tabelas
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
-    
-    processar_excel_redes(EXCEL_PATH)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Carga das lojas de rede a partir da planilha")
+    parser.add_argument("--completo", action="store_true", help="apaga e recria as tabelas antes da carga")
+    args = parser.parse_args()
+
+    if args.completo:
+        # Limpa e recria todas as tabelas
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+    else:
+        # Tabelas e colunas novas (bancos antigos); os índices ficam para depois da carga
+        aplicar_migracoes(engine, indices=False)
+
+    processar_excel_redes(EXCEL_PATH, completo=args.completo)
\ No newline at end of file
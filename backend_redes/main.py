@@ -1,8 +1,17 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException, Response, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLeitura, engine, engine_leitura, versao_dataset, get_async_db
 from models import LojaRede
+from typing import Optional
+import tiles
+import streaming
+import formatos
+import cache_http
+import espacial
+from migracoes import aplicar_migracoes
 
 # Removido: Imports de arquivos estáticos (os, StaticFiles, FileResponse) 
 # pois agora o Vue (frontend) roda separado em desenvolvimento.
@@ -28,12 +37,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def startup_event():
+    # Garante tabelas e índices declarados em models.py (e o R*Tree do filtro bbox)
+    aplicar_migracoes(engine)
+    espacial.garantir_rtree(engine, LojaRede.__tablename__)
+
 # ----------------------------------------------------
 # 2. Dependency Injection
 # ----------------------------------------------------
 
 def get_db():
-    db = SessionLocal()
+    db = SessionLeitura()
     try:
         yield db
     finally:
@@ -43,20 +58,11 @@ def get_db():
 # 3. Rotas da API
 # ----------------------------------------------------
 
-@app.get("/api/lojas_rede/")
-def get_lojas_rede(db: Session = Depends(get_db)):
-    """
-    Endpoint consumido pelo RedesView.vue
-    Retorna JSON com as lojas e status de venda.
-    """
-    # Filtra apenas os registros que possuem coordenadas
-    lojas = db.query(LojaRede).filter(
-        LojaRede.latitude != None, 
-        LojaRede.longitude != None
-    ).all()
+# ETag + Cache-Control das listas (revalidadas a cada uso; 304 enquanto o ETL não rodar)
+cache_dados = cache_http.condicional("public, no-cache")
 
-    # Retorna lista de dicionários (JSON array)
-    return [{
+def loja_para_dict(loja):
+    return {
         "id": loja.id,
         "rede": loja.rede,
         "loja": loja.loja,
@@ -67,10 +73,93 @@ def get_lojas_rede(db: Session = Depends(get_db)):
         "longitude": loja.longitude,
         "teve_venda": loja.teve_venda, 
         "funil_ultima_venda": loja.funil_ultima_venda 
-    } for loja in lojas]
+    }
+
+def filtro_lojas(bbox=None):
+    # Filtra apenas os registros que possuem coordenadas (e, com bbox, só os do viewport)
+    return (
+        LojaRede.latitude != None, LojaRede.longitude != None,
+        *espacial.condicoes_bbox(LojaRede, bbox, engine_leitura),
+    )
+
+def query_lojas(db, bbox=None):
+    return db.query(LojaRede).filter(*filtro_lojas(bbox))
+
+async def listar_lojas(db, bbox=None):
+    resultado = await db.execute(select(LojaRede).where(*filtro_lojas(bbox)))
+    return resultado.scalars().all()
+
+@app.get("/api/lojas_rede/")
+async def get_lojas_rede(
+    request: Request,
+    stream: bool = Query(False),
+    bbox: Optional[str] = Query(None, description="Viewport: minLon,minLat,maxLon,maxLat"),
+    db: AsyncSession = Depends(get_async_db),
+    cache: dict = Depends(cache_dados)
+):
+    """
+    Endpoint consumido pelo RedesView.vue
+    Retorna JSON com as lojas e status de venda.
+    Com `?stream=1` ou `Accept: application/x-ndjson` responde em NDJSON (uma loja por linha);
+    com Accept msgpack/Arrow responde colunar binário (ver formatos.py).
+    Com `bbox=minLon,minLat,maxLon,maxLat` traz só as lojas do viewport.
+    """
+    bbox = espacial.parse_bbox(bbox)
+    formato = formatos.formato_pedido(request)
+    if formato:
+        registros = [loja_para_dict(loja) for loja in await listar_lojas(db, bbox)]
+        nomes = list(registros[0]) if registros else ["id"]
+        colunas = formatos.registros_para_colunas(registros, nomes, {"rede", "funil_ultima_venda"})
+        return cache_http.aplicar(formatos.resposta_colunar(colunas, formato), cache)
+
+    if streaming.quer_stream(request, stream):
+        return cache_http.aplicar(streaming.resposta_ndjson(
+            streaming.consulta_em_lotes(SessionLeitura, lambda sessao: query_lojas(sessao, bbox), loja_para_dict)
+        ), cache)
+
+    # Retorna lista de dicionários (JSON array)
+    return [loja_para_dict(loja) for loja in await listar_lojas(db, bbox)]
+
+# ----------------------------------------------------
+# 4. Vector Tiles (MVT)
+# ----------------------------------------------------
+cache_tiles = tiles.CacheTiles()
+
+@app.get("/tiles/{layer}/{z}/{x}/{y}.pbf")
+def get_tile(
+    layer: str, z: int, x: int, y: int, db: Session = Depends(get_db), cache: dict = Depends(cache_dados)
+):
+    """
+    Tile MVT com as lojas visíveis (mesmos atributos usados no popup do RedesView.vue).
+    ETag da versão do dataset, como nas listas (um ETL novo invalida o tile no cliente).
+    """
+    if layer != "lojas_rede":
+        raise HTTPException(status_code=404, detail="Camada desconhecida")
+    if not tiles.tile_valido(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile fora do intervalo")
+
+    chave = (versao_dataset(), layer, z, x, y)
+    pbf = cache_tiles.get(chave)
+    if pbf is None:
+        min_lon, min_lat, max_lon, max_lat = tiles.tile_bbox(z, x, y)
+        lojas = db.query(LojaRede).filter(
+            LojaRede.longitude.between(min_lon, max_lon),
+            LojaRede.latitude.between(min_lat, max_lat),
+        )
+        feicoes = ((loja.id, loja.longitude, loja.latitude, {
+            "rede": loja.rede,
+            "loja": loja.loja,
+            "data_venda": loja.data_ultima_venda.isoformat() if loja.data_ultima_venda else None,
+            "teve_venda": loja.teve_venda,
+            "funil_ultima_venda": loja.funil_ultima_venda,
+        }) for loja in lojas)
+        pbf = tiles.codificar_camada(layer, feicoes, z, x, y)
+        cache_tiles.set(chave, pbf)
+
+    return cache_http.aplicar(Response(content=pbf, media_type=tiles.MEDIA_TYPE), cache)
 
 # ----------------------------------------------------
-# 4. Rota de Teste (Opcional)
+# 5. Rota de Teste (Opcional)
 # ----------------------------------------------------
 @app.get("/")
 def root():
@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Float, Date, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, Boolean, Index, text
 from database import Base
 
 # =============================================================
@@ -23,8 +23,17 @@ class LojaRede(Base):
 
     # Coordenadas finais (obtidas via geocoding)
     endereco_usado_geocode = Column(String)
+    # Hash da linha da planilha de origem (carga incremental, ver incremental.py)
+    hash_origem = Column(String)
     latitude = Column(Float)
     longitude = Column(Float)
     teve_venda = Column(Boolean, default=False, nullable=False)
+
+    # Índices para os filtros da API (ver migracoes.py)
+    __table_args__ = (
+        Index("ix_lojas_rede_rede", "rede", sqlite_where=text("latitude IS NOT NULL AND longitude IS NOT NULL")),
+        Index("ix_lojas_rede_lon_lat", "longitude", "latitude"),
+    )
+
     def __repr__(self):
         return f"<LojaRede(rede='{self.rede}', loja='{self.loja}', teve_venda={self.teve_venda})>"
\ No newline at end of file
@@ -0,0 +1,155 @@
+# tiles.py
+"""
+Mapbox Vector Tiles (MVT 2.1) para camadas de pontos.
+- Codificador protobuf mínimo (só geometria POINT), sem dependências externas.
+- Cache LRU por tile; a chave inclui a versão do banco, então um novo ETL invalida tudo.
+"""
+
+import math
+import struct
+import threading
+from collections import OrderedDict
+
+EXTENT = 4096
+# Margem (em unidades do extent) para que marcadores na borda não sejam cortados
+BUFFER = 64
+MAX_ZOOM = 22
+MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+
+# ---------------------------
+# Geometria do tile
+# ---------------------------
+def tile_valido(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+def _lat_do_tile(y, n):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+def tile_bbox(z, x, y, buffer=BUFFER):
+    """(min_lon, min_lat, max_lon, max_lat) do tile, já com a margem do buffer."""
+    n = 2 ** z
+    folga = buffer / EXTENT
+    min_lon = (x - folga) / n * 360.0 - 180.0
+    max_lon = (x + 1 + folga) / n * 360.0 - 180.0
+    max_lat = _lat_do_tile(max(y - folga, 0), n)
+    min_lat = _lat_do_tile(min(y + 1 + folga, n), n)
+    return min_lon, min_lat, max_lon, max_lat
+
+def _projetar(lon, lat, z, x, y):
+    """lon/lat -> coordenadas inteiras dentro do tile (0..EXTENT)."""
+    n = 2 ** z
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    sen = math.sin(math.radians(lat))
+    mx = (lon + 180.0) / 360.0 * n
+    my = (0.5 - math.log((1 + sen) / (1 - sen)) / (4 * math.pi)) * n
+    return int(round((mx - x) * EXTENT)), int(round((my - y) * EXTENT))
+
+
+# ---------------------------
+# Protobuf
+# ---------------------------
+def _varint(v):
+    out = bytearray()
+    while True:
+        b = v & 0x7F
+        v >>= 7
+        if v:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+def _zigzag(v):
+    return (v << 1) ^ (v >> 63)
+
+def _campo_varint(num, v):
+    return _varint(num << 3) + _varint(v)
+
+def _campo_bytes(num, payload):
+    return _varint((num << 3) | 2) + _varint(len(payload)) + payload
+
+def _packed(num, valores):
+    return _campo_bytes(num, b"".join(_varint(v) for v in valores))
+
+def _valor(v):
+    """Mensagem Value do MVT."""
+    if isinstance(v, bool):
+        return _campo_varint(7, int(v))
+    if isinstance(v, int):
+        return _campo_varint(6, _zigzag(v))
+    if isinstance(v, float):
+        return _varint((3 << 3) | 1) + struct.pack("<d", v)
+    return _campo_bytes(1, str(v).encode("utf-8"))
+
+
+def codificar_camada(nome, feicoes, z, x, y):
+    """
+    Codifica uma camada MVT de pontos.
+    `feicoes`: iterável de (id, lon, lat, props: dict).
+    """
+    chaves, idx_chaves = [], {}
+    valores, idx_valores = [], {}
+    corpo = []
+
+    for fid, lon, lat, props in feicoes:
+        tags = []
+        for k, v in props.items():
+            if v is None:
+                continue
+            if k not in idx_chaves:
+                idx_chaves[k] = len(chaves)
+                chaves.append(k)
+            chave_valor = (type(v), v)
+            if chave_valor not in idx_valores:
+                idx_valores[chave_valor] = len(valores)
+                valores.append(v)
+            tags += [idx_chaves[k], idx_valores[chave_valor]]
+
+        px, py = _projetar(lon, lat, z, x, y)
+        geometria = [(1 & 0x7) | (1 << 3), _zigzag(px), _zigzag(py)]  # MoveTo(1)
+
+        feicao = b""
+        if fid is not None:
+            feicao += _campo_varint(1, int(fid))
+        if tags:
+            feicao += _packed(2, tags)
+        feicao += _campo_varint(3, 1)  # GeomType.POINT
+        feicao += _packed(4, geometria)
+        corpo.append(_campo_bytes(2, feicao))
+
+    if not corpo:
+        return b""
+
+    camada = _campo_varint(15, 2) + _campo_bytes(1, nome.encode("utf-8"))
+    camada += b"".join(corpo)
+    camada += b"".join(_campo_bytes(3, k.encode("utf-8")) for k in chaves)
+    camada += b"".join(_campo_bytes(4, _valor(v)) for v in valores)
+    camada += _campo_varint(5, EXTENT)
+    return _campo_bytes(3, camada)
+
+
+# ---------------------------
+# Cache
+# ---------------------------
+class CacheTiles:
+    """LRU simples e thread-safe para tiles já codificados."""
+
+    def __init__(self, max_itens=4096):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            pbf = self._itens.get(chave)
+            if pbf is not None:
+                self._itens.move_to_end(chave)
+            return pbf
+
+    def set(self, chave, pbf):
+        with self._lock:
+            self._itens[chave] = pbf
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
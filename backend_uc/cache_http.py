@@ -0,0 +1,54 @@
+# cache_http.py
+"""
+GET condicional (ETag / If-None-Match) nos endpoints de dados.
+- O ETag é forte: deriva da versão do dataset (gravada pelo etl.py), da rota, da query
+  string e do Accept. Mesma URL na mesma versão => mesmos bytes.
+- Se o cliente já tem a versão atual, responde 304 sem corpo e sem consultar o banco.
+- Cache-Control com no-cache: o navegador guarda a resposta, mas revalida a cada uso
+  (um 304 barato enquanto nenhum ETL rodar).
+"""
+
+import hashlib
+from fastapi import HTTPException, Request, Response
+from database import versao_dataset
+
+
+def gerar_etag(request, versao):
+    partes = (
+        str(versao),
+        request.url.path,
+        repr(sorted(request.query_params.multi_items())),
+        request.headers.get("accept", ""),
+    )
+    return '"{}"'.format(hashlib.sha1("\n".join(partes).encode("utf-8")).hexdigest())
+
+
+def _casa(if_none_match, etag):
+    # If-None-Match usa comparação fraca (RFC 9110): W/"x" casa com "x"
+    if if_none_match.strip() == "*":
+        return True
+    tags = (t.strip() for t in if_none_match.split(","))
+    return any(t.removeprefix("W/") == etag for t in tags)
+
+
+def condicional(cache_control, vary="Accept"):
+    """
+    Cria a dependência FastAPI dos endpoints cacheáveis: levanta 304 se o If-None-Match
+    já tem o ETag atual; senão devolve os headers de cache. Quando o endpoint retorna dados,
+    o FastAPI aplica os headers sozinho; quando monta um Response, deve usar `aplicar`.
+    É async (só lê o arquivo de versão) para não ocupar uma thread do threadpool.
+    """
+    async def dependencia(request: Request, response: Response):
+        etag = gerar_etag(request, versao_dataset())
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": vary}
+        if _casa(request.headers.get("if-none-match", ""), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return headers
+    return dependencia
+
+
+def aplicar(resposta, headers):
+    """Copia os headers de cache para um Response montado pelo próprio endpoint."""
+    resposta.headers.update(headers)
+    return resposta
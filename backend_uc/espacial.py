@@ -0,0 +1,127 @@
+# espacial.py
+"""
+Índice espacial (SQLite R*Tree) para o filtro `bbox` dos endpoints de pontos.
+- Tabela virtual `<tabela>_rtree` (id, min_lon, max_lon, min_lat, max_lat), uma caixa
+  degenerada por ponto com coordenadas.
+- Triggers mantêm o índice em sincronia com inserts/updates/deletes; o ETL ainda faz um
+  rebuild no final da carga (e cobre o drop_all/create_all, que apaga os triggers).
+- O R*Tree guarda float32 arredondado para fora: a consulta usa o índice para achar os
+  candidatos e confirma com BETWEEN nas colunas reais, sem perder nem sobrar pontos.
+Mesmo arquivo nos três backends.
+"""
+
+from fastapi import HTTPException, status
+from sqlalchemy import text, column
+from database import versao_dataset
+
+
+def nome_rtree(tabela):
+    return f"{tabela}_rtree"
+
+
+def _ddl(tabela):
+    rtree = nome_rtree(tabela)
+    com_coordenadas = "new.latitude IS NOT NULL AND new.longitude IS NOT NULL"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {rtree} USING rtree(id, min_lon, max_lon, min_lat, max_lat)",
+        f"""CREATE TRIGGER IF NOT EXISTS {rtree}_ai AFTER INSERT ON {tabela} WHEN {com_coordenadas} BEGIN
+            INSERT INTO {rtree} VALUES (new.id, new.longitude, new.longitude, new.latitude, new.latitude);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {rtree}_ad AFTER DELETE ON {tabela} BEGIN
+            DELETE FROM {rtree} WHERE id = old.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {rtree}_au AFTER UPDATE OF id, latitude, longitude ON {tabela} BEGIN
+            DELETE FROM {rtree} WHERE id = old.id;
+            INSERT INTO {rtree} SELECT new.id, new.longitude, new.longitude, new.latitude, new.latitude
+            WHERE {com_coordenadas};
+        END""",
+    ]
+
+
+def _existe(conn, tabela):
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": nome_rtree(tabela)}
+    ).first() is not None
+
+
+def garantir_rtree(engine, tabela, reconstruir=False):
+    """
+    Cria o R*Tree de `tabela` e os triggers se faltarem (e popula).
+    Com `reconstruir=True` refaz o índice inteiro a partir da tabela (usado pelos ETLs).
+    """
+    rtree = nome_rtree(tabela)
+    with engine.begin() as conn:
+        novo = not _existe(conn, tabela)
+        for ddl in _ddl(tabela):
+            conn.execute(text(ddl))
+        if novo or reconstruir:
+            conn.execute(text(f"DELETE FROM {rtree}"))
+            conn.execute(text(
+                f"INSERT INTO {rtree} SELECT id, longitude, longitude, latitude, latitude FROM {tabela} "
+                "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+            ))
+
+
+_disponivel = {}
+
+def rtree_disponivel(engine, tabela):
+    """True se o banco atual tem o R*Tree de `tabela` (verificado uma vez por versão)."""
+    versao = versao_dataset()
+    cache = _disponivel.get(tabela)
+    if cache is None or cache[0] != versao:
+        with engine.connect() as conn:
+            cache = _disponivel[tabela] = (versao, _existe(conn, tabela))
+    return cache[1]
+
+
+def parse_bbox(bbox):
+    """Converte 'minLon,minLat,maxLon,maxLat' em tupla de floats (400 se inválido)."""
+    if not bbox:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox deve ser 'minLon,minLat,maxLon,maxLat'",
+        )
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox com limites invertidos",
+        )
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def subconsulta_ids(tabela, bbox):
+    """SELECT id FROM <tabela>_rtree que intersecta o bbox — para usar em Modelo.id.in_(...)."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    rtree = nome_rtree(tabela)
+    return (
+        text(
+            f"SELECT id FROM {rtree} WHERE min_lon <= :max_lon AND max_lon >= :min_lon "
+            "AND min_lat <= :max_lat AND max_lat >= :min_lat"
+        )
+        .bindparams(min_lon=min_lon, min_lat=min_lat, max_lon=max_lon, max_lat=max_lat)
+        .columns(column("id"))
+    )
+
+
+def condicoes_bbox(modelo, bbox, engine):
+    """
+    Condições (para .filter/.where) dos pontos de `modelo` dentro do bbox: R*Tree quando o
+    banco já tem o índice, mais o BETWEEN exato. Sem o R*Tree o BETWEEN usa o índice
+    ix_*_lon_lat; com ele, o "+ 0" impede o planner de preferir esse índice (que só
+    restringe a longitude) e os candidatos saem do R*Tree, buscados pela chave primária.
+    """
+    if not bbox:
+        return []
+    min_lon, min_lat, max_lon, max_lat = bbox
+    tabela = modelo.__tablename__
+    if not rtree_disponivel(engine, tabela):
+        return [modelo.longitude.between(min_lon, max_lon), modelo.latitude.between(min_lat, max_lat)]
+    return [
+        modelo.id.in_(subconsulta_ids(tabela, bbox)),
+        (modelo.longitude + 0).between(min_lon, max_lon),
+        (modelo.latitude + 0).between(min_lat, max_lat),
+    ]
@@ -1,12 +1,18 @@
+import argparse
 import os
 import re
-import json
 import time
 import requests
 import pandas as pd
 from sqlalchemy.orm import sessionmaker
-from database import Base, engine, SessionLocal
+from database import engine, SessionLocal, nova_versao_dataset
 from models import UnidadeComercial
+from migracoes import aplicar_migracoes
+import espacial
+import geodistancia
+import geocache
+import gazetteer
+import incremental
 from geopy.geocoders import Nominatim
 from geopy.extra.rate_limiter import RateLimiter
 from geopy.distance import geodesic # <--- IMPORTANTE PARA CALCULAR DISTANCIA
@@ -14,7 +20,6 @@ from geopy.distance import geodesic # <--- IMPORTANTE PARA CALCULAR DISTANCIA
 # ==============================
 # CONFIGURAÇÕES
 # ==============================
-GEOCACHE_PATH = "data/geocache_uc.json"
 EXCEL_PATH = "data/Tabela_UC.xlsx"
 USER_AGENT = "ledax-mapa-interactive/7.0-geofence"
 
@@ -23,30 +28,17 @@ USER_AGENT = "ledax-mapa-interactive/7.0-geofence"
 SALVADOR_CENTROID = (-12.9714, -38.5014) 
 RAIO_MAXIMO_KM = 150  # 150km cobre Salvador, Camaçari, Feira, Lauro com folga.
 
+# Sem rede: resolve só pelo geocache; o que faltar vai para a tela manual com a sugestão do gazetteer
+OFFLINE = os.getenv("LEDAX_ETL_OFFLINE") == "1"
+
 geolocator = Nominatim(user_agent=USER_AGENT, timeout=10)
 geocode_limiter = RateLimiter(geolocator.geocode, min_delay_seconds=1.0)
 
 # ==============================
-# CACHE
+# CACHE (SQLite compartilhado com os outros ETLs, ver geocache.py)
 # ==============================
-def load_cache():
-    if os.path.exists(GEOCACHE_PATH):
-        try:
-            with open(GEOCACHE_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except: return {}
-    return {}
-
-def save_cache(cache):
-    os.makedirs(os.path.dirname(GEOCACHE_PATH), exist_ok=True)
-    with open(GEOCACHE_PATH, "w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
-
-def cache_key(data):
-    if isinstance(data, dict): return json.dumps(data, sort_keys=True).upper()
-    return str(data).strip().upper()
-
-GEOCACHE = load_cache()
+GEOCACHE = geocache.Geocache()
+GAZETTEER = gazetteer.obter_gazetteer()
 
 # ==============================
 # HELPERS
@@ -83,16 +75,16 @@ def extrair_cidade(texto):
     return "Salvador"
 
 # --- NOVO: TRAVA DE SEGURANÇA GEOGRÁFICA ---
-def is_fora_da_area(lat, lon):
+def fora_da_area(lats, lons):
     """
-    Retorna TRUE se o ponto estiver perigosamente longe de Salvador (outros estados/interior).
+    Para cada ponto, TRUE se estiver perigosamente longe de Salvador (outros estados/interior)
+    ou não tiver coordenada. Todos de uma vez (haversine em lote, ver geodistancia.py).
     """
-    if not lat or not lon: return True
-    try:
-        dist = geodesic((lat, lon), SALVADOR_CENTROID).km
-        return dist > RAIO_MAXIMO_KM
-    except:
-        return True
+    dentro = geodistancia.dentro_do_raio(
+        [lat or None for lat in lats], [lon or None for lon in lons],
+        SALVADOR_CENTROID[0], SALVADOR_CENTROID[1], RAIO_MAXIMO_KM,
+    )
+    return ~dentro
 
 # ==============================
 # BUSCA API
@@ -103,73 +95,112 @@ def buscar_coordenadas(query_input):
     # 1. BRASIL API (Prioridade Total para CEP)
     if isinstance(query_input, str) and re.match(r"^\d{5}-?\d{3}$", query_input.strip()):
         cep_limpo = query_input.replace("-", "")
-        try:
-            r = requests.get(f"https://brasilapi.com.br/api/cep/v1/{cep_limpo}", timeout=2)
-            if r.status_code == 200:
-                d = r.json()
-                # Correção segura para V1/V2
-                loc = d.get("location", {}).get("coordinates", {})
-                lat = loc.get("latitude")
-                lon = loc.get("longitude")
-                
-                # Fallback structure check
-                if not lat and "location" in d and "coordinates" in d["location"]:
-                     lat = d["location"]["coordinates"].get("latitude")
-                     lon = d["location"]["coordinates"].get("longitude")
+        c = GEOCACHE.obter("BRASILAPI", cep_limpo)
+        if c is not None:
+            if c["lat"]: return c["lat"], c["lon"], f"BrasilAPI ({query_input}): {c['endereco']}"
+        elif not OFFLINE:
+            try:
+                r = requests.get(f"https://brasilapi.com.br/api/cep/v1/{cep_limpo}", timeout=2)
+                if r.status_code == 200:
+                    d = r.json()
+                    # Correção segura para V1/V2
+                    loc = d.get("location", {}).get("coordinates", {})
+                    lat = loc.get("latitude")
+                    lon = loc.get("longitude")
+                    
+                    # Fallback structure check
+                    if not lat and "location" in d and "coordinates" in d["location"]:
+                         lat = d["location"]["coordinates"].get("latitude")
+                         lon = d["location"]["coordinates"].get("longitude")
 
-                if lat:
                     end_fmt = f"{d.get('street', '')}, {d.get('neighborhood', '')}, {d.get('city', '')} - {d.get('state','')}"
-                    return float(lat), float(lon), f"BrasilAPI ({query_input}): {end_fmt}"
-        except: pass
+                    lat, lon = (float(lat), float(lon)) if lat else (None, None)
+                    GEOCACHE.gravar(
+                        "BRASILAPI", cep_limpo, lat, lon, endereco=end_fmt, cidade=d.get("city"), uf=d.get("state"),
+                        logradouro=d.get("street", ""), bairro=d.get("neighborhood", ""),
+                    )
+                    if lat:
+                        return lat, lon, f"BrasilAPI ({query_input}): {end_fmt}"
+                elif r.status_code == 404:
+                    GEOCACHE.gravar("BRASILAPI", cep_limpo)
+            except: pass
 
     # 2. NOMINATIM
-    key = cache_key(query_input)
-    if key in GEOCACHE:
-        c = GEOCACHE[key]
-        if c.get("lat"): return c["lat"], c["lon"], c["display_name"]
+    c = GEOCACHE.obter("NOMINATIM", query_input)
+    if c is not None:
+        if c["lat"]: return c["lat"], c["lon"], c["endereco"]
+        return None, None, None
+    if OFFLINE:
         return None, None, None
 
     try:
         loc = geocode_limiter(query=query_input, addressdetails=True, country_codes="br")
         if loc:
-            GEOCACHE[key] = {"lat": loc.latitude, "lon": loc.longitude, "display_name": loc.address}
+            GEOCACHE.gravar("NOMINATIM", query_input, loc.latitude, loc.longitude, endereco=loc.address)
             return loc.latitude, loc.longitude, loc.address
     except Exception as e:
         print(f"Erro API: {e}")
+        return None, None, None # Falha de rede/serviço: sem entrada negativa
     
-    GEOCACHE[key] = {"lat": None, "lon": None}
+    GEOCACHE.gravar("NOMINATIM", query_input)
     return None, None, None
 
-def tentar_automacao(end_orig, cidade_orig, cep_prioritario=None):
-    
+def consultas_automacao(end_orig, cidade_orig, cep_prioritario=None):
+    """Consultas da busca automática de uma linha, na ordem de prioridade."""
     end_limpo = limpar_endereco(end_orig)
     
     # Prepara nome da rua (remove números)
     rua_full = end_limpo.split(',')[0].strip()
     rua_sem_num = re.sub(r'\d+', '', rua_full).strip()
     
-    log_msg = ""
-    if cep_prioritario: log_msg = f"[CEP Coluna: {cep_prioritario}]"
-    
+    consultas = []
     # --- 1: BrasilAPI com CEP da Coluna (OURO) ---
     if cep_prioritario:
-        lat, lon, src = buscar_coordenadas(cep_prioritario)
-        if lat: return lat, lon, f"{src} {log_msg}"
+        consultas.append(cep_prioritario)
 
-    # --- 2: Nominatim (Rua + Cidade + CEP Coluna) ---
     if rua_sem_num:
+        # --- 2: Nominatim (Rua + Cidade + CEP Coluna) ---
         q = {"street": rua_sem_num, "city": cidade_orig, "state": "BA", "country": "Brazil"}
         if cep_prioritario: q["postalcode"] = cep_prioritario
-        lat, lon, src = buscar_coordenadas(q)
-        if lat: return lat, lon, f"{src} {log_msg}"
+        consultas.append(q)
 
-    # --- 3: Fallback (Rua + BA) ---
-    if rua_sem_num:
-        q_glob = {"street": rua_sem_num, "state": "BA", "country": "Brazil"}
-        lat, lon, src = buscar_coordenadas(q_glob)
-        if lat: return lat, lon, f"{src} {log_msg}"
+        # --- 3: Fallback (Rua + BA) ---
+        consultas.append({"street": rua_sem_num, "state": "BA", "country": "Brazil"})
 
-    return None, None, None
+    return consultas
+
+def automacao_em_lote(linhas):
+    """
+    Busca automática de todas as linhas ((endereço, cidade, cep) cada), etapa por etapa:
+    na etapa k, as linhas ainda sem resultado juntam a sua k-ésima consulta e cada consulta
+    distinta (CEP, rua + cidade) é buscada uma única vez, mesmo que apareça em várias
+    linhas ou etapas. Retorna (lat, lon, fonte) por linha.
+    """
+    cascatas = [consultas_automacao(end, cidade, cep) for end, cidade, cep in linhas]
+    resultados = [(None, None, None)] * len(linhas)
+    resolvidas = {}
+
+    etapa = 0
+    pendentes = [i for i, c in enumerate(cascatas) if c]
+    while pendentes:
+        distintas = {geocache.normalizar(cascatas[i][etapa]): cascatas[i][etapa] for i in pendentes}
+        novas = [k for k in distintas if k not in resolvidas]
+        print(f"🔎 Etapa {etapa + 1}: {len(pendentes)} linhas, {len(distintas)} consultas distintas ({len(novas)} novas)")
+        for k in novas:
+            resolvidas[k] = buscar_coordenadas(distintas[k])
+        GEOCACHE.salvar()
+
+        for i in pendentes:
+            lat, lon, src = resolvidas[geocache.normalizar(cascatas[i][etapa])]
+            if lat:
+                cep = linhas[i][2]
+                log_msg = f"[CEP Coluna: {cep}]" if cep else ""
+                resultados[i] = (lat, lon, f"{src} {log_msg}")
+
+        etapa += 1
+        pendentes = [i for i in pendentes if not resultados[i][0] and etapa < len(cascatas[i])]
+
+    return resultados
 
 # ==============================
 # INTERFACE MANUAL
@@ -236,7 +267,7 @@ def resolver_manual(nome_loja, end_excel, cidade_excel, candidato_auto, cep_colu
 # ==============================
 # MAIN
 # ==============================
-def processar_excel():
+def processar_excel(completo=False):
     print("📄 Lendo Excel...")
     try:
         df = pd.read_excel(EXCEL_PATH)
@@ -255,44 +286,71 @@ def processar_excel():
     if col_cep: print(f"🎯 Usando Coluna de CEP: '{col_cep}'")
     else: print("⚠️ Nenhuma coluna 'CEP' encontrada.")
 
-    Base.metadata.create_all(bind=engine)
+    # Tabelas e colunas novas (bancos antigos); os índices ficam para depois da carga
+    aplicar_migracoes(engine, indices=False)
+    # Caches JSON dos ETLs antigos (idempotente: o que já está no geocache é mantido)
+    GEOCACHE.importar_legados()
+
+    # Carga incremental (ver incremental.py): hash das colunas lidas; só o que é novo ou
+    # mudou passa pelo geocoding (e pela tela manual), o que sumiu da planilha sai do banco
+    linhas = [row for _, row in df.iterrows()]
+    colunas_origem = ("rede", "nome", "endere_o", "cnpj_cpf") + ((col_cep,) if col_cep else ())
+    hashes = [incremental.hash_linha(row, colunas_origem) for row in linhas]
+    with engine.connect() as conn:
+        a_inserir, a_apagar = incremental.planejar(conn, UnidadeComercial, hashes, completo)
+    print(incremental.resumo(len(linhas), a_inserir, a_apagar))
+    if not a_inserir and not a_apagar:
+        print("\n🏁 Nada mudou na planilha: banco e versão do dataset mantidos.")
+        return
+
     db = SessionLocal()
-    total = len(df)
     
     print(f"\n🚀 Iniciando com CERCA VIRTUAL (Raio {RAIO_MAXIMO_KM}km de Salvador)...\n")
     time.sleep(2)
 
-    for idx, row in df.iterrows():
-        rede = row.get("rede")
-        nome = row.get("nome")
+    # 1. Tenta Automático (todas as linhas; cada consulta distinta uma vez só)
+    pendentes = []
+    for i in a_inserir:
+        row, h = linhas[i], hashes[i]
         end = row.get("endere_o")
-        
+
         cep_da_coluna = None
         if col_cep:
             cep_da_coluna = tratar_cep_excel(row.get(col_cep))
 
         if pd.isna(end): continue
 
-        print(f"[{idx+1}/{total}] {nome[:30]}...", end="\r")
+        pendentes.append((row, h, extrair_cidade(end), cep_da_coluna))
+
+    automaticos = automacao_em_lote([(row.get("endere_o"), cidade, cep) for row, _, cidade, cep in pendentes])
+    pendentes = [p + (auto,) for p, auto in zip(pendentes, automaticos)]
+
+    # 2. VALIDAÇÃO RIGOROSA — CHECK 1: Está fora da RMS? (uma passada para todos os candidatos)
+    foras = fora_da_area([p[4][0] for p in pendentes], [p[4][1] for p in pendentes])
+
+    # 3. Intervenção manual (só os reprovados) e gravação
+    for (row, h, cidade_excel, cep_da_coluna, (lat, lon, src)), fora in zip(pendentes, foras):
+        rede = row.get("rede")
+        nome = row.get("nome")
+        end = row.get("endere_o")
 
-        cidade_excel = extrair_cidade(end)
-        
-        # 1. Tenta Automático
-        lat, lon, src = tentar_automacao(end, cidade_excel, cep_prioritario=cep_da_coluna)
-        
-        # 2. VALIDAÇÃO RIGOROSA
         motivo = ""
         intervir = False
-        
+
         if not lat:
             intervir = True
             motivo = "Não encontrado"
-        
-        # CHECK 1: Está fora da RMS?
-        elif is_fora_da_area(lat, lon):
+            # Sugestão aproximada (centro do prefixo do CEP, gazetteer offline) para a tela manual
+            aproximado = GAZETTEER.cep(cep_da_coluna) if cep_da_coluna else None
+            if aproximado:
+                lat, lon = aproximado[0], aproximado[1]
+                src = f"Gazetteer: centro do CEP {aproximado[2]}* (aproximado)"
+                motivo = "Não encontrado (sugestão aproximada pelo CEP)"
+
+        elif fora:
             intervir = True
             motivo = "FORA DA ÁREA (Salvador/RMS)"
-            
+
         # CHECK 2: Cidade diverge? (Opcional, mas bom manter)
         elif "camaçari" in cidade_excel.lower() and "salvador" in src.lower() and "Nominatim" in src:
             # As vezes o Nominatim joga Camaçari no centro de Salvador se errar a rua
@@ -308,16 +366,32 @@ def processar_excel():
         if lat and lon:
             unidade = UnidadeComercial(
                 rede=rede, nome=nome, endereco_original=end, cnpj=row.get("cnpj_cpf"),
-                endereco_usado_geocode=metodo_final, latitude=lat, longitude=lon
+                endereco_usado_geocode=metodo_final, hash_origem=h, latitude=lat, longitude=lon
             )
             db.add(unidade)
             db.commit()
-            save_cache(GEOCACHE)
+            GEOCACHE.salvar()
             print(f"✅ Salvo: {nome}")
         else:
+            # Sem registro (nem hash): a linha volta a ser tentada na próxima carga
             print(f"⏭️  Pulado: {nome}")
-
+    db.close()
+
+    # Os registros antigos só saem depois de todas as linhas novas gravadas. Cada unidade é
+    # salva na hora (não se perde a resolução manual); se a carga parar no meio (erro, Ctrl-C
+    # na tela manual), nada foi apagado e a próxima carga remove as versões antigas que sobraram.
+    with engine.begin() as conn:
+        incremental.apagar(conn, UnidadeComercial, a_apagar)
+
+    aplicar_migracoes(engine)
+    # Índice espacial (R*Tree) do filtro bbox: refeito na carga completa; na incremental os
+    # triggers já acompanharam os inserts/deletes
+    espacial.garantir_rtree(engine, UnidadeComercial.__tablename__, reconstruir=completo)
+    # Nova versão do dataset: a API descarta caches e ETags da carga anterior
+    nova_versao_dataset()
     print("\n🏁 FIM!")
 
 if __name__ == "__main__":
-    processar_excel()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Carga das unidades comerciais a partir da planilha")
+    parser.add_argument("--completo", action="store_true", help="apaga e recarrega todas as linhas")
+    processar_excel(completo=parser.parse_args().completo)
\ No newline at end of file
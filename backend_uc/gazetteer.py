@@ -0,0 +1,215 @@
+# gazetteer.py
+"""
+Gazetteer offline: centroides de municípios e de prefixos de CEP, sem rede (mesmo arquivo em
+backend_vendas e backend_uc; dados em LEDAX_GAZETTEER, por padrão data/gazetteer.npz do próprio
+backend, já que cada imagem Docker só tem a sua pasta: o de backend_uc é cópia do de vendas).
+- Municípios: os 5.570 da tabela do IBGE (data/municipios_ibge.csv: código, nome, sede do
+  município, código da UF; Divisão Territorial Brasileira 2022). O índice em memória usa o
+  nome "dobrado" (sem acentos, maiúsculo, sem pontuação) + UF.
+- Prefixos de CEP (5 e 3 dígitos): mediana dos pontos geocodificados em nível de rua daquele
+  prefixo, com a quantidade de pontos que a sustentam. Só entram pontos cujo CEP está numa
+  faixa válida dos Correios e cuja UF (do polígono que contém o ponto) é a UF da faixa, e só
+  prefixos com pelo menos MIN_PONTOS_CEP pontos: um erro de geocoding isolado não vira centroide.
+- Guardado compacto em .npz (arrays float32/int32 comprimidos), carregado uma vez por processo.
+- `python gazetteer.py [--ibge municipios.csv]` (em backend_vendas) reconstrói o arquivo a partir
+  da tabela de municípios do IBGE e das vendas geocodificadas do banco; depois copie o .npz
+  para backend_uc/data.
+"""
+
+import argparse
+import os
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from armazenamento import criar_engine_leitura
+from database import BASE_DIR
+
+_RAIZ = os.path.dirname(BASE_DIR)
+GAZETTEER_PATH = os.getenv("LEDAX_GAZETTEER", os.path.join(BASE_DIR, "data", "gazetteer.npz"))
+DB_VENDAS = os.path.join(_RAIZ, "backend_vendas", "data", "ledax.db")
+MUNICIPIOS_IBGE_CSV = os.path.join(_RAIZ, "backend_vendas", "data", "municipios_ibge.csv")
+
+# Tamanhos de prefixo de CEP guardados, do mais preciso para o mais amplo
+DIGITOS_CEP = (5, 3)
+# Pontos mínimos para um prefixo de CEP entrar no gazetteer
+MIN_PONTOS_CEP = int(os.getenv("LEDAX_GAZETTEER_MIN_PONTOS_CEP", "3"))
+
+# Código IBGE da UF -> sigla
+UF_POR_CODIGO = {
+    11: "RO", 12: "AC", 13: "AM", 14: "RR", 15: "PA", 16: "AP", 17: "TO",
+    21: "MA", 22: "PI", 23: "CE", 24: "RN", 25: "PB", 26: "PE", 27: "AL", 28: "SE", 29: "BA",
+    31: "MG", 32: "ES", 33: "RJ", 35: "SP", 41: "PR", 42: "SC", 43: "RS",
+    50: "MS", 51: "MT", 52: "GO", 53: "DF",
+}
+
+# Faixas de CEP dos Correios por UF (5 primeiros dígitos, inclusive)
+FAIXAS_CEP = (
+    (1000, 19999, "SP"), (20000, 28999, "RJ"), (29000, 29999, "ES"), (30000, 39999, "MG"),
+    (40000, 48999, "BA"), (49000, 49999, "SE"), (50000, 56999, "PE"), (57000, 57999, "AL"),
+    (58000, 58999, "PB"), (59000, 59999, "RN"), (60000, 63999, "CE"), (64000, 64999, "PI"),
+    (65000, 65999, "MA"), (66000, 68899, "PA"), (68900, 68999, "AP"), (69000, 69299, "AM"),
+    (69300, 69399, "RR"), (69400, 69899, "AM"), (69900, 69999, "AC"), (70000, 72799, "DF"),
+    (72800, 72999, "GO"), (73000, 73699, "DF"), (73700, 76799, "GO"), (76800, 76999, "RO"),
+    (77000, 77999, "TO"), (78000, 78899, "MT"), (79000, 79999, "MS"), (80000, 87999, "PR"),
+    (88000, 89999, "SC"), (90000, 99999, "RS"),
+)
+
+
+def dobrar(nome):
+    """'Dias d'Ávila' -> 'DIAS D AVILA': a forma usada como chave de município."""
+    if not isinstance(nome, str):
+        return ""
+    sem_acento = "".join(c for c in unicodedata.normalize("NFKD", nome) if not unicodedata.combining(c))
+    return re.sub(r"[^A-Z0-9]+", " ", sem_acento.upper()).strip()
+
+
+def uf_do_cep(cep):
+    """UF da faixa dos Correios que contém o CEP; None se o CEP for inválido ou fora das faixas."""
+    digitos = re.sub(r"\D", "", str(cep or ""))
+    if len(digitos) != 8:
+        return None
+    prefixo = int(digitos[:5])
+    for inicio, fim, uf in FAIXAS_CEP:
+        if inicio <= prefixo <= fim:
+            return uf
+    return None
+
+
+class Gazetteer:
+    def __init__(self, dados):
+        self.mun_codigo = dados["mun_codigo"]
+        self.mun_nome = dados["mun_nome"]
+        self.mun_uf = dados["mun_uf"]
+        self.mun_lat = dados["mun_lat"]
+        self.mun_lon = dados["mun_lon"]
+        self.cep_prefixo = dados["cep_prefixo"]
+        self.cep_lat = dados["cep_lat"]
+        self.cep_lon = dados["cep_lon"]
+        self.cep_pontos = dados["cep_pontos"]
+
+        self._municipios = {
+            (dobrar(nome), uf): i for i, (nome, uf) in enumerate(zip(self.mun_nome, self.mun_uf))
+        }
+        self._ceps = {prefixo: i for i, prefixo in enumerate(self.cep_prefixo)}
+
+    @classmethod
+    def carregar(cls, caminho=GAZETTEER_PATH):
+        """Gazetteer do arquivo; vazio se o arquivo não existir (o ETL segue pelo geocache/rede)."""
+        if not os.path.exists(caminho):
+            return cls(_vazio())
+        with np.load(caminho, allow_pickle=False) as npz:
+            return cls({k: npz[k] for k in npz.files})
+
+    def __len__(self):
+        return len(self.mun_nome)
+
+    def municipio(self, cidade, uf):
+        """(lat, lon, código IBGE) do município, ou None."""
+        i = self._municipios.get((dobrar(cidade), (uf or "").strip().upper()))
+        if i is None:
+            return None
+        return float(self.mun_lat[i]), float(self.mun_lon[i]), int(self.mun_codigo[i])
+
+    def cep(self, cep, digitos_min=3):
+        """(lat, lon, prefixo) do prefixo mais longo conhecido do CEP (até `digitos_min` dígitos), ou None."""
+        digitos = re.sub(r"\D", "", str(cep or ""))
+        if len(digitos) < 5:
+            return None
+        for n in DIGITOS_CEP:
+            if n < digitos_min:
+                break
+            i = self._ceps.get(digitos[:n])
+            if i is not None:
+                return float(self.cep_lat[i]), float(self.cep_lon[i]), digitos[:n]
+        return None
+
+
+def _vazio():
+    return {
+        "mun_codigo": np.empty(0, dtype=np.int32), "mun_nome": np.empty(0, dtype="U1"),
+        "mun_uf": np.empty(0, dtype="U2"), "mun_lat": np.empty(0, dtype=np.float32),
+        "mun_lon": np.empty(0, dtype=np.float32), "cep_prefixo": np.empty(0, dtype="U5"),
+        "cep_lat": np.empty(0, dtype=np.float32), "cep_lon": np.empty(0, dtype=np.float32),
+        "cep_pontos": np.empty(0, dtype=np.int32),
+    }
+
+
+_gazetteer = None
+
+def obter_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer.carregar()
+    return _gazetteer
+
+
+# ---------------------------
+# Construção do arquivo
+# ---------------------------
+def municipios_ibge(caminho_csv=MUNICIPIOS_IBGE_CSV):
+    """Tabela de municípios do IBGE (CSV com codigo_ibge, nome, latitude, longitude, codigo_uf)."""
+    df = pd.read_csv(caminho_csv, dtype={"codigo_ibge": "Int64", "codigo_uf": "Int64"})
+    return pd.DataFrame({
+        "codigo": df["codigo_ibge"].astype(np.int32),
+        "nome": df["nome"],
+        "uf": df["codigo_uf"].map(UF_POR_CODIGO),
+        "lat": df["latitude"],
+        "lon": df["longitude"],
+    }).dropna(subset=["uf", "lat", "lon"])
+
+
+def pontos_cep(db_path=DB_VENDAS):
+    """(cep, uf, lat, lon) das vendas geocodificadas em nível de rua (não pelo centro da cidade)."""
+    if not os.path.exists(db_path):
+        return pd.DataFrame(columns=["cep", "uf", "lat", "lon"])
+    with criar_engine_leitura(db_path).connect() as conn:
+        linhas = conn.execute(text(
+            "SELECT cep, uf, latitude AS lat, longitude AS lon FROM clientes "
+            "WHERE cep IS NOT NULL AND latitude IS NOT NULL AND longitude IS NOT NULL "
+            "AND (endereco_usado_geocode LIKE 'Nominatim%' OR endereco_usado_geocode LIKE 'BrasilAPI%')"
+        )).all()
+    return pd.DataFrame(linhas, columns=["cep", "uf", "lat", "lon"])
+
+
+def construir(municipios, pontos, caminho=GAZETTEER_PATH, min_pontos=MIN_PONTOS_CEP):
+    """
+    Grava o .npz a partir de um DataFrame de municípios e um de pontos com CEP (e a UF
+    onde o ponto caiu: o ponto cuja UF não é a da faixa do CEP é descartado).
+    """
+    municipios = municipios.assign(_chave=municipios["nome"].map(dobrar) + "|" + municipios["uf"])
+    municipios = municipios.drop_duplicates("_chave", keep="first")
+
+    pontos = pontos.assign(cep=pontos["cep"].astype(str).str.replace(r"\D", "", regex=True))
+    pontos = pontos[pontos["cep"].map(uf_do_cep).eq(pontos["uf"].str.strip().str.upper())]
+    prefixos = pd.concat([
+        pontos.assign(prefixo=pontos["cep"].str[:n]).groupby("prefixo").agg(
+            lat=("lat", "median"), lon=("lon", "median"), pontos=("lat", "size")
+        )
+        for n in DIGITOS_CEP
+    ]).reset_index()
+    prefixos = prefixos[prefixos["pontos"] >= min_pontos]
+
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    np.savez_compressed(
+        caminho,
+        mun_codigo=municipios["codigo"].to_numpy(np.int32),
+        mun_nome=municipios["nome"].to_numpy(str),
+        mun_uf=municipios["uf"].to_numpy("U2"),
+        mun_lat=municipios["lat"].to_numpy(np.float32),
+        mun_lon=municipios["lon"].to_numpy(np.float32),
+        cep_prefixo=prefixos["prefixo"].to_numpy("U5"),
+        cep_lat=prefixos["lat"].to_numpy(np.float32),
+        cep_lon=prefixos["lon"].to_numpy(np.float32),
+        cep_pontos=prefixos["pontos"].to_numpy(np.int32),
+    )
+    print(f"✅ Gazetteer: {len(municipios)} municípios e {len(prefixos)} prefixos de CEP em {caminho}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstrói o gazetteer offline")
+    parser.add_argument("--ibge", default=MUNICIPIOS_IBGE_CSV, help="CSV de municípios do IBGE")
+    parser.add_argument("--min-pontos", type=int, default=MIN_PONTOS_CEP, help="pontos mínimos por prefixo de CEP")
+    args = parser.parse_args()
+    construir(municipios_ibge(args.ibge), pontos_cep(), min_pontos=args.min_pontos)
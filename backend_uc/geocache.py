@@ -0,0 +1,235 @@
+# geocache.py
+"""
+Cache de geocoding único, em SQLite, compartilhado pelos três ETLs (mesmo arquivo em cada
+backend). O banco fica em LEDAX_GEOCACHE_DB, por padrão data/geocache.db do próprio backend
+(cada imagem Docker só tem a sua pasta): para compartilhar entre os ETLs, aponte a variável
+dos três para o mesmo arquivo (ex.: um volume comum montado nos contêineres).
+- Chave comum "<PROVEDOR>::<consulta normalizada>": BRASILAPI (CEP só com dígitos),
+  NOMINATIM (texto livre ou consulta estruturada em JSON) e CIDADE ("cidade, UF").
+  O mesmo CEP ou endereço buscado por um ETL vira acerto para os outros.
+- Valor comum: lat, lon, endereço formatado, cidade, UF e um JSON com o resto (logradouro…).
+- Só INSERT: cada gravação é uma linha nova e vale a mais recente da chave. Salvar custa
+  só as entradas novas, em vez de reescrever um JSON inteiro.
+- Resultado negativo (lat/lon nulos) expira depois de LEDAX_GEOCACHE_TTL_NEGATIVO_DIAS:
+  o endereço que não existia na base do provedor volta a ser tentado.
+- O banco só é criado/lido no primeiro uso (importar o etl.py não grava nada).
+- Os JSONs antigos dos ETLs entram por um passo explícito, importar_legados(): no início
+  de cada ETL e via `python geocache.py [arquivos.json...]`. Chaves já presentes são
+  mantidas, então repetir a importação não duplica nada.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from sqlalchemy import text
+from armazenamento import criar_engine_escrita
+from database import BASE_DIR
+
+_RAIZ = os.path.dirname(BASE_DIR)
+GEOCACHE_DB = os.getenv("LEDAX_GEOCACHE_DB", os.path.join(BASE_DIR, "data", "geocache.db"))
+TTL_NEGATIVO_S = float(os.getenv("LEDAX_GEOCACHE_TTL_NEGATIVO_DIAS", "30")) * 86400
+
+# Caches JSON anteriores (um formato por ETL): na pasta do próprio backend ou, no repositório,
+# na dos outros dois
+_LEGADOS = (
+    ("backend_vendas", "geocache_brasil.json"),
+    ("backend_uc", "geocache_uc.json"),
+    ("backend_redes", "redes_geocache.json"),
+)
+JSONS_LEGADOS = list(dict.fromkeys(
+    os.path.normpath(caminho)
+    for backend, nome in _LEGADOS
+    for caminho in (os.path.join(BASE_DIR, "data", nome), os.path.join(_RAIZ, backend, "data", nome))
+))
+
+# Gravações acumuladas antes de um INSERT em lote automático
+LOTE_GRAVACAO = 200
+
+_DDL = [
+    """CREATE TABLE IF NOT EXISTS geocache (
+        id INTEGER PRIMARY KEY,
+        chave TEXT NOT NULL,
+        lat REAL,
+        lon REAL,
+        endereco TEXT,
+        cidade TEXT,
+        uf TEXT,
+        dados TEXT,
+        criado_em REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_geocache_chave ON geocache (chave, id)",
+]
+_COLUNAS = ("lat", "lon", "endereco", "cidade", "uf")
+
+
+def normalizar(consulta):
+    """Texto (ou dict de consulta estruturada) -> forma canônica usada na chave."""
+    if isinstance(consulta, dict):
+        consulta = json.dumps(consulta, sort_keys=True)
+    return re.sub(r"\s+", " ", str(consulta)).strip().upper()
+
+
+def chave(provedor, consulta):
+    if provedor == "BRASILAPI":
+        consulta = re.sub(r"\D", "", str(consulta))
+    return f"{provedor}::{normalizar(consulta)}"
+
+
+class Geocache:
+    def __init__(self, caminho=GEOCACHE_DB, ttl_negativo_s=TTL_NEGATIVO_S):
+        self.caminho = caminho
+        self.ttl_negativo_s = ttl_negativo_s
+        self._trava = threading.Lock()
+        self._pendentes = []
+        self.engine = None
+        self._entradas = None  # carregadas no primeiro uso (ver _abrir)
+
+    def _abrir(self):
+        """Cria o banco se preciso e carrega a gravação mais recente de cada chave."""
+        if self._entradas is not None:
+            return self._entradas
+        with self._trava:
+            if self._entradas is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+                self.engine = criar_engine_escrita(self.caminho)
+                with self.engine.begin() as conn:
+                    for ddl in _DDL:
+                        conn.execute(text(ddl))
+                    linhas = conn.execute(text(
+                        "SELECT chave, lat, lon, endereco, cidade, uf, dados, criado_em FROM geocache "
+                        "WHERE id IN (SELECT MAX(id) FROM geocache GROUP BY chave)"
+                    )).all()
+                self._entradas = {
+                    l.chave: (dict(zip(_COLUNAS, l[1:6]), **json.loads(l.dados or "{}")), l.criado_em)
+                    for l in linhas
+                }
+        return self._entradas
+
+    def __len__(self):
+        return len(self._abrir())
+
+    def entradas(self, provedor):
+        """(consulta normalizada, valor) de cada chave de `provedor`, pelo valor mais recente."""
+        prefixo = f"{provedor}::"
+        for k, (valor, _) in list(self._abrir().items()):
+            if k.startswith(prefixo):
+                yield k[len(prefixo):], dict(valor)
+
+    def obter(self, provedor, consulta):
+        """
+        Valor em cache ({lat, lon, endereco, cidade, uf, ...}) ou None se a consulta ainda
+        não foi feita (ou é um negativo vencido). Negativo válido: dict com lat None.
+        """
+        entrada = self._abrir().get(chave(provedor, consulta))
+        if entrada is None:
+            return None
+        valor, criado_em = entrada
+        if valor["lat"] is None and time.time() - criado_em > self.ttl_negativo_s:
+            return None
+        return dict(valor)
+
+    def gravar(self, provedor, consulta, lat=None, lon=None, endereco=None, cidade=None, uf=None,
+               criado_em=None, **dados):
+        """Registra o resultado de uma consulta (lat/lon None = negativo). Seguro entre threads."""
+        k = chave(provedor, consulta)
+        criado_em = time.time() if criado_em is None else criado_em
+        valor = dict(lat=lat, lon=lon, endereco=endereco, cidade=cidade, uf=uf, **dados)
+        entradas = self._abrir()
+        with self._trava:
+            entradas[k] = (valor, criado_em)
+            self._pendentes.append({
+                "chave": k, "lat": lat, "lon": lon, "endereco": endereco, "cidade": cidade, "uf": uf,
+                "dados": json.dumps(dados, ensure_ascii=False) if dados else None, "criado_em": criado_em,
+            })
+            cheio = len(self._pendentes) >= LOTE_GRAVACAO
+        if cheio:
+            self.salvar()
+
+    def salvar(self):
+        """Grava no banco as entradas novas desde o último salvar (INSERT em lote)."""
+        with self._trava:
+            pendentes, self._pendentes = self._pendentes, []
+            if not pendentes:
+                return
+            with self.engine.begin() as conn:
+                conn.execute(text(
+                    "INSERT INTO geocache (chave, lat, lon, endereco, cidade, uf, dados, criado_em) "
+                    "VALUES (:chave, :lat, :lon, :endereco, :cidade, :uf, :dados, :criado_em)"
+                ), pendentes)
+
+    def importar_json(self, caminho_json):
+        """
+        Importa um cache JSON antigo (vendas, uc ou redes). Chaves já presentes no banco
+        são mantidas; as entradas importadas ficam com a data do arquivo (conta para o TTL).
+        """
+        with open(caminho_json, encoding="utf-8") as f:
+            antigo = json.load(f)
+        criado_em = os.path.getmtime(caminho_json)
+        entradas = self._abrir()
+        importadas = 0
+        for chave_antiga, valor in antigo.items():
+            convertida = _converter_legado(chave_antiga, valor)
+            if convertida is None:
+                continue
+            provedor, consulta, campos = convertida
+            if chave(provedor, consulta) in entradas:
+                continue
+            self.gravar(provedor, consulta, criado_em=criado_em, **campos)
+            importadas += 1
+        self.salvar()
+        print(f"📥 Geocache: {importadas} de {len(antigo)} entradas importadas de {caminho_json}")
+        return importadas
+
+    def importar_legados(self, caminhos=None):
+        """Importa os JSONs antigos que existirem (padrão: JSONS_LEGADOS). Idempotente."""
+        return sum(
+            self.importar_json(caminho_json)
+            for caminho_json in (caminhos or JSONS_LEGADOS) if os.path.exists(caminho_json)
+        )
+
+
+def _converter_legado(chave_antiga, valor):
+    """(provedor, consulta, campos) de uma entrada dos JSONs antigos; None se não reconhecida."""
+    # redes: "ENDERECO_LOJA::<endereço>" -> [lat, lon, endereço geocodificado]
+    if chave_antiga.startswith("ENDERECO_LOJA::"):
+        lat, lon, endereco = (list(valor or []) + [None, None, None])[:3]
+        return "NOMINATIM", chave_antiga.split("::", 1)[1], {"lat": lat, "lon": lon, "endereco": endereco}
+
+    # vendas: "TIPO::consulta" (atual) ou "TIPO consulta" (versão anterior do ETL)
+    m = re.match(r"^(BRASILAPI|NOMINATIM|CITY_CENTER)(?:::| )(.*)$", chave_antiga)
+    if m:
+        tipo, consulta = m.groups()
+        valor = valor or {}
+        campos = {"lat": valor.get("lat"), "lon": valor.get("lon")}
+        if tipo == "BRASILAPI":
+            cidade, uf = valor.get("cidade"), valor.get("uf")
+            if not cidade and "," in (valor.get("extra") or ""):
+                cidade, uf = valor["extra"].rsplit(",", 1)
+            campos.update(cidade=cidade, uf=uf)
+            campos.update({k: valor[k] for k in ("logradouro", "bairro") if valor.get(k)})
+            return "BRASILAPI", consulta, campos
+        if tipo == "NOMINATIM":
+            campos["endereco"] = valor.get("address")
+            return "NOMINATIM", consulta, campos
+        # CITY_CENTER: a consulta era "cidade, UF, Brazil" (a forma antiga só tem vírgulas no "extra")
+        if m.group(0)[len(tipo)] == " ":
+            consulta = valor.get("extra")
+            if not consulta:
+                return None
+        return "CIDADE", re.sub(r",\s*BRAZIL$", "", consulta.strip(), flags=re.I), campos
+
+    # uc: chave = consulta do Nominatim (texto, CEP ou JSON da consulta estruturada)
+    if "::" not in chave_antiga and isinstance(valor, dict):
+        return "NOMINATIM", chave_antiga, {
+            "lat": valor.get("lat"), "lon": valor.get("lon"), "endereco": valor.get("display_name"),
+        }
+    return None
+
+
+if __name__ == "__main__":
+    cache = Geocache()
+    cache.importar_legados(sys.argv[1:])
+    print(f"✅ {len(cache)} chaves em {cache.caminho}")
@@ -0,0 +1,81 @@
+# incremental.py
+"""
+Carga incremental dos ETLs (mesmo arquivo nos três backends).
+- Cada linha da planilha vira um hash SHA-256 do seu conteúdo normalizado (só as colunas que
+  o ETL lê), gravado no registro em `hash_origem`.
+- A diferença entre os hashes da planilha e os do banco é feita como multiconjunto: linhas
+  idênticas repetidas contam uma a uma.
+- Só as linhas com hash que o banco não tem (novas ou alteradas) são geocodificadas e
+  inseridas; registros cujo hash sumiu da planilha são apagados. Linha alterada = o registro
+  antigo sai e o novo entra.
+- Registros sem hash (carregados antes do modo incremental) contam como sumidos: a primeira
+  carga incremental recarrega a tabela inteira. Registros sem coordenadas também: o geocoding
+  que falhou (ex.: ETL offline) é tentado de novo na carga seguinte, barato pelo geocache.
+"""
+
+import hashlib
+import json
+import math
+import re
+from collections import defaultdict
+from datetime import date, datetime
+import pandas as pd
+from sqlalchemy import select
+
+# Registros apagados por DELETE (limite de variáveis do SQLite)
+LOTE_DELETE = 500
+
+
+def _normalizar(valor):
+    if valor is None or valor is pd.NaT:
+        return None
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    if isinstance(valor, (pd.Timestamp, datetime, date)):
+        return valor.isoformat()
+    if hasattr(valor, "item"):  # escalares numpy
+        return _normalizar(valor.item())
+    if isinstance(valor, str):
+        valor = re.sub(r"\s+", " ", valor).strip()
+        return valor or None
+    return valor
+
+
+def hash_linha(row, colunas):
+    """SHA-256 (hex) das `colunas` da linha, com valores normalizados (NaN = vazio, datas ISO, espaços)."""
+    conteudo = {c: _normalizar(row.get(c)) for c in sorted(colunas)}
+    texto = json.dumps(conteudo, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def planejar(conn, modelo, hashes, completo=False):
+    """
+    (posições das linhas a inserir, ids dos registros a apagar) para levar a tabela de
+    `modelo` ao conteúdo da planilha. Com `completo=True` tudo é apagado e reinserido.
+    """
+    no_banco = defaultdict(list)
+    for id_, h, lat in conn.execute(select(modelo.id, modelo.hash_origem, modelo.latitude)):
+        no_banco[None if completo or lat is None else h].append(id_)
+
+    inserir = []
+    for posicao, h in enumerate(hashes):
+        ids = no_banco.get(h)
+        if ids:
+            ids.pop()  # registro igual já carregado: fica como está
+        else:
+            inserir.append(posicao)
+    apagar = [id_ for ids in no_banco.values() for id_ in ids]  # sem hash/coordenada caem aqui (chave None)
+    return inserir, apagar
+
+
+def apagar(conn, modelo, ids):
+    tabela = modelo.__table__
+    for i in range(0, len(ids), LOTE_DELETE):
+        conn.execute(tabela.delete().where(tabela.c.id.in_(ids[i:i + LOTE_DELETE])))
+
+
+def resumo(total, a_inserir, a_apagar):
+    return (
+        f"🔁 Incremental: {len(a_inserir)} novas/alteradas, {len(a_apagar)} removidas, "
+        f"{total - len(a_inserir)} inalteradas"
+    )
@@ -1,11 +1,19 @@
-from fastapi import FastAPI, Depends, Query, APIRouter
+from fastapi import FastAPI, Depends, Query, APIRouter, HTTPException, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from database import get_db, Base, engine 
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_async_db, Base, engine, engine_leitura, versao_dataset, SessionLeitura
 from models import UnidadeComercial
 from fastapi.staticfiles import StaticFiles
 from typing import Optional, List 
 from fastapi.responses import FileResponse
+import tiles
+import streaming
+import formatos
+import cache_http
+import espacial
+from migracoes import aplicar_migracoes
 
 # ----------------------------------------
 # CRIA O APP PRIMEIRO (ESSENCIAL)
@@ -24,8 +32,9 @@ def serve_frontend():
 # ----------------------------------------------------
 @app.on_event("startup")
 def startup_event():
-    Base.metadata.create_all(bind=engine)
-    print("Banco de dados e tabelas verificados/criados com sucesso.")
+    aplicar_migracoes(engine)
+    espacial.garantir_rtree(engine, UnidadeComercial.__tablename__)
+    print("Banco de dados, tabelas e índices verificados/criados com sucesso.")
 
 # ----------------------------------------------------
 # ROUTER
@@ -48,27 +57,102 @@ app.add_middleware(
 def root_test():
     return {"status": "API is LIVE! Endpoints should be working."}
 
+# ETag + Cache-Control das listas (revalidadas a cada uso; 304 enquanto o ETL não rodar)
+cache_dados = cache_http.condicional("public, no-cache")
+
+# hash_origem é controle interno da carga incremental: fica fora das respostas
+CAMPOS_UNIDADE = [c.name for c in UnidadeComercial.__table__.columns if c.name != "hash_origem"]
+
+def unidade_para_dict(unidade):
+    return {c: getattr(unidade, c) for c in CAMPOS_UNIDADE}
+
+def filtro_unidades(rede=None, bbox=None):
+    condicoes = [UnidadeComercial.latitude != None]
+    if rede:
+        condicoes.append(UnidadeComercial.rede.in_(rede))
+    # Viewport do mapa (índice R*Tree, ver espacial.py)
+    condicoes.extend(espacial.condicoes_bbox(UnidadeComercial, bbox, engine_leitura))
+    return condicoes
+
+def query_unidades(db, rede=None, bbox=None):
+    return db.query(UnidadeComercial).filter(*filtro_unidades(rede, bbox))
+
 # Listar unidades
 @router.get("/all")
-def listar_unidades(db: Session = Depends(get_db)):
-    return db.query(UnidadeComercial).filter(UnidadeComercial.latitude != None).all()
+async def listar_unidades(
+    request: Request,
+    stream: bool = Query(False),
+    db: AsyncSession = Depends(get_async_db),
+    cache: dict = Depends(cache_dados)
+):
+    if streaming.quer_stream(request, stream):
+        return cache_http.aplicar(streaming.resposta_ndjson(
+            streaming.consulta_em_lotes(SessionLeitura, query_unidades, unidade_para_dict)
+        ), cache)
+    resultado = await db.execute(select(UnidadeComercial).where(*filtro_unidades()))
+    return [unidade_para_dict(u) for u in resultado.scalars()]
 
 # Listar redes
 @router.get("/redes")
-def listar_redes(db: Session = Depends(get_db)):
+def listar_redes(db: Session = Depends(get_db), cache: dict = Depends(cache_dados)):
     redes = db.query(UnidadeComercial.rede).distinct().order_by(UnidadeComercial.rede).all()
     return [r[0] for r in redes if r[0] is not None]
 
 # Filtrar unidades
 @router.get("/filtrar")
 def filtrar(
+    request: Request,
     rede: Optional[List[str]] = Query(None),
-    db: Session = Depends(get_db)
+    bbox: Optional[str] = Query(None, description="Viewport: minLon,minLat,maxLon,maxLat"),
+    stream: bool = Query(False),
+    db: Session = Depends(get_db),
+    cache: dict = Depends(cache_dados)
 ):
-    query = db.query(UnidadeComercial).filter(UnidadeComercial.latitude != None)
-    if rede:
-        query = query.filter(UnidadeComercial.rede.in_(rede))
-    return query.all()
+    bbox = espacial.parse_bbox(bbox)
+    formato = formatos.formato_pedido(request)
+    if formato:
+        registros = [unidade_para_dict(u) for u in query_unidades(db, rede, bbox)]
+        colunas = formatos.registros_para_colunas(
+            registros, CAMPOS_UNIDADE, {"rede"}
+        )
+        return cache_http.aplicar(formatos.resposta_colunar(colunas, formato), cache)
+    if streaming.quer_stream(request, stream):
+        return cache_http.aplicar(streaming.resposta_ndjson(streaming.consulta_em_lotes(
+            SessionLeitura, lambda sessao: query_unidades(sessao, rede, bbox), unidade_para_dict
+        )), cache)
+    return [unidade_para_dict(u) for u in query_unidades(db, rede, bbox)]
+
+# ----------------------------------------------------
+# VECTOR TILES (MVT)
+# ----------------------------------------------------
+cache_tiles = tiles.CacheTiles()
+
+@app.get("/tiles/{layer}/{z}/{x}/{y}.pbf")
+def get_tile(
+    layer: str, z: int, x: int, y: int, db: Session = Depends(get_db), cache: dict = Depends(cache_dados)
+):
+    """Tile MVT; ETag da versão do dataset, como nas listas (um ETL novo invalida o tile no cliente)."""
+    if layer != "unidades":
+        raise HTTPException(status_code=404, detail="Camada desconhecida")
+    if not tiles.tile_valido(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile fora do intervalo")
+
+    chave = (versao_dataset(), layer, z, x, y)
+    pbf = cache_tiles.get(chave)
+    if pbf is None:
+        min_lon, min_lat, max_lon, max_lat = tiles.tile_bbox(z, x, y)
+        query = db.query(
+            UnidadeComercial.id, UnidadeComercial.longitude, UnidadeComercial.latitude,
+            UnidadeComercial.rede, UnidadeComercial.nome,
+        ).filter(
+            UnidadeComercial.longitude.between(min_lon, max_lon),
+            UnidadeComercial.latitude.between(min_lat, max_lat),
+        )
+        feicoes = ((u.id, u.longitude, u.latitude, {"rede": u.rede, "nome": u.nome}) for u in query)
+        pbf = tiles.codificar_camada(layer, feicoes, z, x, y)
+        cache_tiles.set(chave, pbf)
+
+    return cache_http.aplicar(Response(content=pbf, media_type=tiles.MEDIA_TYPE), cache)
 
 # Inclui o router
 app.include_router(router)
@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String, Float, Index, text
 from database import Base
 
 class UnidadeComercial(Base):
@@ -15,5 +15,13 @@ class UnidadeComercial(Base):
     
     # Dados de geocodificação
     endereco_usado_geocode = Column(String) # Endereço que funcionou (Debug)
+    # Hash da linha da planilha de origem (carga incremental, ver incremental.py)
+    hash_origem = Column(String)
     latitude = Column(Float)
-    longitude = Column(Float)
\ No newline at end of file
+    longitude = Column(Float)
+
+    # Índices para os filtros da API (ver migracoes.py)
+    __table_args__ = (
+        Index("ix_unidades_comerciais_rede", "rede", sqlite_where=text("latitude IS NOT NULL")),
+        Index("ix_unidades_comerciais_lon_lat", "longitude", "latitude"),
+    )
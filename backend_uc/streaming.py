@@ -0,0 +1,45 @@
+# streaming.py
+"""
+Respostas NDJSON (um objeto JSON por linha) para listas grandes.
+- Ativado por `Accept: application/x-ndjson` ou `?stream=1`.
+- As linhas são escritas à medida que saem da query (yield_per), em lotes,
+  então a memória fica constante qualquer que seja o tamanho do resultado.
+"""
+
+import json
+from fastapi.responses import StreamingResponse
+
+MEDIA_TYPE = "application/x-ndjson"
+LOTE = 1000
+
+
+def quer_stream(request, stream=False):
+    return bool(stream) or MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _linhas(registros, lote):
+    buffer = []
+    for registro in registros:
+        buffer.append(json.dumps(registro, ensure_ascii=False, default=str))
+        if len(buffer) >= lote:
+            yield ("\n".join(buffer) + "\n").encode("utf-8")
+            buffer = []
+    if buffer:
+        yield ("\n".join(buffer) + "\n").encode("utf-8")
+
+
+def resposta_ndjson(registros, lote=LOTE):
+    return StreamingResponse(_linhas(registros, lote), media_type=MEDIA_TYPE)
+
+
+def consulta_em_lotes(criar_sessao, montar_query, serializar, lote=LOTE):
+    """
+    Itera a query com yield_per numa sessão própria: a sessão da dependência get_db
+    não pode ser usada aqui, pois o corpo é gerado depois que o endpoint retorna.
+    """
+    db = criar_sessao()
+    try:
+        for obj in montar_query(db).yield_per(lote):
+            yield serializar(obj)
+    finally:
+        db.close()
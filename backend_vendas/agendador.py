@@ -0,0 +1,102 @@
+# agendador.py
+"""
+Agendador das chamadas de geocoding do ETL.
+- Cada provedor tem o seu limite: concorrência máxima (semáforo) e intervalo mínimo entre
+  chamadas (BrasilAPI em paralelo; Nominatim serializado a 1 req / 1,2 s, pela política de uso).
+- Falhas transitórias (timeout, 429, 5xx) são repetidas com backoff exponencial + jitter.
+- Circuit breaker por provedor: após N falhas seguidas o provedor fica "aberto" por um tempo
+  e as chamadas falham na hora (CircuitoAberto), em vez de cada linha esperar o timeout.
+  Passada a pausa, a próxima chamada testa o serviço: sucesso fecha, falha reabre.
+- Provedor inativo (ETL em modo offline): toda chamada falha na hora, sem rede.
+- mapear(): executa uma função sobre uma lista num pool de threads, com resultados na ordem.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FalhaTransitoria(Exception):
+    """Resposta que vale tentar de novo (ex.: HTTP 429/5xx)."""
+
+
+class CircuitoAberto(Exception):
+    pass
+
+
+class Provedor:
+    def __init__(
+        self, nome, concorrencia=1, intervalo_s=0.0, transitorios=(FalhaTransitoria,),
+        tentativas=3, backoff_s=1.0, limite_falhas=5, pausa_circuito_s=60.0, ativo=True,
+    ):
+        self.nome = nome
+        self.ativo = ativo
+        self.intervalo_s = intervalo_s
+        self.transitorios = transitorios
+        self.tentativas = tentativas
+        self.backoff_s = backoff_s
+        self.limite_falhas = limite_falhas
+        self.pausa_circuito_s = pausa_circuito_s
+
+        self._semaforo = threading.BoundedSemaphore(concorrencia)
+        self._trava = threading.Lock()
+        self._proxima = 0.0       # instante (monotonic) liberado para a próxima chamada
+        self._falhas = 0          # falhas seguidas
+        self._aberto_ate = 0.0
+
+    def _aguardar_vez(self):
+        with self._trava:
+            agora = time.monotonic()
+            inicio = max(agora, self._proxima)
+            self._proxima = inicio + self.intervalo_s
+        if inicio > agora:
+            time.sleep(inicio - agora)
+
+    def _verificar_circuito(self):
+        if not self.ativo:
+            raise CircuitoAberto(f"{self.nome} (offline)")
+        with self._trava:
+            if time.monotonic() < self._aberto_ate:
+                raise CircuitoAberto(self.nome)
+
+    def _registrar(self, sucesso):
+        with self._trava:
+            if sucesso:
+                self._falhas = 0
+                return
+            self._falhas += 1
+            # Continua >= limite até um sucesso: no teste após a pausa, uma falha já reabre
+            if self._falhas >= self.limite_falhas:
+                self._aberto_ate = time.monotonic() + self.pausa_circuito_s
+                print(f"\n⚠️  {self.nome}: {self._falhas} falhas seguidas, pausando por {self.pausa_circuito_s:.0f}s")
+
+    def chamar(self, funcao, *args, **kwargs):
+        """
+        Executa `funcao` respeitando concorrência, intervalo, retry e circuito do provedor.
+        Erros não transitórios sobem direto; transitórios sobem depois da última tentativa.
+        """
+        for tentativa in range(self.tentativas):
+            self._verificar_circuito()
+            with self._semaforo:
+                self._aguardar_vez()
+                try:
+                    resultado = funcao(*args, **kwargs)
+                except self.transitorios:
+                    self._registrar(False)
+                    if tentativa == self.tentativas - 1:
+                        raise
+                else:
+                    self._registrar(True)
+                    return resultado
+            time.sleep(self.backoff_s * 2 ** tentativa * random.uniform(1.0, 1.5))
+
+
+def mapear(funcao, itens, concorrencia):
+    """Gera funcao(item) para cada item, na ordem dos itens, com até `concorrencia` threads."""
+    if concorrencia <= 1:
+        for item in itens:
+            yield funcao(item)
+        return
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        yield from executor.map(funcao, itens)
@@ -0,0 +1,135 @@
+# agregados.py
+"""
+Agregações de vendas (quantidade, soma e média de valor_venda) agrupadas por dimensão.
+- Cubo pré-calculado pelo ETL: tabela `clientes_cubo` com uma linha por combinação de
+  rede, tipo_cliente, funil, representante, regiao, responsavel, uf e mês, já somada.
+  Agrupar/filtrar por essas dimensões é só um GROUP BY sobre o cubo (bem menor que `clientes`).
+- Filtros que o cubo não resolve (faixa de valor, busca textual, datas fora do limite do mês)
+  caem no GROUP BY direto sobre `clientes`, com os mesmos filtros de apply_filters_to_query.
+"""
+
+from datetime import timedelta
+from sqlalchemy import text, func, select, table, column
+from database import versao_dataset
+from models import Cliente
+
+CUBO_TABLE = "clientes_cubo"
+COLUNAS_CUBO = ("rede", "tipo_cliente", "funil", "representante", "regiao", "responsavel", "uf")
+DIMENSOES = COLUNAS_CUBO + ("mes",)
+
+# Mesmo recorte de apply_filters_to_query: só clientes com coordenadas
+DDL_CUBO = [
+    f"DROP TABLE IF EXISTS {CUBO_TABLE}",
+    f"""CREATE TABLE {CUBO_TABLE} AS
+        SELECT {", ".join(COLUNAS_CUBO)},
+               strftime('%Y-%m', data) AS mes,
+               COUNT(*) AS quantidade,
+               SUM(valor_venda) AS soma,
+               COUNT(valor_venda) AS com_valor
+        FROM clientes
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        GROUP BY {", ".join(COLUNAS_CUBO)}, mes""",
+]
+
+cubo = table(CUBO_TABLE, *(column(c) for c in DIMENSOES), column("quantidade"), column("soma"), column("com_valor"))
+
+
+def _existe(conn):
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": CUBO_TABLE}
+    ).first() is not None
+
+
+def garantir_cubo(engine, reconstruir=False):
+    """Cria o cubo se faltar; com `reconstruir=True` recalcula a partir de `clientes` (usado pelo ETL)."""
+    with engine.begin() as conn:
+        if reconstruir or not _existe(conn):
+            for ddl in DDL_CUBO:
+                conn.execute(text(ddl))
+
+
+_disponivel = {"versao": None, "ok": False}
+
+def cubo_disponivel(db):
+    """True se o banco atual tem o cubo (verificado uma vez por versão)."""
+    versao = versao_dataset()
+    if _disponivel["versao"] != versao:
+        _disponivel["ok"] = _existe(db)
+        _disponivel["versao"] = versao
+    return _disponivel["ok"]
+
+
+def _ultimo_dia_do_mes(d):
+    return (d + timedelta(days=1)).day == 1
+
+
+def cubo_atende(filtros):
+    """O cubo só resolve filtros por dimensão e períodos de meses inteiros."""
+    if filtros.get("busca_texto") or filtros.get("bbox") or filtros.get("valor_min") is not None or filtros.get("valor_max") is not None:
+        return False
+    if filtros.get("data_inicio") and filtros["data_inicio"].day != 1:
+        return False
+    if filtros.get("data_fim") and not _ultimo_dia_do_mes(filtros["data_fim"]):
+        return False
+    return True
+
+
+def _agregar_cubo(db, por, filtros):
+    stmt = select(
+        *(cubo.c[d] for d in por),
+        func.sum(cubo.c.quantidade), func.sum(cubo.c.soma), func.sum(cubo.c.com_valor),
+    )
+    for col in COLUNAS_CUBO:
+        if filtros.get(col):
+            stmt = stmt.where(cubo.c[col].in_(filtros[col]))
+    # mes NULL (venda sem data) nunca passa na comparação, igual ao filtro de data no SQL
+    if filtros.get("data_inicio"):
+        stmt = stmt.where(cubo.c.mes >= filtros["data_inicio"].strftime("%Y-%m"))
+    if filtros.get("data_fim"):
+        stmt = stmt.where(cubo.c.mes <= filtros["data_fim"].strftime("%Y-%m"))
+    if por:
+        stmt = stmt.group_by(*(cubo.c[d] for d in por)).order_by(*(cubo.c[d] for d in por))
+    return db.execute(stmt).all()
+
+
+def _expressao(dimensao):
+    if dimensao == "mes":
+        return func.strftime("%Y-%m", Cliente.data).label("mes")
+    return getattr(Cliente, dimensao)
+
+
+def _agregar_sql(db, por, filtros, aplicar_filtros):
+    exprs = [_expressao(d) for d in por]
+    query = db.query(*exprs, func.count(Cliente.id), func.sum(Cliente.valor_venda), func.count(Cliente.valor_venda))
+    query = aplicar_filtros(query, **filtros)
+    if exprs:
+        query = query.group_by(*exprs).order_by(*exprs)
+    return query.all()
+
+
+def _metricas(quantidade, soma, com_valor):
+    return {
+        "quantidade": int(quantidade or 0),
+        "soma": round(soma or 0.0, 2),
+        "media": round(soma / com_valor, 2) if com_valor else None,
+    }
+
+
+def agregar(db, por, filtros, aplicar_filtros):
+    """
+    Rollup de valor_venda agrupado pelas dimensões `por` (lista vazia = só o total).
+    `aplicar_filtros` é o apply_filters_to_query do main, usado quando o cubo não atende.
+    """
+    if cubo_atende(filtros) and cubo_disponivel(db):
+        fonte, linhas = "cubo", _agregar_cubo(db, por, filtros)
+    else:
+        fonte, linhas = "sql", _agregar_sql(db, por, filtros, aplicar_filtros)
+
+    n = len(por)
+    grupos = [{**dict(zip(por, linha[:n])), **_metricas(*linha[n:])} for linha in linhas] if por else []
+    total = _metricas(
+        sum(linha[n] or 0 for linha in linhas),
+        sum(linha[n + 1] or 0.0 for linha in linhas),
+        sum(linha[n + 2] or 0 for linha in linhas),
+    )
+    return {"por": list(por), "fonte": fonte, "total": total, "grupos": grupos}
@@ -0,0 +1,73 @@
+# autenticacao.py
+"""
+Desempenho do caminho de autenticação (usado pelo main.py):
+- O bcrypt (custo 12, ~250 ms de CPU por verificação) roda num pool de threads limitado,
+  fora do event loop: uma rajada de logins não trava as outras requisições.
+  Logins além da fila (LEDAX_LOGIN_FILA) recebem 503 em vez de acumularem sem limite.
+- Tokens já validados ficam num cache LRU até o `exp` deles, poupando o jwt.decode
+  em cada chamada da API.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+BCRYPT_WORKERS = int(os.getenv("LEDAX_BCRYPT_WORKERS", "2"))
+LOGIN_FILA = int(os.getenv("LEDAX_LOGIN_FILA", "32"))
+MAX_TOKENS = int(os.getenv("LEDAX_CACHE_TOKENS", "1024"))
+
+
+class FilaCheia(Exception):
+    pass
+
+
+class PoolHash:
+    """Executa funções de hash de senha em threads dedicadas, com fila limitada."""
+
+    def __init__(self, workers=BCRYPT_WORKERS, fila=LOGIN_FILA):
+        self.fila = fila
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._pendentes = 0  # só é alterado no event loop, não precisa de lock
+
+    async def executar(self, funcao, *args):
+        if self._pendentes >= self.fila:
+            raise FilaCheia()
+        self._pendentes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, funcao, *args)
+        finally:
+            self._pendentes -= 1
+
+
+class CacheTokens:
+    """LRU de token -> payload já verificado; cada item vale até o `exp` do próprio token."""
+
+    def __init__(self, max_itens=MAX_TOKENS):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            item = self._itens.get(token)
+            if item is None:
+                return None
+            payload, exp = item
+            if exp <= time.time():
+                del self._itens[token]
+                return None
+            self._itens.move_to_end(token)
+            return payload
+
+    def set(self, token, payload):
+        exp = payload.get("exp")
+        if exp is None:
+            return  # sem expiração não há como saber até quando confiar
+        with self._lock:
+            self._itens[token] = (payload, exp)
+            self._itens.move_to_end(token)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
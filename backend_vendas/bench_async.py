@@ -0,0 +1,110 @@
+# bench_async.py
+"""
+Benchmark do caminho assíncrono (AsyncSession + aiosqlite) de /api/vendas/dados contra
+o caminho sync antigo (Session no threadpool), sob alta concorrência.
+
+A API sobe num uvicorn separado; este módulo registra nela uma cópia sync do endpoint
+(/bench/sync/dados) com as mesmas dependências, cache e codificação. Cada requisição usa
+um valor_min diferente para não cair no cache nem ser coalescida.
+
+Uso: python bench_async.py --concorrencia 64 --segundos 10 --senha <senha do admin>
+(dependências: pip install -r requirements-dev.txt)
+"""
+
+import argparse
+import asyncio
+import itertools
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from fastapi import Depends, Query
+from sqlalchemy.orm import Session
+import httpx
+from main import (
+    app, get_db, get_current_user, filtros_vendas, chave_filtros,
+    cache_dados, cache_resultados, corpo_dados,
+)
+
+
+@app.get("/bench/sync/dados", include_in_schema=False)
+def get_vendas_dados_sync(
+    motor: str = Query("sql"),
+    filtros: dict = Depends(filtros_vendas),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+    cache: dict = Depends(cache_dados)
+):
+    chave = ("bench-sync", chave_filtros(filtros), motor)
+    return cache_resultados.obter(chave, lambda: corpo_dados(db, filtros, motor, None, None, None, None)).resposta(cache)
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def carga(base, rota, headers, concorrencia, segundos):
+    contador = itertools.count(1)
+    latencias, erros = [], 0
+    fim = time.perf_counter() + segundos
+
+    async def trabalhador(cliente):
+        nonlocal erros
+        while time.perf_counter() < fim:
+            url = f"{base}{rota}?motor=sql&uf=BA&valor_min={-next(contador)}"
+            inicio = time.perf_counter()
+            r = await cliente.get(url, headers=headers)
+            if r.status_code != 200:
+                erros += 1
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(limits=limites, timeout=60) as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador(cliente) for _ in range(concorrencia)))
+        duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    print(
+        f"{rota:<22} {len(latencias) / duracao:8.1f} req/s  p50={statistics.median(latencias):7.1f}ms "
+        f"p95={latencias[int(len(latencias) * 0.95) - 1]:7.1f}ms  erros={erros}"
+    )
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concorrencia", type=int, default=64)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--usuario", default="admin")
+    parser.add_argument("--senha", required=True)
+    args = parser.parse_args()
+
+    porta = porta_livre()
+    base = f"http://127.0.0.1:{porta}"
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench_async:app", "--port", str(porta), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(200):
+            try:
+                r = httpx.post(f"{base}/token", data={"username": args.usuario, "password": args.senha})
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        print(f"Concorrência {args.concorrencia}, {args.segundos:.0f}s por rota\n")
+        for rota in ("/bench/sync/dados", "/api/vendas/dados"):
+            asyncio.run(carga(base, rota, headers, args.concorrencia, args.segundos))
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+
+if __name__ == "__main__":
+    main_bench()
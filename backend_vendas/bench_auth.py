@@ -0,0 +1,97 @@
+# bench_auth.py
+"""
+Teste de carga do caminho de autenticação: sobe a API num uvicorn local e mede a
+latência de um endpoint de dados sozinho e durante uma rajada de logins (/token).
+Com o bcrypt fora do event loop as duas distribuições devem ficar parecidas;
+antes, cada login travava todas as requisições por ~250 ms.
+
+Uso: python bench_auth.py --logins 40 --consultas 200 --senha <senha do admin>
+"""
+
+import argparse
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import uvicorn
+import main
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def subir_api(porta):
+    servidor = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=porta, log_level="warning"))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor
+
+
+def medir(sessao, url, headers, minimo, enquanto=None):
+    """Latências (ms) de GETs sequenciais: pelo menos `minimo`, e enquanto `enquanto()` for True."""
+    latencias = []
+    while len(latencias) < minimo or (enquanto and enquanto()):
+        inicio = time.perf_counter()
+        sessao.get(url, headers=headers).raise_for_status()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias
+
+
+def resumo(nome, latencias):
+    ordenadas = sorted(latencias)
+    p95 = ordenadas[int(len(ordenadas) * 0.95) - 1]
+    print(
+        f"{nome:<22} n={len(ordenadas):<5} p50={statistics.median(ordenadas):7.1f}ms "
+        f"p95={p95:7.1f}ms max={ordenadas[-1]:7.1f}ms"
+    )
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--usuario", default="admin")
+    parser.add_argument("--senha", required=True)
+    parser.add_argument("--endpoint", default="/api/vendas/filtros?uf=SP")
+    args = parser.parse_args()
+
+    porta = porta_livre()
+    servidor = subir_api(porta)
+    base = f"http://127.0.0.1:{porta}"
+    credenciais = {"username": args.usuario, "password": args.senha}
+
+    sessao = requests.Session()
+    r = sessao.post(f"{base}/token", data=credenciais)
+    r.raise_for_status()
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    alvo = base + args.endpoint
+    medir(sessao, alvo, headers, 10)  # aquece snapshot e caches
+
+    resumo("sem logins", medir(sessao, alvo, headers, args.consultas))
+
+    resultados = []
+    def rajada():
+        with ThreadPoolExecutor(max_workers=args.logins) as pool:
+            inicio = time.perf_counter()
+            codigos = list(pool.map(lambda _: requests.post(f"{base}/token", data=credenciais).status_code, range(args.logins)))
+            resultados.append((codigos, time.perf_counter() - inicio))
+
+    logins = threading.Thread(target=rajada)
+    logins.start()
+    resumo("durante os logins", medir(sessao, alvo, headers, args.consultas, enquanto=logins.is_alive))
+    logins.join()
+
+    codigos, duracao = resultados[0]
+    contagem = {c: codigos.count(c) for c in sorted(set(codigos))}
+    print(f"\n{args.logins} logins em {duracao:.2f}s, status: {contagem}")
+    servidor.should_exit = True
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,83 @@
+# bench_busca.py
+"""
+Benchmark do filtro busca_texto: ILIKE antigo (6 colunas) x índice FTS5.
+Copia `clientes` para um banco temporário, multiplicando as linhas por --fator
+para simular tabelas maiores, e mede a latência média de cada termo.
+
+Uso: python bench_busca.py --fator 200 --repeticoes 20
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from sqlalchemy import create_engine
+from database import DB_PATH
+import busca
+
+TERMOS = ["salvador", "são paulo", "atacadão", "rua", "cencosud", "av sete"]
+
+
+def preparar_banco(destino, fator):
+    origem = sqlite3.connect(DB_PATH)
+    dest = sqlite3.connect(destino)
+    origem.backup(dest)
+    origem.close()
+
+    # Mede a partir de um banco "antigo", sem índice nem triggers
+    for trigger in ("clientes_fts_ai", "clientes_fts_ad", "clientes_fts_au"):
+        dest.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    dest.execute(f"DROP TABLE IF EXISTS {busca.FTS_TABLE}")
+
+    cols = [r[1] for r in dest.execute("PRAGMA table_info(clientes)") if r[1] != "id"]
+    lista = ", ".join(cols)
+    max_id = dest.execute("SELECT MAX(id) FROM clientes").fetchone()[0]
+    for _ in range(fator - 1):
+        dest.execute(f"INSERT INTO clientes ({lista}) SELECT {lista} FROM clientes WHERE id <= ?", (max_id,))
+    dest.commit()
+    dest.close()
+
+
+def medir(conn, sql, params, repeticoes):
+    conn.execute(sql, params).fetchall()  # aquece o cache de páginas
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        n = len(conn.execute(sql, params).fetchall())
+    return (time.perf_counter() - inicio) / repeticoes * 1000, n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fator", type=int, default=100)
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, "bench.db")
+        print(f"📦 Preparando cópia x{args.fator} de {DB_PATH}...")
+        preparar_banco(caminho, args.fator)
+
+        inicio = time.perf_counter()
+        busca.garantir_indice_fts(create_engine(f"sqlite:///{caminho}"))
+        print(f"🔎 Índice FTS criado em {time.perf_counter() - inicio:.2f}s")
+
+        conn = sqlite3.connect(caminho)
+        total = conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
+        print(f"Linhas: {total}\n")
+
+        sql_like = "SELECT id FROM clientes WHERE " + " OR ".join(
+            f"lower({c}) LIKE lower(:t)" for c in busca.COLUNAS_FTS
+        )
+        sql_fts = f"SELECT rowid FROM {busca.FTS_TABLE} WHERE {busca.FTS_TABLE} MATCH :q"
+
+        print(f"{'termo':<12} {'ILIKE (ms)':>11} {'linhas':>8} {'FTS5 (ms)':>10} {'linhas':>8} {'ganho':>7}")
+        for termo in TERMOS:
+            t_like, n_like = medir(conn, sql_like, {"t": f"%{termo.upper()}%"}, args.repeticoes)
+            t_fts, n_fts = medir(conn, sql_fts, {"q": busca.expressao_fts(termo)}, args.repeticoes)
+            print(f"{termo:<12} {t_like:>11.2f} {n_like:>8} {t_fts:>10.2f} {n_fts:>8} {t_like / t_fts:>6.1f}x")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
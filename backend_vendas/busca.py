@@ -0,0 +1,90 @@
+# busca.py
+"""
+Índice de busca textual (SQLite FTS5) para o filtro `busca_texto`.
+- Tabela virtual `clientes_fts` com conteúdo externo (lê de `clientes`), sobre as
+  mesmas colunas que o antigo ILIKE varria.
+- Tokenizador unicode61 com remove_diacritics: "SAO" acha "São", "conceicao" acha "Conceição".
+- Triggers mantêm o índice em sincronia com inserts/updates/deletes; o ETL ainda faz um
+  rebuild no final da carga (mais rápido que atualizar linha a linha).
+- A busca casa prefixos de palavras: "salv" acha "SALVADOR"; todas as palavras precisam aparecer.
+"""
+
+import re
+from sqlalchemy import text, column
+from database import versao_dataset
+
+FTS_TABLE = "clientes_fts"
+COLUNAS_FTS = ("titulo", "endereco_cliente", "local_de_entrega", "cidade", "uf", "rede")
+
+_COLS = ", ".join(COLUNAS_FTS)
+_NEW_COLS = ", ".join(f"new.{c}" for c in COLUNAS_FTS)
+_OLD_COLS = ", ".join(f"old.{c}" for c in COLUNAS_FTS)
+
+DDL_FTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_COLS},
+        content='clientes', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 2"
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS clientes_fts_ai AFTER INSERT ON clientes BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_COLS}) VALUES (new.id, {_NEW_COLS});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS clientes_fts_ad AFTER DELETE ON clientes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLS}) VALUES ('delete', old.id, {_OLD_COLS});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS clientes_fts_au AFTER UPDATE ON clientes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLS}) VALUES ('delete', old.id, {_OLD_COLS});
+        INSERT INTO {FTS_TABLE}(rowid, {_COLS}) VALUES (new.id, {_NEW_COLS});
+    END""",
+]
+
+
+def _existe(conn):
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": FTS_TABLE}
+    ).first() is not None
+
+
+def garantir_indice_fts(engine, reconstruir=False):
+    """
+    Cria a tabela FTS e os triggers se faltarem (e popula).
+    Com `reconstruir=True` refaz o índice inteiro a partir de `clientes` (usado pelo ETL).
+    """
+    with engine.begin() as conn:
+        novo = not _existe(conn)
+        for ddl in DDL_FTS:
+            conn.execute(text(ddl))
+        if novo or reconstruir:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+_disponivel = {"versao": None, "ok": False}
+
+def fts_disponivel(db):
+    """True se o banco atual tem o índice FTS (verificado uma vez por versão)."""
+    versao = versao_dataset()
+    if _disponivel["versao"] != versao:
+        _disponivel["ok"] = _existe(db)
+        _disponivel["versao"] = versao
+    return _disponivel["ok"]
+
+
+def expressao_fts(busca_texto):
+    """
+    Converte o texto digitado numa expressão MATCH: cada palavra vira um prefixo
+    entre aspas (neutraliza operadores do FTS5) e todas são exigidas (AND).
+    Retorna None se não houver nenhuma palavra.
+    """
+    palavras = re.findall(r"\w+", busca_texto or "")
+    if not palavras:
+        return None
+    return " ".join('"{}"*'.format(p.replace('"', '""')) for p in palavras)
+
+
+def subconsulta_ids(expressao):
+    """SELECT rowid FROM clientes_fts WHERE ... MATCH — para usar em Cliente.id.in_(...)."""
+    return (
+        text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q")
+        .bindparams(q=expressao)
+        .columns(column("rowid"))
+    )
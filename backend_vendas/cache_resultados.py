@@ -0,0 +1,171 @@
+# cache_resultados.py
+"""
+Cache das respostas de /api/vendas/dados e /api/vendas/filtros, já serializadas.
+- Chave: endpoint + filtros canônicos (ver chave_filtros no main.py) + formato/paginação.
+- LRU limitado por quantidade de itens e por bytes (LEDAX_CACHE_ITENS / LEDAX_CACHE_MB).
+- Esvaziado sozinho quando o ETL grava uma nova versão do ledax.db.
+- Single-flight: requisições idênticas simultâneas esperam a primeira terminar e
+  reaproveitam o resultado, em vez de dispararem a mesma consulta várias vezes no SQLite.
+  `obter` atende endpoints sync (espera em threading.Event); `obter_async`, endpoints
+  async (espera num Future, sem bloquear o event loop).
+"""
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from fastapi import Response
+from database import versao_dataset
+
+MAX_ITENS = int(os.getenv("LEDAX_CACHE_ITENS", "256"))
+MAX_BYTES = int(float(os.getenv("LEDAX_CACHE_MB", "128")) * 1024 * 1024)
+
+
+class RespostaCacheada:
+    """Corpo já codificado + media type + headers próprios do resultado (ex.: paginação)."""
+
+    __slots__ = ("corpo", "media_type", "headers")
+
+    def __init__(self, corpo, media_type, headers=None):
+        self.corpo = corpo
+        self.media_type = media_type
+        self.headers = headers or {}
+
+    def resposta(self, headers=None):
+        # Um Response novo por requisição: os headers de cache variam por URL
+        return Response(content=self.corpo, media_type=self.media_type, headers={**self.headers, **(headers or {})})
+
+
+class _Voo:
+    """Cálculo em andamento de uma chave; os seguidores esperam no evento."""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.valor = None
+        self.erro = None
+
+
+class CacheResultados:
+    def __init__(self, max_itens=MAX_ITENS, max_bytes=MAX_BYTES):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._em_voo = {}
+        self._em_voo_async = {}
+        self._versao = None
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+        self.coalescidas = 0
+
+    def _limpar_se_nova_versao(self, versao):
+        if versao != self._versao:
+            self._itens.clear()
+            self._bytes = 0
+            self._versao = versao
+
+    def _guardar(self, chave, valor):
+        tamanho = len(valor.corpo)
+        if tamanho > self.max_bytes:
+            return
+        self._itens[chave] = valor
+        self._bytes += tamanho
+        while len(self._itens) > self.max_itens or self._bytes > self.max_bytes:
+            _, antigo = self._itens.popitem(last=False)
+            self._bytes -= len(antigo.corpo)
+
+    def _acerto(self, chave):
+        # Chamado com o lock
+        valor = self._itens.get(chave)
+        if valor is not None:
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+        return valor
+
+    def obter(self, chave, calcular):
+        """
+        RespostaCacheada da `chave`; se faltar, chama `calcular()` uma única vez
+        mesmo com várias requisições iguais em paralelo (erros também são repassados).
+        """
+        versao = versao_dataset()
+        chave = (versao,) + tuple(chave)
+
+        with self._lock:
+            self._limpar_se_nova_versao(versao)
+            valor = self._acerto(chave)
+            if valor is not None:
+                return valor
+            voo = self._em_voo.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._em_voo[chave] = _Voo()
+                self.faltas += 1
+            else:
+                self.coalescidas += 1
+
+        if not lider:
+            voo.evento.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.valor
+
+        try:
+            voo.valor = calcular()
+        except BaseException as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                self._em_voo.pop(chave, None)
+                if voo.erro is None and self._versao == versao:
+                    self._guardar(chave, voo.valor)
+            voo.evento.set()
+        return voo.valor
+
+    async def obter_async(self, chave, calcular):
+        """Como `obter`, mas `calcular` é uma corotina e os seguidores aguardam sem travar o loop."""
+        versao = versao_dataset()
+        chave = (versao,) + tuple(chave)
+
+        with self._lock:
+            self._limpar_se_nova_versao(versao)
+            valor = self._acerto(chave)
+            if valor is not None:
+                return valor
+            futuro = self._em_voo_async.get(chave)
+            lider = futuro is None
+            if lider:
+                futuro = self._em_voo_async[chave] = asyncio.get_running_loop().create_future()
+                self.faltas += 1
+            else:
+                self.coalescidas += 1
+
+        if not lider:
+            return await asyncio.shield(futuro)
+
+        try:
+            valor = await calcular()
+        except BaseException as e:
+            with self._lock:
+                self._em_voo_async.pop(chave, None)
+            if isinstance(e, asyncio.CancelledError):
+                futuro.cancel()
+            else:
+                futuro.set_exception(e)
+                futuro.exception()  # marca como lida: sem seguidores, o asyncio não loga o erro de novo
+            raise
+
+        with self._lock:
+            self._em_voo_async.pop(chave, None)
+            if self._versao == versao:
+                self._guardar(chave, valor)
+        futuro.set_result(valor)
+        return valor
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "itens": len(self._itens), "bytes": self._bytes,
+                "acertos": self.acertos, "faltas": self.faltas, "coalescidas": self.coalescidas,
+            }
@@ -0,0 +1,88 @@
+# clusters.py
+"""
+Índice hierárquico de clusters (grade Web Mercator) para o mapa de vendas.
+- Construído uma vez por versão do banco a partir do snapshot dos clientes.
+- Cada ponto guarda a célula no zoom máximo; a célula em qualquer zoom menor
+  é obtida por deslocamento de bits (quadtree implícita), sem reprocessar os dados.
+- A consulta agrega só o que cai no viewport: centroide, quantidade e soma de valor_venda.
+"""
+
+import math
+import numpy as np
+from snapshot import CachePorVersao
+
+MAX_ZOOM = 16
+# Tamanho da célula em pixels de tela (tile de 256px -> 4 células por eixo)
+CELULA_PX = 64
+_BITS_CELULA = int(math.log2(256 // CELULA_PX))
+
+LAT_MAX_MERCATOR = 85.05112878
+
+
+def lonlat_para_mercator(lon, lat):
+    """Projeta lon/lat (graus) para coordenadas Web Mercator normalizadas em [0, 1)."""
+    lat = np.clip(lat, -LAT_MAX_MERCATOR, LAT_MAX_MERCATOR)
+    x = (lon + 180.0) / 360.0
+    sen = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + sen) / (1 - sen)) / (4 * math.pi)
+    return np.clip(x, 0.0, 1.0 - 1e-12), np.clip(y, 0.0, 1.0 - 1e-12)
+
+
+class IndiceClusters:
+    def __init__(self, snap):
+        self.snap = snap
+        self.versao = snap.versao
+        x, y = lonlat_para_mercator(snap.lon, snap.lat)
+        escala = 2 ** (MAX_ZOOM + _BITS_CELULA)
+        self.cx = (x * escala).astype(np.int64)
+        self.cy = (y * escala).astype(np.int64)
+
+    def agrupar(self, zoom, mascara=None, bbox=None):
+        """
+        Agrupa os pontos selecionados por `mascara` (e dentro do `bbox`) nas células do `zoom`.
+        Retorna lista de dicts com centroide, quantidade e valor_total.
+        """
+        snap = self.snap
+        zoom = max(0, min(int(zoom), MAX_ZOOM))
+
+        sel = np.ones(len(snap), dtype=bool) if mascara is None else mascara.copy()
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            sel &= (snap.lon >= min_lon) & (snap.lon <= max_lon)
+            sel &= (snap.lat >= min_lat) & (snap.lat <= max_lat)
+
+        idx = np.flatnonzero(sel)
+        if idx.size == 0:
+            return []
+
+        desloc = MAX_ZOOM - zoom
+        chave = ((self.cx[idx] >> desloc) << 32) | (self.cy[idx] >> desloc)
+        _, grupo = np.unique(chave, return_inverse=True)
+
+        qtd = np.bincount(grupo)
+        lat = np.bincount(grupo, weights=snap.lat[idx]) / qtd
+        lon = np.bincount(grupo, weights=snap.lon[idx]) / qtd
+        valor = np.bincount(grupo, weights=snap.valor[idx])
+
+        # Para células com um único ponto devolvemos o id (o front desenha o marcador direto)
+        id_unico = np.zeros(len(qtd), dtype=np.int64)
+        id_unico[grupo] = snap.ids[idx]
+
+        return [
+            {
+                "lat": round(float(lat[i]), 6),
+                "lon": round(float(lon[i]), 6),
+                "quantidade": int(qtd[i]),
+                "valor_total": round(float(valor[i]), 2),
+                "id": int(id_unico[i]) if qtd[i] == 1 else None,
+            }
+            for i in range(len(qtd))
+        ]
+
+
+_cache = CachePorVersao(IndiceClusters)
+
+
+def obter_indice():
+    """Retorna o índice de clusters da versão atual do banco (reconstrói se mudou)."""
+    return _cache.obter()
@@ -1,26 +1,67 @@
 # database.py
 import os
-from sqlalchemy import create_engine
+import time
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from armazenamento import criar_engine_escrita, criar_engine_leitura, criar_engine_async_leitura, stat_banco
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_DIR = os.path.join(BASE_DIR, "data")
+# Pasta do banco e dos derivados (.versao, grades do heatmap); LEDAX_DATA_DIR aponta para outra (ex.: testes)
+DB_DIR = os.getenv("LEDAX_DATA_DIR", os.path.join(BASE_DIR, "data"))
 os.makedirs(DB_DIR, exist_ok=True)
 
 DB_PATH = os.path.join(DB_DIR, "ledax.db")
 DATABASE_URL = f"sqlite:///{DB_PATH}"
 
-print("\n===== DEBUG DATABASE.PY =====")
-print("BASE_DIR:", BASE_DIR)
-print("DB_DIR (esperado):", DB_DIR)
-print("DB_PATH (onde o banco SERÁ criado):", DB_PATH)
-print("=====================================\n")
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Writer único: ETL e migrações da subida da API (ver armazenamento.py)
+engine = criar_engine_escrita(DB_PATH)
 
-# 🔥 AQUI ESTÁ O QUE FALTAVA
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Leitura da API: pool de conexões read-only, que não disputam o lock de escrita
+engine_leitura = criar_engine_leitura(DB_PATH)
+SessionLeitura = sessionmaker(autocommit=False, autoflush=False, bind=engine_leitura)
+
 Base = declarative_base()
+
+# Caminho assíncrono (aiosqlite, também read-only) para os endpoints async: a espera
+# pelo SQLite não ocupa uma thread do threadpool do FastAPI por requisição.
+async_engine = criar_engine_async_leitura(DB_PATH)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+VERSAO_PATH = DB_PATH + ".versao"
+
+def versao_dataset():
+    """
+    Versão atual do dataset: o token gravado pelo etl.py em VERSAO_PATH a cada carga
+    (ver nova_versao_dataset). Bancos ainda sem esse arquivo usam mtime + tamanho do .db (e do -wal).
+    Usada para invalidar caches em memória e como base dos ETags da API.
+    """
+    try:
+        with open(VERSAO_PATH, encoding="utf-8") as f:
+            versao = f.read().strip()
+        if versao:
+            return versao
+    except OSError:
+        pass
+    try:
+        mtime, tamanho = stat_banco(DB_PATH)
+    except OSError:
+        return None
+    return f"{mtime}-{tamanho}"
+
+
+def nova_versao_dataset():
+    """Grava um novo token de versão (chamado pelo etl.py no fim da carga)."""
+    versao = f"{time.time_ns():x}"
+    temporario = VERSAO_PATH + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(versao)
+    os.replace(temporario, VERSAO_PATH)  # troca atômica: a API nunca lê um arquivo pela metade
+    return versao
@@ -0,0 +1,78 @@
+# diagnostico.py
+"""
+Modo debug de SQL: loga o tempo do cursor.execute e o EXPLAIN QUERY PLAN das consultas.
+Ativado pela variável de ambiente LEDAX_SQL_DEBUG:
+- "1" / "filtros": só as consultas montadas por apply_filters_to_query
+- "all": todas as consultas SELECT
+Planos com varredura completa de tabela ("SCAN <tabela>" sem índice) saem como WARNING,
+para aparecerem nos logs de produção.
+"""
+
+import logging
+import os
+import time
+from sqlalchemy import event
+
+SQL_DEBUG = os.getenv("LEDAX_SQL_DEBUG", "").strip().lower()
+ORIGEM_FILTROS = "apply_filters_to_query"
+
+logger = logging.getLogger("ledax.sql")
+
+
+def _deve_logar(statement, context):
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return False
+    if SQL_DEBUG == "all":
+        return True
+    return context is not None and context.execution_options.get("ledax_origem") == ORIGEM_FILTROS
+
+
+def _plano(conn, statement, parameters):
+    # Cursor novo pela conexão do pool, não por cursor.connection: o cursor do adaptador
+    # aiosqlite (engine async) não expõe .connection; o do pool funciona nos dois drivers
+    try:
+        cur = conn.connection.cursor()
+        try:
+            cur.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+            return [linha[3] for linha in cur.fetchall()]
+        finally:
+            cur.close()
+    except Exception as e:
+        return [f"(plano indisponível: {e})"]
+
+
+def _varredura_completa(linha):
+    return linha.startswith("SCAN ") and "USING" not in linha and "VIRTUAL TABLE" not in linha
+
+
+def instrumentar(engine):
+    """Registra os listeners no engine (não faz nada se o modo debug estiver desligado)."""
+    if not SQL_DEBUG or SQL_DEBUG in ("0", "false"):
+        return False
+
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s [%(name)s] %(levelname)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("ledax_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        ms = (time.perf_counter() - conn.info["ledax_t0"].pop()) * 1000
+        if executemany or not _deve_logar(statement, context):
+            return
+        plano = _plano(conn, statement, parameters)
+        scan = any(_varredura_completa(l) for l in plano)
+        nivel = logging.WARNING if scan else logging.INFO
+        logger.log(
+            nivel,
+            "%.2fms%s\n  SQL: %s\n  PARAMS: %s\n  PLANO:\n    %s",
+            ms, " [FULL SCAN]" if scan else "",
+            " ".join(statement.split()), parameters, "\n    ".join(plano),
+        )
+
+    return True
@@ -4,26 +4,44 @@ ETL AUTOMATIZADO - BRASIL
 - Validação Dinâmica: Compara o local achado com o centro da cidade informada no Excel.
 - Cerca Virtual Inteligente: Aceita divergências pequenas (cidades vizinhas), rejeita grandes erros.
 - Prioridade: BrasilAPI (Validado) → Nominatim (Rua + Cidade Excel) → Fallback.
+- Rede: BrasilAPI em paralelo; Nominatim serializado no limite da política (ver agendador.py).
+- Âncoras offline: centros de cidade e de prefixo de CEP vêm primeiro do gazetteer.py;
+  com LEDAX_ETL_OFFLINE=1 nenhuma chamada de rede é feita (só gazetteer + geocache).
+- Carga incremental (ver incremental.py): só linhas novas ou alteradas da planilha são
+  geocodificadas e inseridas; as que sumiram saem do banco. `--completo` recarrega tudo.
 """
 
+import argparse
 import os
 import re
 import time
-import json
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
+import numpy as np
+from sqlalchemy import select, bindparam
 from sqlalchemy.orm import sessionmaker
-from database import Base, engine, SessionLocal
+from database import engine, SessionLocal, nova_versao_dataset
 from models import Cliente
+import heatmap
+import busca
+import espacial
+import agregados
+import geografia
+import geodistancia
+import gazetteer
+import incremental
+from geocache import Geocache
+from agendador import Provedor, FalhaTransitoria, mapear
+from concurrent.futures import ThreadPoolExecutor
+from migracoes import aplicar_migracoes
 from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
-from geopy.distance import geodesic
+from geopy.exc import GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited
 from tqdm import tqdm
 
 # ---------------------------
 # Configurações
 # ---------------------------
-GEOCACHE_PATH = "data/geocache_brasil.json"
 EXCEL_PATH = "data/Amostra_DB_GERAL_DEF.xlsx"
 SAVE_CACHE_EVERY = 50
 USER_AGENT = "ledax-mapa-brasil/3.0"
@@ -32,33 +50,41 @@ USER_AGENT = "ledax-mapa-brasil/3.0"
 # 60km cobre bem regiões metropolitanas (ex: Guarulhos -> SP) sem aceitar outro estado.
 TOLERANCIA_KM = 60.0 
 
+# Colunas da planilha lidas pelo ETL: o hash da linha (carga incremental) cobre só estas
+COLUNAS_ORIGEM = (
+    "t_tulo_do_neg_cio", "data", "rede_do_neg_cio", "classifica_o_estrat_gico_spot_do_neg_cio",
+    "representante_do_neg_cio", "respons_vel_do_neg_cio", "funil", "valor", "local_de_entrega",
+    "endere_o_do_cliente", "cidade_do_cliente", "estado_do_cliente", "cep_do_cliente",
+)
+
+# Requisições simultâneas à BrasilAPI (sem limite de 1 req/s como o Nominatim)
+CONCORRENCIA_BRASILAPI = int(os.getenv("LEDAX_CONCORRENCIA_BRASILAPI", "8"))
+
+# Sem rede: resolve só pelo gazetteer e pelo geocache (o que faltar fica para a próxima carga)
+OFFLINE = os.getenv("LEDAX_ETL_OFFLINE") == "1"
+
 geolocator = Nominatim(user_agent=USER_AGENT, timeout=10)
-# Rate limiter suave para não bloquear em 300 requests
-geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1.2)
 
+# Sessão keep-alive com pool do tamanho da concorrência (uma conexão por thread)
 requests_sess = requests.Session()
 requests_sess.headers.update({"User-Agent": USER_AGENT})
+requests_sess.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=CONCORRENCIA_BRASILAPI))
+
+# Um provedor por serviço: limites, retry e circuit breaker independentes
+BRASILAPI = Provedor(
+    "BrasilAPI", concorrencia=CONCORRENCIA_BRASILAPI,
+    transitorios=(FalhaTransitoria, requests.RequestException), ativo=not OFFLINE,
+)
+NOMINATIM = Provedor(
+    "Nominatim", concorrencia=1, intervalo_s=1.2,
+    transitorios=(GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited), ativo=not OFFLINE,
+)
 
 # ---------------------------
-# Cache
+# Cache (SQLite compartilhado com os outros ETLs, ver geocache.py)
 # ---------------------------
-def load_cache(path=GEOCACHE_PATH):
-    if os.path.exists(path):
-        try:
-            with open(path, "r", encoding="utf-8") as f: return json.load(f)
-        except: return {}
-    return {}
-
-def save_cache(cache, path=GEOCACHE_PATH):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
-
-def chave_cache(tipo, valor):
-    if not valor: return None
-    return f"{tipo}::{str(valor).strip().upper()}"
-
-GEOCACHE = load_cache()
+GEOCACHE = Geocache()
+GAZETTEER = gazetteer.obter_gazetteer()
 
 # ---------------------------
 # Helpers
@@ -92,58 +118,81 @@ def get_coordenadas_cidade(cidade, uf):
     """
     Busca o centroide da cidade para servir de âncora.
     Ex: 'Campinas - SP' -> (-22.9, -47.0)
+    Ordem: gazetteer offline (microssegundos) → geocache → Nominatim.
     """
     if not cidade or not uf: return None, None
+
+    g = GAZETTEER.municipio(cidade, uf)
+    if g:
+        return g[0], g[1]
     
-    query = f"{cidade.strip()}, {uf.strip()}, Brazil"
-    key = chave_cache("CITY_CENTER", query)
-    
-    if key in GEOCACHE:
-        return GEOCACHE[key].get("lat"), GEOCACHE[key].get("lon")
+    cidade_uf = f"{cidade.strip()}, {uf.strip()}"
+    c = GEOCACHE.obter("CIDADE", cidade_uf)
+    if c is not None:
+        return c["lat"], c["lon"]
     
     try:
-        loc = geocode(query)
-        if loc:
-            GEOCACHE[key] = {"lat": loc.latitude, "lon": loc.longitude}
-            return loc.latitude, loc.longitude
-    except: pass
+        loc = NOMINATIM.chamar(geolocator.geocode, f"{cidade_uf}, Brazil")
+    except Exception:
+        return None, None # Falha de rede/serviço: sem entrada negativa, tenta de novo na próxima carga
+    if loc:
+        GEOCACHE.gravar("CIDADE", cidade_uf, loc.latitude, loc.longitude, endereco=loc.address)
+        return loc.latitude, loc.longitude
     
-    GEOCACHE[key] = {"lat": None, "lon": None}
+    GEOCACHE.gravar("CIDADE", cidade_uf)
     return None, None
 
-def validar_distancia(lat_found, lon_found, cidade_alvo, uf_alvo):
+def get_ancora(cidade, uf, cep=None):
     """
-    Retorna True se o ponto encontrado estiver dentro da tolerância da cidade alvo.
-    Retorna True se não conseguirmos validar (fallback otimista).
+    Centro de referência da validação: o da cidade e, se a cidade não tiver centroide
+    conhecido, o do prefixo de 5 dígitos do CEP no gazetteer.
     """
-    if not lat_found or not lon_found: return False
-    
-    lat_city, lon_city = get_coordenadas_cidade(cidade_alvo, uf_alvo)
-    
-    # Se não achamos a cidade no mapa, não tem como validar. Aceitamos o ponto (Otimista)
-    # ou rejeitamos? Melhor aceitar se confiamos na fonte, mas aqui vamos ser prudentes.
-    if not lat_city: 
-        return True 
-        
-    try:
-        dist = geodesic((lat_found, lon_found), (lat_city, lon_city)).km
-        return dist <= TOLERANCIA_KM
-    except:
-        return True
+    lat, lon = get_coordenadas_cidade(cidade, uf)
+    if not lat and cep:
+        g = GAZETTEER.cep(cep, digitos_min=5)
+        if g:
+            return g[0], g[1]
+    return lat, lon
+
+def validar_distancias(lat, lon, lat_ref, lon_ref):
+    """
+    Versão em lote da validação: para cada candidato (lat, lon) e a âncora da sua linha
+    do Excel (lat_ref, lon_ref, ver get_ancora), True se o ponto estiver dentro da tolerância. Uma única
+    passada haversine (ver geodistancia.py); a geodésica exata só roda para os casos no limite.
+    Sem coordenada do candidato: False. Linha sem âncora conhecida: True (otimista,
+    não há como validar).
+    """
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    lat_ref = np.asarray(lat_ref, dtype=np.float64)
+    if not len(lat):
+        return np.zeros(0, dtype=bool)
+    com_ponto = np.isfinite(lat) & np.isfinite(lon) & (lat != 0) & (lon != 0)
+    sem_centroide = ~np.isfinite(lat_ref) | (lat_ref == 0)
+    aprovados = geodistancia.dentro_do_raio(lat, lon, lat_ref, lon_ref, TOLERANCIA_KM)
+    return com_ponto & (aprovados | sem_centroide)
 
 # ---------------------------
 # Buscas
 # ---------------------------
+def _get_brasilapi(cep):
+    """JSON do CEP, None se a API não o conhece; 429/5xx viram FalhaTransitoria (retry)."""
+    r = requests_sess.get(f"https://brasilapi.com.br/api/cep/v1/{cep}", timeout=5)
+    if r.status_code == 429 or r.status_code >= 500:
+        raise FalhaTransitoria(f"BrasilAPI HTTP {r.status_code}")
+    return r.json() if r.status_code == 200 else None
+
 def buscar_brasilapi(cep):
     if not cep: return None
-    key = chave_cache("BRASILAPI", cep)
-    
-    if key in GEOCACHE and GEOCACHE[key]: return GEOCACHE[key]
+    c = GEOCACHE.obter("BRASILAPI", cep)
+    if c is not None: return c
     
     try:
-        r = requests_sess.get(f"https://brasilapi.com.br/api/cep/v1/{cep}", timeout=5)
-        if r.status_code == 200:
-            data = r.json()
+        data = BRASILAPI.chamar(_get_brasilapi, cep)
+    except Exception:
+        return None # Falha de rede/serviço: sem entrada negativa, tenta de novo na próxima carga
+
+    try:
+        if data:
             loc = data.get("location", {}).get("coordinates", {})
             lat = loc.get("latitude") or loc.get("longitude") # Fix inversão antiga v1
             lon = loc.get("longitude") or loc.get("latitude")
@@ -161,100 +210,245 @@ def buscar_brasilapi(cep):
                 "logradouro": data.get("street", ""),
                 "bairro": data.get("neighborhood", "")
             }
-            GEOCACHE[key] = res
+            endereco = f"{res['logradouro']}, {res['bairro']}, {res['cidade']} - {res['uf']}"
+            GEOCACHE.gravar("BRASILAPI", cep, endereco=endereco, **res)
             return res
     except: pass
     
-    GEOCACHE[key] = None
+    GEOCACHE.gravar("BRASILAPI", cep)
     return None
 
 def buscar_nominatim(query):
-    key = chave_cache("NOMINATIM", query)
-    if key in GEOCACHE and GEOCACHE[key]:
-        c = GEOCACHE[key]
-        return c.get("lat"), c.get("lon"), c.get("address")
+    c = GEOCACHE.obter("NOMINATIM", query)
+    if c is not None:
+        return c["lat"], c["lon"], c["endereco"]
         
     try:
-        loc = geocode(query, country_codes="br")
-        if loc:
-            res = {"lat": loc.latitude, "lon": loc.longitude, "address": loc.address}
-            GEOCACHE[key] = res
-            return loc.latitude, loc.longitude, loc.address
-    except: pass
+        loc = NOMINATIM.chamar(geolocator.geocode, query, country_codes="br")
+    except Exception:
+        return None, None, None # Falha de rede/serviço: sem entrada negativa, tenta de novo na próxima carga
+    if loc:
+        GEOCACHE.gravar("NOMINATIM", query, loc.latitude, loc.longitude, endereco=loc.address)
+        return loc.latitude, loc.longitude, loc.address
     
-    GEOCACHE[key] = None
+    GEOCACHE.gravar("NOMINATIM", query)
     return None, None, None
 
 # ---------------------------
 # Lógica Mestra
 # ---------------------------
-def geocode_inteligente(row):
+def entrada_geocode(row):
     """
-    Tenta achar lat/lon validando se faz sentido geográfico com a cidade do cliente.
+    Campos do Excel usados no geocoding, já normalizados.
     Blindada contra erros de tipo (float/NaN).
     """
-    cep = limpar_cep(row.get("cep_do_cliente"))
-    
     # --- PROTEÇÃO CONTRA O ERRO 'FLOAT' ---
     raw_endereco = row.get("endere_o_do_cliente")
     if pd.isna(raw_endereco):
         endereco = ""
     else:
         endereco = str(raw_endereco).strip() # Força virar texto
-        
+
     cidade = row.get("cidade_do_cliente")
     uf = row.get("estado_do_cliente")
-    
+
     # Normalização segura de Cidade e UF
     if not cidade or pd.isna(cidade): cidade = ""
     if not uf or pd.isna(uf): uf = ""
-    
-    # 1. TENTATIVA VIA CEP (BRASILAPI)
-    if cep:
-        res = buscar_brasilapi(cep)
-        if res and res['lat']:
-            # VALIDAÇÃO: O CEP aponta para perto da cidade do Excel?
-            if validar_distancia(res['lat'], res['lon'], cidade, uf):
-                return res['lat'], res['lon'], f"BrasilAPI (CEP: {cep})", cidade, uf
-            else:
-                # Se caiu longe, ignoramos o CEP e tentamos pelo endereço
-                pass
-
-    # 2. TENTATIVA VIA ENDEREÇO + CIDADE (NOMINATIM)
+
+    return {"cep": limpar_cep(row.get("cep_do_cliente")), "endereco": endereco, "cidade": cidade, "uf": uf}
+
+# Cada etapa tem uma chave de busca (linha -> chave ou None) e uma busca (chave -> candidato
+# (lat, lon, método) ou None). Linhas com a mesma chave compartilham uma única busca.
+def chave_cep(e):
+    return e["cep"]
+
+def candidato_cep(cep):
+    """1. TENTATIVA VIA CEP (BRASILAPI)"""
+    res = buscar_brasilapi(cep)
+    if res and res['lat']:
+        return res['lat'], res['lon'], f"BrasilAPI (CEP: {cep})"
+    return None
+
+def chave_endereco(e):
+    endereco, cidade, uf = e["endereco"], e["cidade"], e["uf"]
     if endereco and len(endereco) > 3 and cidade:
         # Limpa o endereço para aumentar chance de match
         rua_limpa = limpar_endereco_generico(endereco)
-        
         if rua_limpa:
-            query = f"{rua_limpa}, {cidade}, {uf}"
-            lat, lon, addr = buscar_nominatim(query)
-            
-            if lat and validar_distancia(lat, lon, cidade, uf):
-                 return lat, lon, "Nominatim (Endereço Completo)", cidade, uf
+            return f"{rua_limpa}, {cidade}, {uf}"
+    return None
+
+def candidato_endereco(query):
+    """2. TENTATIVA VIA ENDEREÇO + CIDADE (NOMINATIM)"""
+    lat, lon, addr = buscar_nominatim(query)
+    if lat:
+        return lat, lon, "Nominatim (Endereço Completo)"
+    return None
 
-    # 3. TENTATIVA GENÉRICA (SÓ RUA + CIDADE)
-    # Aqui estava o erro: .split() em float. Agora 'endereco' é string garantida.
+def chave_rua(e):
+    endereco, cidade, uf = e["endereco"], e["cidade"], e["uf"]
     if endereco and len(endereco) > 3 and cidade:
         try:
             # Pega só a primeira parte antes da vírgula e remove números
-            primeira_parte = endereco.split(',')[0] 
+            primeira_parte = endereco.split(',')[0]
             rua_sem_num = re.sub(r'\d+', '', primeira_parte).strip()
-            
+
             if len(rua_sem_num) > 3:
-                query = f"{rua_sem_num}, {cidade}, {uf}"
-                lat, lon, addr = buscar_nominatim(query)
-                if lat and validar_distancia(lat, lon, cidade, uf):
-                    return lat, lon, "Nominatim (Só Rua)", cidade, uf
+                return f"{rua_sem_num}, {cidade}, {uf}"
         except Exception as e:
             # Se falhar o split ou regex, segue a vida sem travar
             print(f"Erro ao processar string de endereço: {e}")
-            pass
+    return None
+
+def candidato_rua(query):
+    """3. TENTATIVA GENÉRICA (SÓ RUA + CIDADE)"""
+    lat, lon, addr = buscar_nominatim(query)
+    if lat:
+        return lat, lon, "Nominatim (Só Rua)"
+    return None
+
+# (chave, busca, concorrência): só a BrasilAPI aceita chamadas em paralelo
+ETAPAS_GEOCODE = (
+    (chave_cep, candidato_cep, CONCORRENCIA_BRASILAPI),
+    (chave_endereco, candidato_endereco, 1),
+    (chave_rua, candidato_rua, 1),
+)
+
+def _ancoras(chaves):
+    return [get_ancora(cidade, uf, cep) for cidade, uf, cep in chaves]
+
+def _buscar_distintas(buscar, chaves, concorrencia, desc):
+    """Resultado de `buscar` para cada chave distinta, salvando o cache periodicamente."""
+    resultados = []
+    for n, candidato in enumerate(tqdm(mapear(buscar, chaves, concorrencia), total=len(chaves), desc=desc), start=1):
+        resultados.append(candidato)
+        if n % SAVE_CACHE_EVERY == 0:
+            GEOCACHE.salvar()
+    return resultados
+
+def geocodificar_lote(entradas):
+    """
+    Geocoding validado de todas as linhas, em duas fases:
+    1. Planejamento: cada etapa junta as chaves de busca (CEP, rua + cidade + UF) das linhas
+       ainda pendentes e busca cada chave distinta uma vez só; as âncoras (centro da cidade
+       ou do prefixo do CEP) também são buscadas uma vez por (cidade, UF, prefixo do CEP).
+    2. Junção vetorial: os candidatos voltam para as linhas pelos códigos das chaves
+       (pd.factorize) e são validados por par distinto (candidato, âncora); quem passa fica
+       resolvido, quem cai longe da cidade segue para a próxima etapa.
+    As âncoras que o gazetteer não cobre (Nominatim) são buscadas numa thread à parte
+    enquanto a etapa de CEP (BrasilAPI) roda em paralelo; a validação espera por elas.
+    Retorna (lat, lon, método) por linha — (None, None, None) se nenhuma etapa serviu.
+    """
+    n = len(entradas)
+    lat = np.full(n, np.nan)
+    lon = np.full(n, np.nan)
+    metodo = np.full(n, None, dtype=object)
+
+    cod_ancora, chaves_ancora = pd.factorize(pd.Series([
+        (e["cidade"], e["uf"], e["cep"][:5] if e["cep"] else None)
+        if (e["cidade"] and e["uf"]) or e["cep"] else None
+        for e in entradas
+    ], dtype=object))
+    fila_nominatim = ThreadPoolExecutor(max_workers=1)
+    ancoras = fila_nominatim.submit(_ancoras, list(chaves_ancora))
+    lat_ancora = lon_ancora = None
+
+    for chave, buscar, concorrencia in ETAPAS_GEOCODE:
+        pendentes = np.flatnonzero(np.isnan(lat))
+        cod_chave, chaves = pd.factorize(pd.Series([chave(entradas[i]) for i in pendentes], dtype=object))
+        candidatos = _buscar_distintas(buscar, list(chaves), concorrencia, f"{buscar.__name__} ({len(chaves)} distintas)")
+
+        if lat_ancora is None:
+            ref = ancoras.result()
+            # Linha sem cidade nem CEP (-1) aponta para o NaN extra do final: sem âncora
+            lat_ancora = np.array([c[0] or np.nan for c in ref] + [np.nan], dtype=np.float64)
+            lon_ancora = np.array([c[1] or np.nan for c in ref] + [np.nan], dtype=np.float64)
+
+        # Candidatos por chave distinta (+ NaN no final para as linhas sem chave)
+        lat_chave = np.array([c[0] if c else np.nan for c in candidatos] + [np.nan], dtype=np.float64)
+        lon_chave = np.array([c[1] if c else np.nan for c in candidatos] + [np.nan], dtype=np.float64)
+        metodo_chave = np.array([c[2] if c else None for c in candidatos] + [None], dtype=object)
+
+        # Validação por par distinto (chave, âncora): o mesmo CEP em cidades diferentes é validado para cada uma
+        com_candidato = pendentes[np.isfinite(lat_chave[cod_chave])]
+        cod_chave = cod_chave[np.isfinite(lat_chave[cod_chave])]
+        pares, inverso = np.unique(
+            np.column_stack((cod_chave, cod_ancora[com_candidato])), axis=0, return_inverse=True
+        )
+        aprovados = validar_distancias(
+            lat_chave[pares[:, 0]], lon_chave[pares[:, 0]], lat_ancora[pares[:, 1]], lon_ancora[pares[:, 1]]
+        )[inverso.reshape(-1)]
+
+        resolvidas = com_candidato[aprovados]
+        lat[resolvidas] = lat_chave[cod_chave[aprovados]]
+        lon[resolvidas] = lon_chave[cod_chave[aprovados]]
+        metodo[resolvidas] = metodo_chave[cod_chave[aprovados]]
+        GEOCACHE.salvar()
+
+    fila_nominatim.shutdown()
+    return [
+        (None, None, None) if np.isnan(lat[i]) else (float(lat[i]), float(lon[i]), metodo[i])
+        for i in range(n)
+    ]
+# ---------------------------
+# Enriquecimento geográfico
+# ---------------------------
+def enriquecer_geografia(ids=None):
+    """
+    Preenche uf, regiao e codigo_municipio das vendas geocodificadas de uma vez (só as de
+    `ids`, quando informado: os registros recém-inseridos da carga incremental).
+    A UF vem do estado que contém o ponto; fora dos polígonos (ex.: pontos no litoral que a
+    malha simplificada não cobre) fica a UF da planilha e a região é deduzida dela.
+    O codigo_municipio só é preenchido com a malha de municípios (LEDAX_GEOJSON_MUNICIPIOS,
+    não versionada); sem ela fica None.
+    """
+    tabela = Cliente.__table__
+    with engine.begin() as conn:
+        consulta = (
+            select(tabela.c.id, tabela.c.latitude, tabela.c.longitude, tabela.c.uf)
+            .where(tabela.c.latitude != None, tabela.c.longitude != None)
+        )
+        if ids is None:
+            linhas = conn.execute(consulta).all()
+        else:
+            linhas = [
+                linha
+                for i in range(0, len(ids), incremental.LOTE_DELETE)
+                for linha in conn.execute(consulta.where(tabela.c.id.in_(ids[i:i + incremental.LOTE_DELETE])))
+            ]
+        if not linhas:
+            return
+
+        lat = np.array([l.latitude for l in linhas], dtype=np.float64)
+        lon = np.array([l.longitude for l in linhas], dtype=np.float64)
+        ufs, regioes = geografia.localizar_estados(lon, lat)
+        municipios, _ = geografia.localizar_municipios(lon, lat)
+        regiao_da_uf = geografia.regiao_por_uf()
+
+        atualizacoes = []
+        for i, linha in enumerate(linhas):
+            uf = ufs[i] or (linha.uf or "").strip().upper() or None
+            atualizacoes.append({
+                "_id": linha.id,
+                "uf": uf,
+                "regiao": regioes[i] or regiao_da_uf.get(uf),
+                "codigo_municipio": municipios[i],
+            })
+        conn.execute(
+            tabela.update().where(tabela.c.id == bindparam("_id")).values(
+                uf=bindparam("uf"), regiao=bindparam("regiao"), codigo_municipio=bindparam("codigo_municipio"),
+            ),
+            atualizacoes,
+        )
+
+    fora = sum(1 for u in ufs if u is None)
+    print(f"🗺️  Geografia: {len(linhas)} vendas enriquecidas ({fora} fora dos polígonos de estado)")
 
-    return None, None, None, cidade, uf
 # ---------------------------
 # ETL Main
 # ---------------------------
-def processar_excel(path_excel=EXCEL_PATH):
+def processar_excel(path_excel=EXCEL_PATH, completo=False):
     print("📄 Lendo Excel:", path_excel)
     try:
         df = pd.read_excel(path_excel)
@@ -264,15 +458,36 @@ def processar_excel(path_excel=EXCEL_PATH):
 
     df.columns = [re.sub(r"[^a-z0-9]+", "_", c.lower()) for c in df.columns]
 
-    Base.metadata.create_all(bind=engine)
+    # Tabelas e colunas novas (bancos antigos); os índices ficam para depois da carga
+    aplicar_migracoes(engine, indices=False)
+    # Caches JSON dos ETLs antigos (idempotente: o que já está no geocache é mantido)
+    GEOCACHE.importar_legados()
+
+    # Diferença pelo hash das linhas: segue só com o que é novo; o que sumiu é apagado
+    # junto com a gravação das linhas novas, na mesma transação
+    linhas = [row for _, row in df.iterrows()]
+    hashes = [incremental.hash_linha(row, COLUNAS_ORIGEM) for row in linhas]
+    with engine.connect() as conn:
+        a_inserir, a_apagar = incremental.planejar(conn, Cliente, hashes, completo)
+    print(incremental.resumo(len(linhas), a_inserir, a_apagar))
+    if not a_inserir and not a_apagar:
+        print("\n✅ Nada mudou na planilha: banco, índices e versão do dataset mantidos.")
+        return
+
+    linhas = [linhas[i] for i in a_inserir]
+    hashes = [hashes[i] for i in a_inserir]
     db = SessionLocal()
 
-    total = len(df)
-    sucessos = 0
+    total = len(linhas)
     print(f"🚀 Processando {total} registros (Modo Brasil)...")
 
-    for idx, row in tqdm(df.iterrows(), total=total):
-        
+    # GEOCODING INTELIGENTE (só as linhas novas, validação em lote por etapa)
+    entradas = [entrada_geocode(row) for row in linhas]
+    coordenadas = geocodificar_lote(entradas)
+
+    novos = []
+    for row, h, entrada, (lat, lon, metodo) in zip(linhas, hashes, entradas, coordenadas):
+
         # Leitura dos campos
         titulo = row.get("t_tulo_do_neg_cio")
         data_raw = row.get("data")
@@ -285,16 +500,6 @@ def processar_excel(path_excel=EXCEL_PATH):
         valor = row.get("valor")
         local_entrega = row.get("local_de_entrega")
         end_cliente = row.get("endere_o_do_cliente")
-        cidade_cli = row.get("cidade_do_cliente")
-        uf_cli = row.get("estado_do_cliente")
-        cep_raw = limpar_cep(row.get("cep_do_cliente"))
-
-        # GEOCODING INTELIGENTE
-        lat, lon, metodo, cid_final, uf_final = geocode_inteligente(row)
-        
-        # Mapeia região
-        regiao = None
-        # (Você pode reinserir o dict REGIAO_POR_UF aqui se precisar)
 
         cliente = Cliente(
             titulo=titulo,
@@ -304,29 +509,62 @@ def processar_excel(path_excel=EXCEL_PATH):
             funil=funil,
             representante=rep,
             responsavel=resp,
-            regiao=regiao, # Preencher se tiver logica
+            regiao=None, # Preenchida por enriquecer_geografia() depois da carga
             valor_venda=valor,
             local_de_entrega=local_entrega,
             endereco_cliente=end_cliente,
-            cidade=cid_final,
-            uf=uf_final,
-            cep=cep_raw,
+            cidade=entrada["cidade"],
+            uf=entrada["uf"],
+            cep=entrada["cep"],
             endereco_usado_geocode=metodo,
+            hash_origem=h,
             latitude=lat,
             longitude=lon
         )
         db.add(cliente)
+        novos.append(cliente)
+
+    # Troca numa transação só: se a carga falhar no meio, o banco fica como estava
+    try:
+        incremental.apagar(db, Cliente, a_apagar)
+        db.flush()
+        ids_novos = [c.id for c in novos]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        GEOCACHE.salvar()
+        db.close()
+
+    # UF, região e município a partir das coordenadas (point-in-polygon em lote)
+    enriquecer_geografia(ids_novos)
+
+    # Índices criados depois da carga (mais rápido que mantê-los a cada insert)
+    aplicar_migracoes(engine)
+
+    # Índice de busca textual (FTS5): refeito de uma vez na carga completa; na incremental
+    # os triggers já acompanharam os inserts/deletes
+    busca.garantir_indice_fts(engine, reconstruir=completo)
+
+    # Índice espacial (R*Tree) do filtro bbox, mesma regra
+    espacial.garantir_rtree(engine, Cliente.__tablename__, reconstruir=completo)
+
+    # Cubo das agregações (/api/vendas/agregados) recalculado sobre a carga nova
+    agregados.garantir_cubo(engine, reconstruir=True)
 
-        if idx % 50 == 0:
-            db.commit()
-            save_cache(GEOCACHE)
+    # Nova versão do dataset: a API descarta caches e ETags da carga anterior
+    nova_versao_dataset()
 
-    db.commit()
-    save_cache(GEOCACHE)
-    db.close()
+    # Grades do heatmap (dataset completo) já ficam prontas para a API
+    heatmap.precomputar_grades()
     
     print("\n✅ Processo Finalizado.")
-    print(f"Dados salvos no banco. Cache atualizado em {GEOCACHE_PATH}")
+    print(f"Dados salvos no banco. Cache atualizado em {GEOCACHE.caminho}")
 
 if __name__ == "__main__":
-    processar_excel(EXCEL_PATH)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Carga das vendas a partir da planilha")
+    parser.add_argument("excel", nargs="?", default=EXCEL_PATH)
+    parser.add_argument("--completo", action="store_true", help="apaga e recarrega todas as linhas")
+    args = parser.parse_args()
+    processar_excel(args.excel, completo=args.completo)
\ No newline at end of file
@@ -0,0 +1,69 @@
+# facetas.py
+"""
+Motor de facetas em memória para /api/vendas/filtros.
+- Uma posting list (posições no snapshot, ordenadas) por valor de cada faceta.
+- Filtros de lista viram união de postings; facetas diferentes se combinam por AND.
+- Todas as facetas e suas contagens saem de um único bincount por coluna.
+"""
+
+import numpy as np
+from snapshot import CachePorVersao, COLUNAS_FACETA
+
+
+class IndiceFacetas:
+    def __init__(self, snap):
+        self.snap = snap
+        self.postings = {}
+        for col in COLUNAS_FACETA:
+            codigos = snap.codigos[col]
+            dicionario = snap.dicionarios[col]
+            ordem = np.argsort(codigos, kind="stable")
+            limites = np.concatenate(([0], np.cumsum(np.bincount(codigos, minlength=len(dicionario)))))
+            self.postings[col] = {
+                valor: ordem[limites[c]:limites[c + 1]]
+                for c, valor in enumerate(dicionario)
+            }
+
+    def mascara(self, selecoes):
+        """
+        Máscara das linhas que atendem todos os filtros de lista em `selecoes` ({coluna: [valores]}).
+        Retorna None se não houver seleção.
+        """
+        mascara = None
+        for col, valores in selecoes.items():
+            if not valores:
+                continue
+            postings = self.postings[col]
+            sel = np.zeros(len(self.snap), dtype=bool)
+            for v in valores:
+                p = postings.get(v)
+                if p is not None:
+                    sel[p] = True
+            mascara = sel if mascara is None else (mascara & sel)
+        return mascara
+
+    def contar(self, mascara=None):
+        """
+        {coluna: {valor: quantidade}} das linhas selecionadas.
+        Valores vazios/nulos são omitidos, como no SELECT DISTINCT antigo.
+        """
+        resultado = {}
+        for col in COLUNAS_FACETA:
+            codigos = self.snap.codigos[col]
+            if mascara is not None:
+                codigos = codigos[mascara]
+            dicionario = self.snap.dicionarios[col]
+            contagens = np.bincount(codigos, minlength=len(dicionario))
+            resultado[col] = {
+                dicionario[c]: int(contagens[c])
+                for c in np.flatnonzero(contagens)
+                if dicionario[c]
+            }
+        return resultado
+
+
+_cache = CachePorVersao(IndiceFacetas)
+
+
+def obter_indice_facetas(snap=None):
+    return _cache.obter(snap)
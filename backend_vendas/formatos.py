@@ -0,0 +1,144 @@
+# formatos.py
+"""
+Respostas colunares binárias, escolhidas por content negotiation (header Accept):
+- application/x-msgpack: {"n": linhas, "colunas": {nome: coluna}}, onde cada coluna é
+    {"tipo": "float64" | "int32" | "uint8", "dados": <bytes little-endian>}  (TypedArray no browser)
+        float64: nulo = NaN; uint8: booleano 0/1, nulo = 255 (BOOL_NULO)
+    {"tipo": "dicionario", "valores": [...], "codigos": <bytes int32>}      (categóricas: rede, uf...)
+    {"tipo": "lista", "dados": [...]}                                       (texto livre)
+- application/vnd.apache.arrow.stream: tabela Arrow IPC (categóricas como DictionaryArray,
+  nulos pela validity bitmap do Arrow).
+  O pyarrow é opcional; sem ele o servidor responde 406 para esse formato.
+Sem um desses tipos no Accept, os endpoints continuam respondendo JSON.
+"""
+
+import numpy as np
+import msgpack
+from fastapi import HTTPException, Response
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow é opcional
+    pa = None
+
+MSGPACK = "application/x-msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+# Booleano nulo nas colunas uint8 (0/1): o JSON responde null, o binário não pode virar false
+BOOL_NULO = 255
+
+
+class ColunaDicionario:
+    """Coluna categórica: um código int32 por linha apontando para `valores`."""
+
+    def __init__(self, codigos, valores):
+        self.codigos = np.asarray(codigos, dtype=np.int32)
+        self.valores = list(valores)
+
+    def __len__(self):
+        return len(self.codigos)
+
+    @classmethod
+    def de_lista(cls, lista):
+        dicionario = {}
+        codigos = [dicionario.setdefault(v, len(dicionario)) for v in lista]
+        return cls(codigos, list(dicionario))
+
+
+def formato_pedido(request):
+    """'arrow', 'msgpack' ou None (JSON) conforme o header Accept."""
+    accept = request.headers.get("accept", "")
+    if ARROW in accept:
+        return "arrow"
+    if MSGPACK in accept or "application/msgpack" in accept:
+        return "msgpack"
+    return None
+
+
+def registros_para_colunas(registros, nomes, categoricas=()):
+    """Transpõe uma lista de dicts em {coluna: valores}, codificando as categóricas."""
+    colunas = {}
+    for nome in nomes:
+        valores = [r[nome] for r in registros]
+        colunas[nome] = ColunaDicionario.de_lista(valores) if nome in categoricas else valores
+    return colunas
+
+
+def _int32_se_couber(arr):
+    if not len(arr) or (arr.min() >= np.iinfo(np.int32).min and arr.max() <= np.iinfo(np.int32).max):
+        return arr.astype(np.int32)
+    return arr.astype(np.float64)
+
+
+def _escalar(v):
+    return v if v is None or isinstance(v, (str, int, float, bool)) else str(v)
+
+
+def _como_array(valores):
+    """Converte uma lista homogênea em ndarray numérico; None se for texto/misto."""
+    if isinstance(valores, np.ndarray):
+        return _int32_se_couber(valores) if valores.dtype.kind == "i" else valores
+    presentes = [v for v in valores if v is not None]
+    if not presentes:
+        return None  # coluna toda nula: sem tipo para inferir, vai como lista/string nula
+    if all(isinstance(v, bool) for v in presentes):
+        return np.array([BOOL_NULO if v is None else bool(v) for v in valores], dtype=np.uint8)
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in presentes):
+        if len(presentes) == len(valores) and all(isinstance(v, int) for v in presentes):
+            return _int32_se_couber(np.array(valores, dtype=np.int64))
+        return np.array([np.nan if v is None else v for v in valores], dtype=np.float64)
+    return None
+
+
+def _coluna_msgpack(valores):
+    if isinstance(valores, ColunaDicionario):
+        return {
+            "tipo": "dicionario",
+            "valores": [_escalar(v) for v in valores.valores],
+            "codigos": valores.codigos.astype("<i4").tobytes(),
+        }
+    arr = _como_array(valores)
+    if arr is None:
+        return {"tipo": "lista", "dados": [None if v is None else str(v) for v in valores]}
+    if arr.dtype == np.bool_:
+        arr = arr.astype(np.uint8)
+    tipo = {np.dtype(np.uint8): "uint8", np.dtype(np.int32): "int32"}.get(arr.dtype, "float64")
+    return {"tipo": tipo, "dados": arr.astype(np.dtype(tipo).newbyteorder("<")).tobytes()}
+
+
+def _coluna_arrow(valores):
+    if isinstance(valores, ColunaDicionario):
+        nulos = np.array([v is None for v in valores.valores], dtype=bool)
+        indices = pa.array(valores.codigos, mask=nulos[valores.codigos] if len(valores.codigos) else None)
+        dicionario = pa.array([None if v is None else str(v) for v in valores.valores], type=pa.string())
+        return pa.DictionaryArray.from_arrays(indices, dicionario)
+    arr = _como_array(valores)
+    if arr is None:
+        return pa.array([None if v is None else str(v) for v in valores], type=pa.string())
+    if arr.dtype == np.uint8:
+        return pa.array(arr == 1, mask=arr == BOOL_NULO)
+    return pa.array(arr, from_pandas=True)  # NaN (nulo no float64) -> null
+
+
+def codificar(colunas, formato):
+    n = len(next(iter(colunas.values()))) if colunas else 0
+
+    if formato == "arrow":
+        if pa is None:
+            raise HTTPException(status_code=406, detail="Formato Arrow indisponível (pyarrow não instalado)")
+        tabela = pa.table({nome: _coluna_arrow(v) for nome, v in colunas.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, tabela.schema) as writer:
+            writer.write_table(tabela)
+        return sink.getvalue().to_pybytes()
+
+    payload = {"n": n, "colunas": {nome: _coluna_msgpack(v) for nome, v in colunas.items()}}
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def tipo_midia(formato):
+    return ARROW if formato == "arrow" else MSGPACK
+
+
+def resposta_colunar(colunas, formato):
+    return Response(content=codificar(colunas, formato), media_type=tipo_midia(formato))
@@ -0,0 +1,175 @@
+# geografia.py
+"""
+Point-in-polygon vetorizado para enriquecer as vendas com UF, região e município a
+partir das coordenadas geocodificadas (etapa do etl.py).
+- Camadas GeoJSON de polígonos: estados (brasil_estados.geojson, o mesmo do mapa) e,
+  opcionalmente, municípios (LEDAX_GEOJSON_MUNICIPIOS). A malha de municípios não vem
+  no repositório: sem ela o codigo_municipio das vendas fica sempre None.
+- Índice espacial por faixas de latitude: cada aresta é registrada nas faixas que cruza;
+  cada ponto só testa as arestas da própria faixa.
+- Ray casting em lote (NumPy): a paridade de cruzamentos por feição, somada numa matriz
+  pontos x arestas, diz em qual polígono o ponto está (buracos e multipolígonos inclusos).
+"""
+
+import json
+import os
+import numpy as np
+from database import BASE_DIR
+
+_RAIZ = os.path.dirname(BASE_DIR)
+_ESTADOS_PADRAO = [
+    os.path.join(BASE_DIR, "data", "brasil_estados.geojson"),
+    os.path.join(_RAIZ, "public", "static", "brasil_estados.geojson"),
+    os.path.join(_RAIZ, "backend_uc", "static", "brasil_estados.geojson"),
+]
+GEOJSON_ESTADOS = os.getenv("LEDAX_GEOJSON_ESTADOS") or next(
+    (p for p in _ESTADOS_PADRAO if os.path.exists(p)), _ESTADOS_PADRAO[0]
+)
+GEOJSON_MUNICIPIOS = os.getenv("LEDAX_GEOJSON_MUNICIPIOS", os.path.join(BASE_DIR, "data", "brasil_municipios.geojson"))
+
+# regiao_id do brasil_estados.geojson -> nome da região
+REGIOES = {"1": "Sul", "2": "Sudeste", "3": "Norte", "4": "Nordeste", "5": "Centro-Oeste"}
+
+# Nomes de propriedade aceitos na camada de municípios (malha do IBGE e variações comuns)
+_PROPS_CODIGO_MUNICIPIO = ("codigo_ibge", "CD_MUN", "CD_GEOCMU", "id")
+_PROPS_NOME_MUNICIPIO = ("nome", "NM_MUN", "NM_MUNICIP", "name")
+
+# Altura das faixas do índice (graus de latitude) e pontos por bloco da matriz de cruzamentos
+FAIXA_GRAUS = 0.05
+BLOCO_PONTOS = 2048
+
+
+def _aneis(geometria):
+    if geometria["type"] == "Polygon":
+        return geometria["coordinates"]
+    if geometria["type"] == "MultiPolygon":
+        return [anel for poligono in geometria["coordinates"] for anel in poligono]
+    return []
+
+
+class CamadaPoligonos:
+    def __init__(self, features):
+        self.propriedades = [f.get("properties") or {} for f in features]
+
+        x1, y1, x2, y2, dona = [], [], [], [], []
+        for i, feicao in enumerate(features):
+            for anel in _aneis(feicao.get("geometry") or {"type": None}):
+                pts = np.asarray(anel, dtype=np.float64)[:, :2]
+                if len(pts) < 3:
+                    continue
+                a, b = pts, np.roll(pts, -1, axis=0)  # fecha o anel mesmo se o GeoJSON não repetir o 1º ponto
+                x1.append(a[:, 0]); y1.append(a[:, 1]); x2.append(b[:, 0]); y2.append(b[:, 1])
+                dona.append(np.full(len(pts), i, dtype=np.int32))
+
+        self.n_feicoes = len(features)
+        if not dona:
+            self.x1 = self.y1 = self.x2 = self.y2 = np.empty(0)
+            self.dona = np.empty(0, dtype=np.int32)
+            self.faixa_min = 0
+            self.inicio = np.zeros(1, dtype=np.int64)
+            self.arestas = np.empty(0, dtype=np.int64)
+            return
+
+        self.x1, self.y1 = np.concatenate(x1), np.concatenate(y1)
+        self.x2, self.y2 = np.concatenate(x2), np.concatenate(y2)
+        self.dona = np.concatenate(dona)
+        # Arestas horizontais nunca são cruzadas pelo raio horizontal
+        ativas = np.flatnonzero(self.y1 != self.y2)
+
+        # Índice por faixa (CSR): arestas[inicio[f]:inicio[f + 1]] cruzam a faixa f
+        f_min = np.floor(np.minimum(self.y1, self.y2)[ativas] / FAIXA_GRAUS).astype(np.int64)
+        f_max = np.floor(np.maximum(self.y1, self.y2)[ativas] / FAIXA_GRAUS).astype(np.int64)
+        self.faixa_min = int(f_min.min())
+        n_faixas = int(f_max.max()) - self.faixa_min + 1
+        repeticoes = f_max - f_min + 1
+        aresta = np.repeat(ativas, repeticoes)
+        deslocamento = np.arange(len(aresta)) - np.repeat(np.cumsum(repeticoes) - repeticoes, repeticoes)
+        faixa = np.repeat(f_min, repeticoes) + deslocamento - self.faixa_min
+        ordem = np.argsort(faixa, kind="stable")
+        self.arestas = aresta[ordem]
+        self.inicio = np.concatenate(([0], np.cumsum(np.bincount(faixa, minlength=n_faixas))))
+
+    @classmethod
+    def de_arquivo(cls, caminho):
+        with open(caminho, encoding="utf-8") as f:
+            return cls(json.load(f).get("features", []))
+
+    def localizar(self, lon, lat):
+        """Índice da feição que contém cada ponto (-1 se nenhuma). Pontos NaN ficam em -1."""
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        resultado = np.full(len(lon), -1, dtype=np.int64)
+        validos = np.isfinite(lon) & np.isfinite(lat)
+        if not validos.any() or not len(self.arestas):
+            return resultado
+
+        faixa = np.full(len(lon), -1, dtype=np.int64)
+        faixa[validos] = np.floor(lat[validos] / FAIXA_GRAUS).astype(np.int64) - self.faixa_min
+        n_faixas = len(self.inicio) - 1
+        candidatos = np.flatnonzero(validos & (faixa >= 0) & (faixa < n_faixas))
+
+        # Pontos agrupados por faixa: cada grupo testa só as arestas daquela faixa
+        candidatos = candidatos[np.argsort(faixa[candidatos], kind="stable")]
+        faixas, cortes = np.unique(faixa[candidatos], return_index=True)
+        for f, grupo in zip(faixas, np.split(candidatos, cortes[1:])):
+            arestas = self.arestas[self.inicio[f]:self.inicio[f + 1]]
+            if len(arestas):
+                for i in range(0, len(grupo), BLOCO_PONTOS):
+                    bloco = grupo[i:i + BLOCO_PONTOS]
+                    resultado[bloco] = self._testar(lon[bloco], lat[bloco], arestas)
+        return resultado
+
+    def _testar(self, px, py, arestas):
+        x1, y1 = self.x1[arestas], self.y1[arestas]
+        x2, y2 = self.x2[arestas], self.y2[arestas]
+        px, py = px[:, None], py[:, None]
+        # Raio horizontal para a direita: a aresta cruza a altura do ponto à direita dele?
+        cruza = (y1 > py) != (y2 > py)
+        x_corte = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        cruza &= px < x_corte
+
+        # Paridade de cruzamentos por feição: ímpar = dentro
+        donas, coluna = np.unique(self.dona[arestas], return_inverse=True)
+        por_feicao = np.zeros((len(px), len(donas)), dtype=np.int32)
+        linhas, cols = np.nonzero(cruza)
+        np.add.at(por_feicao, (linhas, coluna[cols]), 1)
+        dentro = (por_feicao & 1).astype(bool)
+        return np.where(dentro.any(axis=1), donas[dentro.argmax(axis=1)], -1)
+
+
+def _propriedade(props, nomes):
+    for nome in nomes:
+        if props.get(nome) not in (None, ""):
+            return str(props[nome])
+    return None
+
+
+def localizar_estados(lon, lat, caminho=GEOJSON_ESTADOS):
+    """(sigla da UF, nome da região) de cada ponto; None fora de todos os estados."""
+    camada = CamadaPoligonos.de_arquivo(caminho)
+    siglas = np.array([p.get("sigla") for p in camada.propriedades] + [None], dtype=object)
+    regioes = np.array([REGIOES.get(str(p.get("regiao_id"))) for p in camada.propriedades] + [None], dtype=object)
+    idx = camada.localizar(lon, lat)  # -1 cai no None do final
+    return siglas[idx], regioes[idx]
+
+
+def regiao_por_uf(caminho=GEOJSON_ESTADOS):
+    """Sigla -> região, para pontos fora dos polígonos (ex.: no mar, por simplificação da malha)."""
+    with open(caminho, encoding="utf-8") as f:
+        features = json.load(f).get("features", [])
+    return {
+        f["properties"]["sigla"]: REGIOES.get(str(f["properties"].get("regiao_id")))
+        for f in features if f.get("properties", {}).get("sigla")
+    }
+
+
+def localizar_municipios(lon, lat, caminho=GEOJSON_MUNICIPIOS):
+    """(código IBGE, nome) do município de cada ponto; None se a camada não existir ou o ponto ficar fora."""
+    n = len(lon)
+    if not caminho or not os.path.exists(caminho):
+        return np.full(n, None, dtype=object), np.full(n, None, dtype=object)
+    camada = CamadaPoligonos.de_arquivo(caminho)
+    codigos = np.array([_propriedade(p, _PROPS_CODIGO_MUNICIPIO) for p in camada.propriedades] + [None], dtype=object)
+    nomes = np.array([_propriedade(p, _PROPS_NOME_MUNICIPIO) for p in camada.propriedades] + [None], dtype=object)
+    idx = camada.localizar(lon, lat)
+    return codigos[idx], nomes[idx]
@@ -0,0 +1,126 @@
+# heatmap.py
+"""
+Grades de densidade para a camada de calor do mapa de vendas.
+- Os pontos são binados (vetorizado, NumPy) numa grade lon/lat cujo tamanho de célula
+  acompanha o zoom (~CELULA_PX pixels de tela por célula).
+- A grade é esparsa: só as células com pelo menos um cliente são guardadas.
+- As grades do dataset sem filtros são pré-calculadas pelo ETL (data/heatmap_grades.npz)
+  e mantidas em memória; consultas com filtro são calculadas na hora a partir do snapshot.
+"""
+
+import os
+import threading
+import numpy as np
+from database import DB_DIR
+from snapshot import obter_snapshot
+
+GRADES_PATH = os.path.join(DB_DIR, "heatmap_grades.npz")
+
+MAX_ZOOM = 16
+CELULA_PX = 8
+PESOS = ("quantidade", "valor")
+
+
+def tamanho_celula(zoom):
+    """Tamanho da célula (graus) para o zoom: tile de 256px dividido em células de CELULA_PX."""
+    return 360.0 / (2 ** zoom * (256 // CELULA_PX))
+
+
+def calcular_grade(lat, lon, valor, zoom):
+    """
+    Bina os pontos na grade do zoom.
+    Retorna (ix, iy, quantidade, valor) apenas das células ocupadas.
+    Valores negativos (estornos) não contam no peso por valor.
+    """
+    if len(lat) == 0:
+        vazio = np.zeros(0, dtype=np.int64)
+        return vazio, vazio, vazio, np.zeros(0)
+
+    cel = tamanho_celula(zoom)
+    ix = np.floor((lon + 180.0) / cel).astype(np.int64)
+    iy = np.floor((lat + 90.0) / cel).astype(np.int64)
+
+    chave = (ix << 32) | iy
+    uniq, grupo = np.unique(chave, return_inverse=True)
+    qtd = np.bincount(grupo)
+    soma = np.bincount(grupo, weights=np.clip(valor, 0, None))
+    return uniq >> 32, uniq & 0xFFFFFFFF, qtd, soma
+
+
+def recortar(grade, zoom, bbox, peso="quantidade"):
+    """Converte a grade em [[lat, lon, intensidade], ...] limitada ao bbox (centro da célula)."""
+    ix, iy, qtd, soma = grade
+    cel = tamanho_celula(zoom)
+    lon = (ix + 0.5) * cel - 180.0
+    lat = (iy + 0.5) * cel - 90.0
+    intensidade = soma if peso == "valor" else qtd.astype(np.float64)
+
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        sel = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+        lat, lon, intensidade = lat[sel], lon[sel], intensidade[sel]
+
+    pontos = np.column_stack((np.round(lat, 5), np.round(lon, 5), np.round(intensidade, 2)))
+    return {
+        "zoom": zoom,
+        "celula_graus": cel,
+        "peso": peso,
+        "max": float(intensidade.max()) if len(intensidade) else 0.0,
+        "pontos": pontos.tolist(),
+    }
+
+
+# ---------------------------
+# Grades pré-calculadas (dataset completo)
+# ---------------------------
+def precomputar_grades(path=GRADES_PATH):
+    """Calcula e grava as grades de todos os zooms para o dataset sem filtros (chamado pelo ETL)."""
+    snap = obter_snapshot()
+    arrays = {"versao": np.array(snap.versao or "")}
+    for z in range(MAX_ZOOM + 1):
+        ix, iy, qtd, soma = calcular_grade(snap.lat, snap.lon, snap.valor, z)
+        arrays[f"z{z}_ix"], arrays[f"z{z}_iy"] = ix, iy
+        arrays[f"z{z}_qtd"], arrays[f"z{z}_valor"] = qtd, soma
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, **arrays)
+    return snap.versao
+
+
+def _carregar_grades(path, versao):
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as npz:
+            if str(npz["versao"]) != versao:
+                return None
+            return {
+                z: (npz[f"z{z}_ix"], npz[f"z{z}_iy"], npz[f"z{z}_qtd"], npz[f"z{z}_valor"])
+                for z in range(MAX_ZOOM + 1)
+            }
+    except Exception:
+        return None
+
+
+_lock = threading.Lock()
+_grades = {"versao": None, "zooms": {}}
+
+
+def grade_completa(zoom):
+    """
+    Grade do dataset sem filtros para o zoom.
+    Usa o arquivo do ETL se ele corresponder à versão atual; senão calcula e guarda em memória.
+    """
+    snap = obter_snapshot()
+    with _lock:
+        if _grades["versao"] != snap.versao:
+            _grades["versao"] = snap.versao
+            _grades["zooms"] = _carregar_grades(GRADES_PATH, snap.versao) or {}
+        grade = _grades["zooms"].get(zoom)
+        if grade is None:
+            grade = calcular_grade(snap.lat, snap.lon, snap.valor, zoom)
+            _grades["zooms"][zoom] = grade
+        return grade
+
+
+def grade_filtrada(snap, mascara, zoom):
+    return calcular_grade(snap.lat[mascara], snap.lon[mascara], snap.valor[mascara], zoom)
@@ -1,13 +1,34 @@
 import os
-from fastapi import FastAPI, Depends, Query, HTTPException, status
+from fastapi import FastAPI, Depends, Query, HTTPException, status, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import or_
-from database import SessionLocal
+from database import SessionLeitura, engine, engine_leitura, versao_dataset, async_engine, get_async_db
 from models import Cliente
+from clusters import obter_indice, MAX_ZOOM as MAX_ZOOM_CLUSTER
+import tiles
+import heatmap
+from snapshot import obter_snapshot, COLUNAS_FACETA, COLUNAS as CAMPOS_CLIENTE
+from facetas import obter_indice_facetas
+import busca
+import espacial
+import agregados
+import proximidade
+import diagnostico
+import streaming
+import formatos
+import cache_http
+import autenticacao
+from cache_resultados import CacheResultados, RespostaCacheada
+from migracoes import aplicar_migracoes
 from datetime import date, datetime, timedelta
 from typing import Optional, List
+import numpy as np
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 
@@ -22,6 +43,13 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 120 # Token dura 2 horas
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# bcrypt fora do event loop + tokens já validados em cache (ver autenticacao.py)
+pool_hash = autenticacao.PoolHash()
+cache_tokens = autenticacao.CacheTokens()
+
+# Motor de filtros: "colunar" (snapshot NumPy em memória) ou "sql" (SQLite, para comparação)
+MOTOR_FILTROS = os.getenv("LEDAX_MOTOR_FILTROS", "colunar")
+
 app = FastAPI(title="API DE VENDAS LEDAX")
 
 # -------------------------------
@@ -39,18 +67,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After-Id"],
 )
 
 # -------------------------------
 # 2. BANCO DE DADOS E DEPENDÊNCIAS
 # -------------------------------
 def get_db():
-    db = SessionLocal()
+    db = SessionLeitura()
     try:
         yield db
     finally:
         db.close()
 
+diagnostico.instrumentar(engine)
+diagnostico.instrumentar(engine_leitura)
+diagnostico.instrumentar(async_engine.sync_engine)
+
+@app.on_event("startup")
+def carregar_snapshot_inicial():
+    # Índices declarados nos models + FTS + R*Tree (bancos gerados antes deles são atualizados na subida)
+    aplicar_migracoes(engine)
+    busca.garantir_indice_fts(engine)
+    espacial.garantir_rtree(engine, Cliente.__tablename__)
+    agregados.garantir_cubo(engine)
+    # Evita que a primeira requisição pague a carga do snapshot colunar
+    if motor_colunar():
+        obter_snapshot()
+
 # -------------------------------
 # 3. SISTEMA DE USUÁRIOS (FAKE DB)
 # -------------------------------
@@ -73,8 +117,15 @@ fake_users_db = {
 }
 
 # Funções Auxiliares de Auth
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    try:
+        return await pool_hash.executar(pwd_context.verify, plain_password, hashed_password)
+    except autenticacao.FilaCheia:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Muitos logins simultâneos, tente novamente",
+            headers={"Retry-After": "1"},
+        )
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -92,12 +143,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Credenciais inválidas ou token expirado",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    payload = cache_tokens.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
             raise credentials_exception
-    except JWTError:
+        cache_tokens.set(token, payload)
+
+    username: str = payload.get("sub")
+    if username is None:
         raise credentials_exception
     
     user = fake_users_db.get(username)
@@ -111,7 +166,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 @app.post("/token")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     user = fake_users_db.get(form_data.username)
-    if not user or not verify_password(form_data.password, user['hashed_password']):
+    if not user or not await verify_password(form_data.password, user['hashed_password']):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuário ou senha incorretos",
@@ -133,7 +188,52 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 # -------------------------------
 # 5. Lógica de Filtros (ATUALIZADA)
 # -------------------------------
-def apply_filters_to_query(query, rede, tipo_cliente, funil, representante, regiao, responsavel, uf, data_inicio, data_fim, valor_min, valor_max, busca_texto):
+async def filtros_vendas(
+    rede: Optional[List[str]] = Query(None),
+    tipo_cliente: Optional[List[str]] = Query(None),
+    funil: Optional[List[str]] = Query(None),
+    representante: Optional[List[str]] = Query(None),
+    regiao: Optional[List[str]] = Query(None),
+    responsavel: Optional[List[str]] = Query(None),
+    uf: Optional[List[str]] = Query(None),
+    data_inicio: Optional[date] = Query(None),
+    data_fim: Optional[date] = Query(None),
+    valor_min: Optional[float] = Query(None),
+    valor_max: Optional[float] = Query(None),
+    busca_texto: Optional[str] = Query(None),
+):
+    """Parâmetros de filtro comuns a todos os endpoints de vendas."""
+    return {
+        "rede": rede, "tipo_cliente": tipo_cliente, "funil": funil,
+        "representante": representante, "regiao": regiao, "responsavel": responsavel, "uf": uf,
+        "data_inicio": data_inicio, "data_fim": data_fim,
+        "valor_min": valor_min, "valor_max": valor_max,
+        "busca_texto": busca_texto,
+    }
+
+def tem_filtros(filtros):
+    return any(v is not None and v != [] and v != "" for v in filtros.values())
+
+def _valor_canonico(nome, valor):
+    if isinstance(valor, list):
+        return tuple(sorted(set(valor)))  # ordem e repetições não mudam o IN (...)
+    if nome == "busca_texto":
+        return valor.upper()  # FTS e ILIKE ignoram maiúsculas/minúsculas
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    return valor
+
+def chave_filtros(filtros):
+    """Representação hashable e canônica do conjunto de filtros (para chaves de cache)."""
+    return tuple(
+        (k, _valor_canonico(k, v))
+        for k, v in sorted(filtros.items())
+        if v is not None and v != [] and v != ""
+    )
+
+def apply_filters_to_query(query, rede=None, tipo_cliente=None, funil=None, representante=None, regiao=None, responsavel=None, uf=None, data_inicio=None, data_fim=None, valor_min=None, valor_max=None, busca_texto=None, bbox=None):
     
     # Filtros de Lista (List[str])
     if rede: query = query.filter(Cliente.rede.in_(rede)) 
@@ -152,8 +252,12 @@ def apply_filters_to_query(query, rede, tipo_cliente, funil, representante, regi
     if valor_min is not None: query = query.filter(Cliente.valor_venda >= valor_min)
     if valor_max is not None: query = query.filter(Cliente.valor_venda <= valor_max)
 
-    # Filtro de Busca Textual
-    if busca_texto:
+    # Filtro de Busca Textual (índice FTS5; ILIKE só se o banco ainda não tem o índice)
+    if busca_texto and busca.fts_disponivel(query.session):
+        expressao = busca.expressao_fts(busca_texto)
+        if expressao:
+            query = query.filter(Cliente.id.in_(busca.subconsulta_ids(expressao)))
+    elif busca_texto:
         termo = f"%{busca_texto.upper()}%"
         query = query.filter(
             or_(
@@ -166,9 +270,174 @@ def apply_filters_to_query(query, rede, tipo_cliente, funil, representante, regi
             )
         )
 
+    # Viewport do mapa (índice R*Tree, ver espacial.py)
+    if bbox:
+        query = query.filter(*espacial.condicoes_bbox(Cliente, bbox, engine_leitura))
+
     # Garante que tem coordenadas
     query = query.filter(Cliente.latitude != None, Cliente.longitude != None)
-    return query
+    # Marca a origem para o modo LEDAX_SQL_DEBUG (EXPLAIN QUERY PLAN + tempo)
+    return query.execution_options(ledax_origem=diagnostico.ORIGEM_FILTROS)
+
+def cliente_para_dict(cliente):
+    return {c: getattr(cliente, c) for c in CAMPOS_CLIENTE}
+
+# Colunas repetitivas que vão codificadas por dicionário nas respostas binárias
+CATEGORICAS_VENDAS = set(COLUNAS_FACETA) | {"cidade", "data"}
+
+def motor_colunar(motor=None):
+    return (motor or MOTOR_FILTROS) == "colunar"
+
+def _e(mascara, outra):
+    return outra if mascara is None else (mascara & outra)
+
+def mascara_filtros(db, snap, filtros, motor=None):
+    """
+    Máscara booleana (alinhada ao snapshot) das linhas que passam nos filtros.
+    No motor colunar tudo é avaliado em memória: filtros de lista pelas posting
+    lists do índice de facetas, datas/valores/busca pelo snapshot.
+    No motor "sql" os ids vêm de apply_filters_to_query. Sem filtros retorna None.
+    """
+    if not tem_filtros(filtros):
+        return None
+
+    if not motor_colunar(motor):
+        ids = apply_filters_to_query(db.query(Cliente.id), **filtros)
+        return snap.mascara_ids(i for (i,) in ids)
+
+    listas = {k: filtros[k] for k in COLUNAS_FACETA if filtros.get(k)}
+    mascara = obter_indice_facetas(snap).mascara(listas)
+
+    intervalos = {k: filtros[k] for k in ("data_inicio", "data_fim", "valor_min", "valor_max")}
+    if tem_filtros(intervalos):
+        mascara = _e(mascara, snap.mascara_intervalos(**intervalos))
+    if filtros.get("busca_texto"):
+        if busca.fts_disponivel(db):
+            expressao = busca.expressao_fts(filtros["busca_texto"])
+            if expressao:
+                ids = db.execute(busca.subconsulta_ids(expressao))
+                mascara = _e(mascara, snap.mascara_ids(i for (i,) in ids))
+        else:
+            mascara = _e(mascara, snap.mascara_texto(filtros["busca_texto"]))
+    if filtros.get("bbox"):
+        mascara = _e(mascara, snap.mascara_bbox(filtros["bbox"]))
+    return mascara
+
+def parse_fields(fields):
+    """
+    Converte 'id,latitude,longitude,rede' na lista de colunas pedidas (400 se houver
+    coluna desconhecida). O id sempre vem, pois é a chave da paginação e do detalhe.
+    """
+    if not fields:
+        return None
+    campos = [f.strip() for f in fields.split(",") if f.strip()]
+    invalidos = [f for f in campos if f not in CAMPOS_CLIENTE]
+    if invalidos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos inválidos: {', '.join(invalidos)}",
+        )
+    return ["id"] + [c for c in dict.fromkeys(campos) if c != "id"]
+
+def consulta_pagina(sessao, filtros, campos=None, after_id=None, limit=None):
+    """
+    Query filtrada de clientes (ou só das colunas `campos`), paginada por keyset:
+    ordena por id e começa depois de `after_id` — custo constante por página, ao
+    contrário de OFFSET, que relê todas as linhas anteriores.
+    """
+    query = sessao.query(*(getattr(Cliente, c) for c in campos)) if campos else sessao.query(Cliente)
+    query = apply_filters_to_query(query, **filtros)
+    if after_id is None and limit is None:
+        return query
+    if after_id is not None:
+        query = query.filter(Cliente.id > after_id)
+    query = query.order_by(Cliente.id)
+    return query.limit(limit) if limit else query
+
+def _serializador(campos):
+    if not campos:
+        return cliente_para_dict
+    return lambda linha: dict(zip(campos, linha))
+
+def _cabecalho_pagina(ids, limit):
+    """Header com o cursor da próxima página (só quando a página veio cheia)."""
+    if limit and len(ids) == limit:
+        return {"X-Next-After-Id": str(int(ids[-1]))}
+    return {}
+
+def selecionar_colunar(db, filtros, motor, after_id=None, limit=None):
+    """Snapshot + índices (ordenados por id) das linhas filtradas e paginadas."""
+    snap = obter_snapshot()
+    mascara = mascara_filtros(db, snap, filtros, motor)
+    idx = np.arange(len(snap)) if mascara is None else np.flatnonzero(mascara)
+    # O snapshot é ordenado por id: o cursor vira uma busca binária
+    if after_id is not None:
+        idx = idx[np.searchsorted(snap.ids[idx], after_id, side="right"):]
+    if limit:
+        idx = idx[:limit]
+    return snap, idx
+
+def codificar_colunar(snap, idx, campos, limit, formato):
+    pagina = _cabecalho_pagina(snap.ids[idx], limit)
+    if formato:
+        colunas = snap.colunas(idx, CATEGORICAS_VENDAS, campos)
+        return RespostaCacheada(formatos.codificar(colunas, formato), formatos.tipo_midia(formato), pagina)
+    # Já são tipos JSON nativos: dispensa o jsonable_encoder
+    return RespostaCacheada(JSONResponse(snap.registros(idx, campos)).body, "application/json", pagina)
+
+def codificar_linhas(linhas, campos, limit, formato):
+    pagina = _cabecalho_pagina([linha.id for linha in linhas], limit)
+    registros = [_serializador(campos)(linha) for linha in linhas]
+    if formato:
+        colunas = formatos.registros_para_colunas(registros, campos or CAMPOS_CLIENTE, CATEGORICAS_VENDAS)
+        return RespostaCacheada(formatos.codificar(colunas, formato), formatos.tipo_midia(formato), pagina)
+    return RespostaCacheada(JSONResponse(jsonable_encoder(registros)).body, "application/json", pagina)
+
+def corpo_dados(db, filtros, motor, campos, after_id, limit, formato):
+    """Resposta de /api/vendas/dados já codificada (JSON, msgpack ou Arrow), pronta para o cache."""
+    if motor_colunar(motor):
+        snap, idx = selecionar_colunar(db, filtros, motor, after_id, limit)
+        return codificar_colunar(snap, idx, campos, limit, formato)
+    linhas = consulta_pagina(db, filtros, campos, after_id, limit).all()
+    return codificar_linhas(linhas, campos, limit, formato)
+
+def selecionar_colunar_leitura(filtros, motor, after_id=None, limit=None):
+    """selecionar_colunar numa sessão de leitura própria, para rodar no threadpool."""
+    with SessionLeitura() as sessao:
+        return selecionar_colunar(sessao, filtros, motor, after_id, limit)
+
+def corpo_colunar_leitura(filtros, motor, campos, after_id, limit, formato):
+    snap, idx = selecionar_colunar_leitura(filtros, motor, after_id, limit)
+    return codificar_colunar(snap, idx, campos, limit, formato)
+
+async def corpo_dados_async(db, filtros, motor, campos, after_id, limit, formato):
+    """
+    Igual a corpo_dados numa AsyncSession: as consultas do motor SQL (as mesmas, via run_sync)
+    esperam o aiosqlite sem ocupar thread, e só a codificação, que é CPU, vai para o threadpool.
+    O motor colunar é todo CPU (carga do snapshot, máscaras NumPy, facetas) e roda inteiro no
+    threadpool: no run_sync ele travaria o event loop e todas as requisições concorrentes.
+    """
+    if motor_colunar(motor):
+        return await run_in_threadpool(corpo_colunar_leitura, filtros, motor, campos, after_id, limit, formato)
+    linhas = await db.run_sync(lambda sessao: consulta_pagina(sessao, filtros, campos, after_id, limit).all())
+    return await run_in_threadpool(codificar_linhas, linhas, campos, limit, formato)
+
+def parse_por(por):
+    """Dimensões do agrupamento de /agregados (400 se houver alguma desconhecida)."""
+    por = list(dict.fromkeys(por or []))
+    invalidas = [d for d in por if d not in agregados.DIMENSOES]
+    if invalidas:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Dimensões inválidas: {', '.join(invalidas)} (use {', '.join(agregados.DIMENSOES)})",
+        )
+    return por
+
+# Respostas prontas de /dados, /filtros e /agregados por combinação de filtros (ver cache_resultados.py)
+cache_resultados = CacheResultados()
+
+# ETag + Cache-Control dos endpoints de dados (privado: todos exigem login)
+cache_dados = cache_http.condicional("private, no-cache")
 
 # -------------------------------
 # 6. ENDPOINTS API PROTEGIDOS
@@ -212,65 +481,313 @@ def get_status_dados(current_user: dict = Depends(get_current_user)):
 
 @app.get("/api/vendas/filtros")
 def get_filtros(
-    rede: Optional[List[str]] = Query(None),
-    tipo_cliente: Optional[List[str]] = Query(None),
-    funil: Optional[List[str]] = Query(None),
-    representante: Optional[List[str]] = Query(None),
-    regiao: Optional[List[str]] = Query(None),
-    responsavel: Optional[List[str]] = Query(None),
-    uf: Optional[List[str]] = Query(None),
-    data_inicio: Optional[date] = Query(None),
-    data_fim: Optional[date] = Query(None),
-    valor_min: Optional[float] = Query(None),
-    valor_max: Optional[float] = Query(None),
-    busca_texto: Optional[str] = Query(None),    
+    motor: Optional[str] = Query(None, pattern="^(colunar|sql)$"),
+    filtros: dict = Depends(filtros_vendas),
     db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    cache: dict = Depends(cache_dados)
 ):
-    base_query = db.query(Cliente)
-    
-    # Aplica os filtros atuais para gerar o "faceting" (opções restantes)
-    base_query = apply_filters_to_query(
-        base_query, rede, tipo_cliente, funil, representante, regiao, responsavel, uf, 
-        data_inicio, data_fim, valor_min, valor_max, busca_texto
+    """
+    Opções restantes de cada filtro ("faceting") e quantas vendas cada uma tem,
+    calculadas de uma vez sobre o índice de facetas em memória (e guardadas no cache de resultados).
+    """
+    def calcular():
+        snap = obter_snapshot()
+        indice = obter_indice_facetas(snap)
+        contagens = indice.contar(mascara_filtros(db, snap, filtros, motor))
+
+        resposta = {col: sorted(contagens[col]) for col in COLUNAS_FACETA}
+        resposta["contagens"] = contagens
+        return RespostaCacheada(JSONResponse(resposta).body, "application/json")
+
+    chave = ("filtros", chave_filtros(filtros), motor or MOTOR_FILTROS)
+    return cache_resultados.obter(chave, calcular).resposta(cache)
+
+@app.get("/api/vendas/dados")
+async def get_vendas_dados(
+    request: Request,
+    stream: bool = Query(False, description="Resposta NDJSON (ou Accept: application/x-ndjson)"),
+    motor: Optional[str] = Query(None, pattern="^(colunar|sql)$"),
+    fields: Optional[str] = Query(None, description="Colunas separadas por vírgula (ex.: id,latitude,longitude,rede)"),
+    after_id: Optional[int] = Query(None, description="Cursor: retorna só ids maiores que este"),
+    limit: Optional[int] = Query(None, ge=1, le=100000, description="Tamanho da página (ordenada por id)"),
+    bbox: Optional[str] = Query(None, description="Viewport: minLon,minLat,maxLon,maxLat"),
+    filtros: dict = Depends(filtros_vendas),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+    cache: dict = Depends(cache_dados)
+):
+    """
+    Vendas filtradas. Formato da resposta:
+    JSON (padrão), NDJSON (stream) ou colunar binário (Accept msgpack/Arrow, ver formatos.py).
+    Com `fields` traz só as colunas pedidas (o mapa carrega id/lat/lon e busca o resto
+    em /api/vendas/dados/{id}). Com `limit` pagina por id: a próxima página é pedida
+    com `after_id` = último id recebido (também enviado no header X-Next-After-Id).
+    Com `bbox` traz só os pontos do viewport (índice R*Tree no SQL, máscara no colunar).
+    Fora do modo stream, a resposta codificada fica no cache de resultados.
+    """
+    em_stream = streaming.quer_stream(request, stream)
+    formato = formatos.formato_pedido(request)
+    campos = parse_fields(fields)
+    if bbox:
+        filtros = {**filtros, "bbox": espacial.parse_bbox(bbox)}
+
+    if em_stream and motor_colunar(motor):
+        snap, idx = await run_in_threadpool(selecionar_colunar_leitura, filtros, motor, after_id, limit)
+        lotes = (snap.registros(idx[i:i + streaming.LOTE], campos) for i in range(0, len(idx), streaming.LOTE))
+        resposta = streaming.resposta_ndjson(r for lote in lotes for r in lote)
+        return cache_http.aplicar(resposta, {**cache, **_cabecalho_pagina(snap.ids[idx], limit)})
+
+    if em_stream:
+        # O header vai antes do corpo: o cursor sai de uma consulta só dos ids da página
+        # (mesmo keyset do stream), para o motor SQL responder igual ao colunar
+        pagina = {}
+        if limit:
+            ids = await db.run_sync(
+                lambda sessao: [i for (i,) in consulta_pagina(sessao, filtros, ["id"], after_id, limit)]
+            )
+            pagina = _cabecalho_pagina(ids, limit)
+        return cache_http.aplicar(streaming.resposta_ndjson(streaming.consulta_em_lotes(
+            SessionLeitura,
+            lambda sessao: consulta_pagina(sessao, filtros, campos, after_id, limit),
+            _serializador(campos),
+        )), {**cache, **pagina})
+
+    chave = ("dados", chave_filtros(filtros), motor or MOTOR_FILTROS, tuple(campos or ()), after_id, limit, formato)
+    resultado = await cache_resultados.obter_async(
+        chave, lambda: corpo_dados_async(db, filtros, motor, campos, after_id, limit, formato)
     )
+    return resultado.resposta(cache)
+
+
+@app.get("/api/vendas/dados/{cliente_id}")
+def get_venda_detalhe(
+    cliente_id: int,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+    cache: dict = Depends(cache_dados)
+):
+    """Registro completo de uma venda (carregado sob demanda, ao abrir o popup no mapa)."""
+    cliente = db.get(Cliente, cliente_id)
+    if cliente is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Venda não encontrada")
+    return cliente_para_dict(cliente)
 
-    def uniq_filtered(col):
-        # helper para extrair valores únicos
-        vals = base_query.with_entities(getattr(Cliente, col)).distinct().all()
-        return sorted([v[0] for v in vals if v[0]])
+
+@app.get("/api/vendas/agregados")
+def get_vendas_agregados(
+    por: Optional[List[str]] = Query(None, description="Dimensões: uf, regiao, rede, representante, funil, mes..."),
+    filtros: dict = Depends(filtros_vendas),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+    cache: dict = Depends(cache_dados)
+):
+    """
+    Totais de vendas (quantidade, soma e média de valor_venda) para os filtros atuais,
+    agrupados pelas dimensões em `por` (ex.: ?por=uf&por=mes). Sem `por`, só os KPIs gerais.
+    """
+    por = parse_por(por)
+
+    def calcular():
+        resposta = agregados.agregar(db, por, filtros, apply_filters_to_query)
+        return RespostaCacheada(JSONResponse(resposta).body, "application/json")
+
+    chave = ("agregados", tuple(por), chave_filtros(filtros))
+    return cache_resultados.obter(chave, calcular).resposta(cache)
+
+
+@app.get("/api/vendas/clusters")
+def get_vendas_clusters(
+    zoom: int = Query(..., ge=0, le=22),
+    bbox: Optional[str] = Query(None, description="minLon,minLat,maxLon,maxLat"),
+    filtros: dict = Depends(filtros_vendas),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+    cache: dict = Depends(cache_dados)
+):
+    """
+    Clusters pré-agregados para o viewport atual.
+    O payload é limitado pelo número de células visíveis, não pelo tamanho da tabela.
+    """
+    indice = obter_indice()
+    mascara = mascara_filtros(db, indice.snap, filtros)
+    clusters = indice.agrupar(zoom, mascara, espacial.parse_bbox(bbox))
 
     return {
-        "rede": uniq_filtered("rede"),
-        "tipo_cliente": uniq_filtered("tipo_cliente"),
-        "funil": uniq_filtered("funil"),
-        "representante": uniq_filtered("representante"),
-        "regiao": uniq_filtered("regiao"),
-        "responsavel": uniq_filtered("responsavel"),
-        "uf": uniq_filtered("uf"),
+        "zoom": min(zoom, MAX_ZOOM_CLUSTER),
+        "total": sum(c["quantidade"] for c in clusters),
+        "clusters": clusters,
     }
 
-@app.get("/api/vendas/dados")
-def get_vendas_dados(
-    rede: Optional[List[str]] = Query(None),
-    tipo_cliente: Optional[List[str]] = Query(None),
-    funil: Optional[List[str]] = Query(None),
-    representante: Optional[List[str]] = Query(None),
-    regiao: Optional[List[str]] = Query(None),
-    responsavel: Optional[List[str]] = Query(None),
-    uf: Optional[List[str]] = Query(None),
-    data_inicio: Optional[date] = Query(None),
-    data_fim: Optional[date] = Query(None),
-    valor_min: Optional[float] = Query(None),
-    valor_max: Optional[float] = Query(None),
-    busca_texto: Optional[str] = Query(None),
+
+@app.get("/api/vendas/heatmap")
+def get_vendas_heatmap(
+    zoom: int = Query(..., ge=0, le=22),
+    bbox: Optional[str] = Query(None, description="minLon,minLat,maxLon,maxLat"),
+    peso: str = Query("quantidade", description="quantidade | valor"),
+    filtros: dict = Depends(filtros_vendas),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+    cache: dict = Depends(cache_dados)
+):
+    """
+    Grade de densidade pronta para o L.heatLayer: [[lat, lon, intensidade], ...].
+    Sem filtros usa as grades pré-calculadas pelo ETL.
+    """
+    if peso not in heatmap.PESOS:
+        raise HTTPException(status_code=400, detail=f"peso deve ser um de {heatmap.PESOS}")
+    zoom = min(zoom, heatmap.MAX_ZOOM)
+
+    if tem_filtros(filtros):
+        snap = obter_snapshot()
+        grade = heatmap.grade_filtrada(snap, mascara_filtros(db, snap, filtros), zoom)
+    else:
+        grade = heatmap.grade_completa(zoom)
+
+    return heatmap.recortar(grade, zoom, espacial.parse_bbox(bbox), peso)
+
+# -------------------------------
+# 7. VECTOR TILES (MVT)
+# -------------------------------
+CAMADAS_TILE = {"clientes"}
+cache_tiles = tiles.CacheTiles()
+
+@app.get("/tiles/{layer}/{z}/{x}/{y}.pbf")
+def get_tile(
+    layer: str,
+    z: int,
+    x: int,
+    y: int,
+    filtros: dict = Depends(filtros_vendas),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+    cache: dict = Depends(cache_dados)
+):
+    """
+    Tile MVT com os clientes visíveis (aceita os mesmos filtros de /api/vendas/dados).
+    ETag da versão do dataset, como nos endpoints de dados: um ETL novo invalida o tile no cliente.
+    """
+    if layer not in CAMADAS_TILE:
+        raise HTTPException(status_code=404, detail="Camada desconhecida")
+    if not tiles.tile_valido(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile fora do intervalo")
+
+    chave = (versao_dataset(), layer, z, x, y, chave_filtros(filtros))
+    pbf = cache_tiles.get(chave)
+    if pbf is None:
+        min_lon, min_lat, max_lon, max_lat = tiles.tile_bbox(z, x, y)
+        query = db.query(
+            Cliente.id, Cliente.longitude, Cliente.latitude, Cliente.rede,
+            Cliente.tipo_cliente, Cliente.funil, Cliente.uf, Cliente.valor_venda,
+        )
+        query = apply_filters_to_query(query, **filtros).filter(
+            Cliente.longitude.between(min_lon, max_lon),
+            Cliente.latitude.between(min_lat, max_lat),
+        )
+        feicoes = (
+            (c.id, c.longitude, c.latitude, {
+                "rede": c.rede, "tipo_cliente": c.tipo_cliente, "funil": c.funil,
+                "uf": c.uf, "valor_venda": c.valor_venda,
+            })
+            for c in query
+        )
+        pbf = tiles.codificar_camada(layer, feicoes, z, x, y)
+        cache_tiles.set(chave, pbf)
+
+    return cache_http.aplicar(Response(content=pbf, media_type=tiles.MEDIA_TYPE), cache)
+# -------------------------------
+# 8. PROXIMIDADE (KD-TREE)
+# -------------------------------
+def ponto_origem(lat, lon, loja_id, unidade_id):
+    """Resolve a origem da busca: um ponto (lat/lon) ou uma loja/unidade pelo id."""
+    informados = [lat is not None and lon is not None, loja_id is not None, unidade_id is not None]
+    if sum(informados) != 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe lat e lon, ou loja_id, ou unidade_id",
+        )
+    if informados[0]:
+        return {"latitude": lat, "longitude": lon}
+
+    origem, origem_id = ("loja", loja_id) if loja_id is not None else ("unidade", unidade_id)
+    try:
+        encontrados = proximidade.carregar_origens(origem, origem_id)
+    except proximidade.FonteIndisponivel as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    if not encontrados:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{origem.capitalize()} não encontrada ou sem coordenadas")
+    return {"tipo": origem, **encontrados[0]}
+
+def _com_distancia(registros, km):
+    for registro, d in zip(registros, km):
+        registro["distancia_km"] = round(float(d), 3)
+    return registros
+
+@app.get("/api/vendas/nearby")
+def get_vendas_nearby(
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    loja_id: Optional[int] = Query(None, description="Origem: id de LojaRede (backend_redes)"),
+    unidade_id: Optional[int] = Query(None, description="Origem: id de UnidadeComercial (backend_uc)"),
+    k: int = Query(10, ge=1, le=1000, description="Quantidade de vizinhos (ignorado com raio_km)"),
+    raio_km: Optional[float] = Query(None, gt=0, le=20040, description="Todas as vendas até esta distância"),
+    fields: Optional[str] = Query(None, description="Colunas separadas por vírgula"),
+    filtros: dict = Depends(filtros_vendas),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Vendas mais próximas de um ponto, loja ou unidade (aceita os filtros de /api/vendas/dados):
+    as `k` mais próximas ou, com `raio_km`, todas dentro do raio — ordenadas pela distância
+    haversine, devolvida em `distancia_km`.
+    """
+    origem = ponto_origem(lat, lon, loja_id, unidade_id)
+    campos = parse_fields(fields)
+    snap = obter_snapshot()
+    indice = proximidade.obter_indice_vizinhos(snap)
+    mascara = mascara_filtros(db, snap, filtros)
+
+    if raio_km is not None:
+        idx, km = indice.no_raio(origem["latitude"], origem["longitude"], raio_km, mascara)
+    else:
+        idx, km = indice.k_mais_proximos(origem["latitude"], origem["longitude"], k, mascara)
+
+    return {
+        "origem": origem,
+        "total": len(idx),
+        "vendas": _com_distancia(snap.registros(idx, campos), km),
+    }
+
+@app.get("/api/vendas/nearby/lote")
+def get_vendas_nearby_lote(
+    origem: str = Query("loja", pattern="^(loja|unidade)$"),
+    raio_km: Optional[float] = Query(None, gt=0, le=20040, description="Conta também as vendas dentro do raio"),
+    filtros: dict = Depends(filtros_vendas),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    query = db.query(Cliente)
-    query = apply_filters_to_query(
-        query, rede, tipo_cliente, funil, representante, regiao, responsavel, uf,
-        data_inicio, data_fim, valor_min, valor_max, busca_texto
+    """
+    Venda mais próxima (id e distância) de cada loja de rede ou unidade comercial,
+    calculada para todas de uma vez; com `raio_km`, também quantas vendas há no raio.
+    """
+    try:
+        origens = proximidade.carregar_origens(origem)
+    except proximidade.FonteIndisponivel as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+    snap = obter_snapshot()
+    indice = proximidade.obter_indice_vizinhos(snap)
+    idx, km, contagem = indice.mais_proximo_de_cada(
+        np.array([o["latitude"] for o in origens], dtype=np.float64),
+        np.array([o["longitude"] for o in origens], dtype=np.float64),
+        mascara_filtros(db, snap, filtros),
+        raio_km,
     )
-    
-    return query.all()
\ No newline at end of file
+
+    for i, o in enumerate(origens):
+        achou = idx[i] >= 0
+        o["cliente_id"] = int(snap.ids[idx[i]]) if achou else None
+        o["distancia_km"] = round(float(km[i]), 3) if achou else None
+        if contagem is not None:
+            o["vendas_no_raio"] = int(contagem[i])
+    return origens
@@ -0,0 +1,60 @@
+# migracoes.py
+"""
+Migração de schema: garante que o banco tenha as tabelas e os índices declarados nos models.
+- create_all só cria tabelas novas; colunas e índices adicionados depois em tabelas
+  existentes são criados aqui (colunas via ALTER TABLE ADD COLUMN, sempre anuláveis).
+- Índices "ix_*" que não estão mais declarados são removidos.
+- Roda ANALYZE quando algo muda, para o planner do SQLite usar as estatísticas novas.
+Idempotente: pode ser chamada em todo startup da API e no fim de cada ETL.
+Com `indices=False` só cria tabelas e colunas (início de um ETL: índices depois da carga).
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from database import Base, engine
+import models  # registra as tabelas no Base.metadata
+
+
+def aplicar_migracoes(bind=engine, indices=True):
+    Base.metadata.create_all(bind=bind)
+    colunas, criados, removidos = [], [], []
+
+    with bind.begin() as conn:
+        insp = inspect(conn)
+        for tabela in Base.metadata.sorted_tables:
+            presentes = {c["name"] for c in insp.get_columns(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name not in presentes:
+                    ddl = CreateColumn(coluna).compile(dialect=conn.dialect)
+                    conn.execute(text(f'ALTER TABLE "{tabela.name}" ADD COLUMN {ddl}'))
+                    colunas.append(f"{tabela.name}.{coluna.name}")
+
+            if not indices:
+                continue
+            existentes = {i["name"] for i in insp.get_indexes(tabela.name)}
+            declarados = {i.name for i in tabela.indexes}
+
+            for indice in tabela.indexes:
+                if indice.name not in existentes:
+                    indice.create(conn)
+                    criados.append(indice.name)
+
+            for nome in sorted(existentes - declarados):
+                if nome.startswith("ix_"):
+                    conn.execute(text(f'DROP INDEX "{nome}"'))
+                    removidos.append(nome)
+
+        if colunas or criados or removidos:
+            conn.execute(text("ANALYZE"))
+
+    if colunas:
+        print(f"🧩 Colunas adicionadas: {', '.join(colunas)}")
+    if criados:
+        print(f"🗂️  Índices criados: {', '.join(criados)}")
+    if removidos:
+        print(f"🗑️  Índices removidos: {', '.join(removidos)}")
+    return criados, removidos
+
+
+if __name__ == "__main__":
+    aplicar_migracoes()
@@ -1,7 +1,10 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Float, Date # 💡 Importe Date ou DateTime
+from sqlalchemy import Column, Integer, String, Float, Date, Index, text # 💡 Importe Date ou DateTime
 from database import Base
 
+# Todas as consultas da API exigem coordenadas; índices parciais só guardam essas linhas
+COM_COORDENADAS = text("latitude IS NOT NULL AND longitude IS NOT NULL")
+
 class Cliente(Base):
     __tablename__ = "clientes"
 
@@ -25,10 +28,29 @@ class Cliente(Base):
     cidade = Column(String)
     uf = Column(String)
     cep = Column(String)
+    # Código IBGE do município, pelo point-in-polygon do ETL (ver geografia.py)
+    codigo_municipio = Column(String)
 
     # Debug e rastreio
     endereco_usado_geocode = Column(String)
+    # Hash da linha da planilha de origem (carga incremental, ver incremental.py)
+    hash_origem = Column(String)
 
     # Coordenadas finais
     latitude = Column(Float)
     longitude = Column(Float)
+
+    # Índices para as combinações de filtro usadas pela API (ver migracoes.py)
+    __table_args__ = (
+        Index("ix_clientes_rede", "rede", "data", sqlite_where=COM_COORDENADAS),
+        Index("ix_clientes_uf", "uf", "data", sqlite_where=COM_COORDENADAS),
+        Index("ix_clientes_regiao", "regiao", sqlite_where=COM_COORDENADAS),
+        Index("ix_clientes_funil", "funil", sqlite_where=COM_COORDENADAS),
+        Index("ix_clientes_tipo_cliente", "tipo_cliente", sqlite_where=COM_COORDENADAS),
+        Index("ix_clientes_representante", "representante", sqlite_where=COM_COORDENADAS),
+        Index("ix_clientes_responsavel", "responsavel", sqlite_where=COM_COORDENADAS),
+        Index("ix_clientes_data", "data", sqlite_where=COM_COORDENADAS),
+        Index("ix_clientes_valor_venda", "valor_venda", sqlite_where=COM_COORDENADAS),
+        # Recorte por viewport (tiles)
+        Index("ix_clientes_lon_lat", "longitude", "latitude"),
+    )
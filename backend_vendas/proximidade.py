@@ -0,0 +1,150 @@
+# proximidade.py
+"""
+Busca por proximidade (/api/vendas/nearby): vendas mais próximas de um ponto, de uma
+loja de rede (backend_redes) ou de uma unidade comercial (backend_uc).
+- KD-tree (scipy cKDTree) sobre os pontos do snapshot projetados na esfera unitária (x, y, z):
+  a distância euclidiana (corda) cresce junto com a distância haversine, então k-vizinhos
+  e raio são exatos, sem as distorções de uma árvore em graus.
+- Construída uma vez por versão do banco, como os índices de clusters e facetas.
+- Modo lote: a venda mais próxima de todas as lojas/unidades numa única consulta vetorizada.
+- Os bancos das outras APIs são lidos em modo read-only; caminhos em LEDAX_DB_REDES / LEDAX_DB_UC.
+"""
+
+import os
+import numpy as np
+from scipy.spatial import cKDTree
+from sqlalchemy import text
+from armazenamento import criar_engine_leitura
+from database import BASE_DIR
+from snapshot import CachePorVersao
+
+RAIO_TERRA_KM = 6371.0088
+
+_RAIZ = os.path.dirname(BASE_DIR)
+DB_REDES = os.getenv("LEDAX_DB_REDES", os.path.join(_RAIZ, "backend_redes", "data", "ledax_redes.db"))
+DB_UC = os.getenv("LEDAX_DB_UC", os.path.join(_RAIZ, "backend_uc", "data", "unidades.db"))
+
+# origem -> (banco, tabela, coluna com o nome exibido)
+ORIGENS = {
+    "loja": (DB_REDES, "lojas_rede", "loja"),
+    "unidade": (DB_UC, "unidades_comerciais", "nome"),
+}
+
+
+class FonteIndisponivel(Exception):
+    pass
+
+
+# ---------------------------
+# Geometria
+# ---------------------------
+def unitarios(lat, lon):
+    """lat/lon (graus) -> vetores (n, 3) na esfera unitária."""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+def km_para_corda(km):
+    return 2.0 * np.sin(np.minimum(km / RAIO_TERRA_KM, np.pi) / 2.0)
+
+def corda_para_km(corda):
+    return 2.0 * RAIO_TERRA_KM * np.arcsin(np.clip(np.asarray(corda) / 2.0, 0.0, 1.0))
+
+
+# ---------------------------
+# Índice
+# ---------------------------
+class IndiceVizinhos:
+    def __init__(self, snap):
+        self.snap = snap
+        self.pontos = unitarios(snap.lat, snap.lon)
+        self.arvore = cKDTree(self.pontos)
+
+    def k_mais_proximos(self, lat, lon, k, mascara=None):
+        """(posições no snapshot, distâncias em km) das k vendas mais próximas, em ordem."""
+        n = len(self.snap)
+        total = n if mascara is None else int(mascara.sum())
+        k = min(k, total)
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        alvo = unitarios([lat], [lon])[0]
+        # Com filtros, pede mais vizinhos até sobrarem k que passam na máscara
+        pedir = k
+        while True:
+            corda, idx = self.arvore.query(alvo, k=min(pedir, n))
+            corda, idx = np.atleast_1d(corda), np.atleast_1d(idx)
+            if mascara is not None:
+                passam = mascara[idx]
+                corda, idx = corda[passam], idx[passam]
+            if len(idx) >= k or pedir >= n:
+                return idx[:k], corda_para_km(corda[:k])
+            pedir *= 4
+
+    def no_raio(self, lat, lon, raio_km, mascara=None):
+        """(posições, distâncias em km) de todas as vendas a até `raio_km`, da mais próxima para a mais distante."""
+        alvo = unitarios([lat], [lon])[0]
+        idx = np.asarray(self.arvore.query_ball_point(alvo, km_para_corda(raio_km)), dtype=np.int64)
+        if mascara is not None:
+            idx = idx[mascara[idx]]
+        km = corda_para_km(np.linalg.norm(self.pontos[idx] - alvo, axis=1))
+        ordem = np.argsort(km, kind="stable")
+        return idx[ordem], km[ordem]
+
+    def mais_proximo_de_cada(self, lat, lon, mascara=None, raio_km=None):
+        """
+        Para cada ponto de `lat`/`lon`: posição da venda mais próxima (-1 se não houver),
+        distância em km e, com `raio_km`, quantas vendas estão dentro do raio.
+        """
+        if mascara is None:
+            arvore, posicoes = self.arvore, None
+        else:
+            posicoes = np.flatnonzero(mascara)
+            arvore = cKDTree(self.pontos[posicoes])
+        n = len(lat)
+        contagem = np.zeros(n, dtype=np.int64) if raio_km is not None else None
+        if arvore.n == 0 or n == 0:
+            return np.full(n, -1, dtype=np.int64), np.full(n, np.nan), contagem
+
+        alvos = unitarios(lat, lon)
+        corda, idx = arvore.query(alvos, k=1)
+        if posicoes is not None:
+            idx = posicoes[idx]
+        if raio_km is not None:
+            contagem = arvore.query_ball_point(alvos, km_para_corda(raio_km), return_length=True)
+        return idx, corda_para_km(corda), contagem
+
+
+_cache = CachePorVersao(IndiceVizinhos)
+
+
+def obter_indice_vizinhos(snap=None):
+    return _cache.obter(snap)
+
+
+# ---------------------------
+# Lojas e unidades (bancos das outras APIs)
+# ---------------------------
+_engines = {}
+
+def _engine(caminho):
+    if not os.path.exists(caminho):
+        raise FonteIndisponivel(f"Banco não encontrado: {caminho}")
+    if caminho not in _engines:
+        _engines[caminho] = criar_engine_leitura(caminho)
+    return _engines[caminho]
+
+
+def carregar_origens(origem, origem_id=None):
+    """Lojas ou unidades com coordenadas (só a de `origem_id`, se informado) como lista de dicts."""
+    caminho, tabela, coluna_nome = ORIGENS[origem]
+    sql = (
+        f"SELECT id, rede, {coluna_nome} AS nome, latitude, longitude FROM {tabela} "
+        "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    )
+    parametros = {}
+    if origem_id is not None:
+        sql += " AND id = :id"
+        parametros["id"] = origem_id
+    with _engine(caminho).connect() as conn:
+        return [dict(linha._mapping) for linha in conn.execute(text(sql + " ORDER BY id"), parametros)]
@@ -0,0 +1,240 @@
+# snapshot.py
+"""
+Snapshot colunar em memória da tabela `clientes` (só linhas com coordenadas).
+- Uma única query carrega todas as colunas em arrays NumPy:
+  strings codificadas por dicionário (código int32 por linha), datas como dias
+  desde 1970 (int32) e números como float64 com máscara de nulos.
+- É recarregado automaticamente quando o ledax.db muda (ver versao_dataset).
+- Avalia os filtros de intervalo e a busca textual como máscaras booleanas
+  vetorizadas, e monta as respostas de /api/vendas/dados sem hidratar o ORM.
+- Serve de base para os índices derivados (clusters, heatmap, facetas...).
+"""
+
+import re
+import threading
+from datetime import date
+import numpy as np
+from sqlalchemy import String
+from database import SessionLeitura, versao_dataset
+from models import Cliente
+from formatos import ColunaDicionario
+
+COLUNAS_FACETA = ("rede", "tipo_cliente", "funil", "representante", "regiao", "responsavel", "uf")
+# Mesmas colunas do filtro `busca_texto` em apply_filters_to_query
+COLUNAS_BUSCA = ("titulo", "endereco_cliente", "local_de_entrega", "cidade", "uf", "rede")
+# hash_origem é controle interno da carga incremental: fica fora das respostas
+COLUNAS = [c.name for c in Cliente.__table__.columns if c.name != "hash_origem"]
+COLUNAS_TEXTO = [c for c in COLUNAS if isinstance(Cliente.__table__.c[c].type, String)]
+
+# Colunas guardadas como arrays numéricos próprios (nome da coluna -> atributo)
+_NUMERICAS = {"id": "ids", "latitude": "lat", "longitude": "lon"}
+
+DATA_NULA = np.iinfo(np.int32).min
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def codificar_dicionario(valores, n):
+    """Codifica uma coluna de strings: (códigos int32, lista de valores distintos)."""
+    dicionario = {}
+    codigos = np.fromiter((dicionario.setdefault(v, len(dicionario)) for v in valores), dtype=np.int32, count=n)
+    return codigos, list(dicionario)
+
+
+def data_para_dias(d):
+    return d.toordinal() - _EPOCH
+
+
+_TABELA_LOWER = {c: c + 32 for c in range(ord("A"), ord("Z") + 1)}
+
+def _lower_ascii(txt):
+    # O lower() do SQLite (usado pelo ILIKE) só converte A-Z; replicamos para dar o mesmo resultado
+    return txt.translate(_TABELA_LOWER)
+
+
+def _padrao_like(termo):
+    """Converte o termo do ILIKE '%TERMO%' em regex (respeitando os curingas % e _)."""
+    corpo = "".join(".*" if ch == "%" else "." if ch == "_" else re.escape(ch) for ch in _lower_ascii(termo))
+    return re.compile(corpo, re.DOTALL)
+
+
+class SnapshotClientes:
+    def __init__(self, versao, ids, lat, lon, valor, valor_nulo, data_dias, codigos, dicionarios):
+        self.versao = versao
+        self.ids = ids                  # int64, ordenado
+        self.lat = lat                  # float64
+        self.lon = lon                  # float64
+        self.valor = valor              # float64 (NULL -> 0.0, ver valor_nulo)
+        self.valor_nulo = valor_nulo    # bool
+        self.data_dias = data_dias      # int32 (NULL -> DATA_NULA)
+        self.codigos = codigos          # coluna de texto -> int32[n]
+        self.dicionarios = dicionarios  # coluna de texto -> [valor do código 0, 1, ...]
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------------------------
+    # Máscaras vetorizadas
+    # ---------------------------
+    def mascara_ids(self, ids):
+        """Máscara booleana com True para as linhas cujo id está em `ids`."""
+        ids = np.fromiter(ids, dtype=np.int64)
+        return np.isin(self.ids, ids, assume_unique=True)
+
+    def mascara_intervalos(self, data_inicio=None, data_fim=None, valor_min=None, valor_max=None):
+        """Filtros de data e valor; nulos nunca passam (igual ao SQL)."""
+        mascara = np.ones(len(self), dtype=bool)
+        if data_inicio or data_fim:
+            mascara &= self.data_dias != DATA_NULA
+            if data_inicio:
+                mascara &= self.data_dias >= data_para_dias(data_inicio)
+            if data_fim:
+                mascara &= self.data_dias <= data_para_dias(data_fim)
+        if valor_min is not None or valor_max is not None:
+            mascara &= ~self.valor_nulo
+            if valor_min is not None:
+                mascara &= self.valor >= valor_min
+            if valor_max is not None:
+                mascara &= self.valor <= valor_max
+        return mascara
+
+    def mascara_bbox(self, bbox):
+        """Pontos dentro de (min_lon, min_lat, max_lon, max_lat), bordas inclusas (igual ao BETWEEN)."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        return (self.lon >= min_lon) & (self.lon <= max_lon) & (self.lat >= min_lat) & (self.lat <= max_lat)
+
+    def mascara_texto(self, busca_texto):
+        """
+        Equivalente ao ILIKE '%TERMO%' nas COLUNAS_BUSCA: o teste de substring roda
+        só sobre os valores distintos de cada coluna e é propagado pelos códigos.
+        """
+        padrao = _padrao_like(busca_texto.upper())
+        mascara = np.zeros(len(self), dtype=bool)
+        for col in COLUNAS_BUSCA:
+            dicionario = self.dicionarios[col]
+            achados = [c for c, v in enumerate(dicionario) if v and padrao.search(_lower_ascii(str(v)))]
+            if achados:
+                mascara |= np.isin(self.codigos[col], achados)
+        return mascara
+
+    # ---------------------------
+    # Saída
+    # ---------------------------
+    def _lista(self, col, idx):
+        """Valores da coluna `col` nas linhas `idx` como lista Python (tipos JSON nativos)."""
+        if col in _NUMERICAS:
+            return getattr(self, _NUMERICAS[col])[idx].tolist()
+        if col == "valor_venda":
+            return np.where(self.valor_nulo[idx], None, self.valor[idx]).tolist()
+        if col == "data":
+            dias = self.data_dias[idx]
+            nulas = dias == DATA_NULA
+            datas = np.where(nulas, 0, dias).astype("datetime64[D]").astype(str)
+            return np.where(nulas, None, datas).tolist()
+        dicionario = np.empty(len(self.dicionarios[col]), dtype=object)
+        dicionario[:] = self.dicionarios[col]
+        return dicionario[self.codigos[col][idx]].tolist()
+
+    def registros(self, idx, campos=None):
+        """Linhas `idx` como dicts (por padrão com todos os campos do modelo Cliente)."""
+        campos = campos or COLUNAS
+        colunas = [self._lista(c, idx) for c in campos]
+        return [dict(zip(campos, valores)) for valores in zip(*colunas)]
+
+    def colunas(self, idx, categoricas=(), campos=None):
+        """Linhas `idx` em formato colunar (ver formatos.py); as `categoricas` saem por dicionário."""
+        saida = {}
+        for col in campos or COLUNAS:
+            if col in _NUMERICAS:
+                saida[col] = getattr(self, _NUMERICAS[col])[idx]
+                continue
+            if col == "valor_venda":
+                saida[col] = np.where(self.valor_nulo[idx], np.nan, self.valor[idx])
+                continue
+            if col == "data":
+                usados, codigos = np.unique(self.data_dias[idx], return_inverse=True)
+                valores = [None if d == DATA_NULA else str(np.datetime64(int(d), "D")) for d in usados]
+            else:
+                usados, codigos = np.unique(self.codigos[col][idx], return_inverse=True)
+                valores = [self.dicionarios[col][c] for c in usados]
+            saida[col] = ColunaDicionario(codigos, valores) if col in categoricas else [valores[c] for c in codigos]
+        return saida
+
+
+def carregar_snapshot(versao=None):
+    db = SessionLeitura()
+    try:
+        linhas = (
+            db.query(*(getattr(Cliente, c) for c in COLUNAS))
+            .filter(Cliente.latitude != None, Cliente.longitude != None)
+            .order_by(Cliente.id)
+            .all()
+        )
+    finally:
+        db.close()
+
+    n = len(linhas)
+    pos = {c: i for i, c in enumerate(COLUNAS)}
+
+    def coluna(nome):
+        i = pos[nome]
+        return (l[i] for l in linhas)
+
+    ids = np.fromiter(coluna("id"), dtype=np.int64, count=n)
+    lat = np.fromiter(coluna("latitude"), dtype=np.float64, count=n)
+    lon = np.fromiter(coluna("longitude"), dtype=np.float64, count=n)
+
+    valor = np.fromiter((v if v is not None else np.nan for v in coluna("valor_venda")), dtype=np.float64, count=n)
+    valor_nulo = np.isnan(valor)
+    valor = np.nan_to_num(valor)
+
+    data_dias = np.fromiter(
+        (data_para_dias(d) if d is not None else DATA_NULA for d in coluna("data")), dtype=np.int32, count=n
+    )
+
+    codigos, dicionarios = {}, {}
+    for col in COLUNAS_TEXTO:
+        codigos[col], dicionarios[col] = codificar_dicionario(coluna(col), n)
+
+    return SnapshotClientes(versao, ids, lat, lon, valor, valor_nulo, data_dias, codigos, dicionarios)
+
+
+_lock = threading.Lock()
+_atual = None
+
+
+def obter_snapshot():
+    """Retorna o snapshot da versão atual do banco, recarregando se o arquivo mudou."""
+    global _atual
+    versao = versao_dataset()
+    snap = _atual
+    if snap is not None and snap.versao == versao:
+        return snap
+    with _lock:
+        if _atual is None or _atual.versao != versao:
+            _atual = carregar_snapshot(versao)
+        return _atual
+
+
+class CachePorVersao:
+    """
+    Guarda um objeto derivado do snapshot (índice de clusters, facetas...)
+    e o reconstrói quando a versão do banco muda.
+    """
+
+    def __init__(self, construir):
+        self.construir = construir
+        self._lock = threading.Lock()
+        self._objeto = None
+        self._versao = None
+
+    def obter(self, snap=None):
+        """Objeto derivado de `snap` (por padrão, o snapshot da versão atual)."""
+        if snap is None:
+            snap = obter_snapshot()
+        if self._objeto is not None and self._versao == snap.versao:
+            return self._objeto
+        with self._lock:
+            if self._objeto is None or self._versao != snap.versao:
+                self._objeto = self.construir(snap)
+                self._versao = snap.versao
+            return self._objeto
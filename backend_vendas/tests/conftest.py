@@ -0,0 +1,46 @@
+# conftest.py
+"""
+Os módulos do backend são importados pelo nome (como no uvicorn/etl, rodando da pasta
+backend_vendas). Rodar com `python -m pytest` de dentro de backend_vendas.
+
+Os testes usam uma cópia de data/ledax.db numa pasta temporária (LEDAX_DATA_DIR) e um
+geocache temporário: o banco versionado nunca é alterado.
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Antes de qualquer import de database.py
+_TMP = tempfile.mkdtemp(prefix="ledax-testes-")
+atexit.register(shutil.rmtree, _TMP, ignore_errors=True)
+shutil.copy(os.path.join(BACKEND_DIR, "data", "ledax.db"), os.path.join(_TMP, "ledax.db"))
+os.environ["LEDAX_DATA_DIR"] = _TMP
+os.environ["LEDAX_GEOCACHE_DB"] = os.path.join(_TMP, "geocache.db")
+
+
+@pytest.fixture(scope="session")
+def app_main():
+    import main
+    return main
+
+
+@pytest.fixture(scope="session")
+def cliente(app_main):
+    """TestClient da API (sobe com o evento de startup: migrações, FTS, R*Tree, cubo)."""
+    from fastapi.testclient import TestClient
+    with TestClient(app_main.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def auth(app_main):
+    token = app_main.create_access_token({"sub": "admin"})
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,151 @@
+# test_agendador.py
+"""Retry com backoff e circuit breaker do Provedor, com relógio falso (sem esperas reais)."""
+
+import pytest
+
+import agendador
+from agendador import CircuitoAberto, FalhaTransitoria, Provedor
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def monotonic(self):
+        return self.agora
+
+    def sleep(self, segundos):
+        self.agora += segundos
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(agendador, "time", relogio)  # o agendador só usa time.monotonic e time.sleep
+    return relogio
+
+
+class Servico:
+    """Função chamada pelo provedor: falha (transitória) enquanto houver falhas na fila."""
+
+    def __init__(self, falhas=0, erro=FalhaTransitoria):
+        self.falhas = falhas
+        self.erro = erro
+        self.chamadas = 0
+
+    def __call__(self, x):
+        self.chamadas += 1
+        if self.falhas:
+            self.falhas -= 1
+            raise self.erro("fora do ar")
+        return x * 2
+
+
+def provedor(**kwargs):
+    return Provedor("teste", **{"backoff_s": 0, "pausa_circuito_s": 30.0, **kwargs})
+
+
+def test_repete_falha_transitoria_ate_dar_certo(relogio):
+    servico = Servico(falhas=2)
+    assert provedor(tentativas=3).chamar(servico, 21) == 42
+    assert servico.chamadas == 3
+
+
+def test_desiste_apos_ultima_tentativa(relogio):
+    servico = Servico(falhas=10)
+    with pytest.raises(FalhaTransitoria):
+        provedor(tentativas=3).chamar(servico, 1)
+    assert servico.chamadas == 3
+
+
+def test_erro_nao_transitorio_sobe_sem_repetir(relogio):
+    servico = Servico(falhas=1, erro=ValueError)
+    with pytest.raises(ValueError):
+        provedor(tentativas=3).chamar(servico, 1)
+    assert servico.chamadas == 1
+
+
+def test_backoff_exponencial(relogio):
+    servico = Servico(falhas=2)
+    inicio = relogio.agora
+    provedor(tentativas=3, backoff_s=1.0).chamar(servico, 1)
+    # 1 * (1..1,5) + 2 * (1..1,5) de jitter
+    assert 3.0 <= relogio.agora - inicio <= 4.5
+
+
+def test_circuito_abre_e_falha_na_hora(relogio):
+    p = provedor(tentativas=1, limite_falhas=3)
+    servico = Servico(falhas=3)
+    for _ in range(3):
+        with pytest.raises(FalhaTransitoria):
+            p.chamar(servico, 1)
+    with pytest.raises(CircuitoAberto):
+        p.chamar(servico, 1)
+    assert servico.chamadas == 3  # aberto: o serviço nem é chamado
+
+    relogio.agora += 29.0
+    with pytest.raises(CircuitoAberto):
+        p.chamar(servico, 1)
+    assert servico.chamadas == 3
+
+
+def test_circuito_aberto_interrompe_as_tentativas(relogio):
+    servico = Servico(falhas=10)
+    with pytest.raises(CircuitoAberto):
+        provedor(tentativas=5, limite_falhas=2).chamar(servico, 1)
+    assert servico.chamadas == 2
+
+
+def test_teste_apos_pausa_fecha_com_sucesso(relogio):
+    p = provedor(tentativas=1, limite_falhas=2)
+    servico = Servico(falhas=2)
+    for _ in range(2):
+        with pytest.raises(FalhaTransitoria):
+            p.chamar(servico, 1)
+
+    relogio.agora += 30.0
+    assert p.chamar(servico, 5) == 10  # o teste passa e fecha o circuito
+    servico.falhas = 1
+    with pytest.raises(FalhaTransitoria):
+        p.chamar(servico, 1)
+    assert p.chamar(servico, 1) == 2  # fechado: uma falha isolada não reabre
+    assert servico.chamadas == 5
+
+
+def test_teste_apos_pausa_reabre_com_falha(relogio):
+    p = provedor(tentativas=1, limite_falhas=2)
+    servico = Servico(falhas=3)
+    for _ in range(2):
+        with pytest.raises(FalhaTransitoria):
+            p.chamar(servico, 1)
+
+    relogio.agora += 30.0
+    with pytest.raises(FalhaTransitoria):
+        p.chamar(servico, 1)  # o teste falha: uma falha basta para reabrir
+    with pytest.raises(CircuitoAberto):
+        p.chamar(servico, 1)
+    assert servico.chamadas == 3
+
+    relogio.agora += 30.0
+    assert p.chamar(servico, 1) == 2
+
+
+def test_provedor_inativo_nao_chama(relogio):
+    servico = Servico()
+    with pytest.raises(CircuitoAberto):
+        provedor(ativo=False).chamar(servico, 1)
+    assert servico.chamadas == 0
+
+
+def test_intervalo_minimo_entre_chamadas(relogio):
+    p = provedor(intervalo_s=1.2)
+    inicio = relogio.agora
+    for _ in range(3):
+        p.chamar(Servico(), 1)
+    assert relogio.agora - inicio == pytest.approx(2.4)
+
+
+def test_mapear_mantem_a_ordem():
+    itens = list(range(50))
+    assert list(agendador.mapear(lambda x: x * x, itens, 8)) == [x * x for x in itens]
+    assert list(agendador.mapear(lambda x: x * x, itens, 1)) == [x * x for x in itens]
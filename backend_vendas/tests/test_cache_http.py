@@ -0,0 +1,51 @@
+# test_cache_http.py
+"""GET condicional: ETag da versão do dataset, 304 e invalidação por um ETL novo."""
+
+from database import nova_versao_dataset
+
+URL = "/api/vendas/dados?limit=5&fields=id,rede"
+
+
+def test_etag_e_cache_control(cliente, auth):
+    r = cliente.get(URL, headers=auth)
+    assert r.status_code == 200
+    assert r.headers["etag"].startswith('"')
+    assert r.headers["cache-control"] == "private, no-cache"
+    assert "Accept" in r.headers["vary"]
+
+
+def test_304_com_etag_atual(cliente, auth):
+    etag = cliente.get(URL, headers=auth).headers["etag"]
+    r = cliente.get(URL, headers={**auth, "If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == etag
+
+
+def test_if_none_match_fraco_lista_e_curinga(cliente, auth):
+    etag = cliente.get(URL, headers=auth).headers["etag"]
+    for valor in (f"W/{etag}", f'"outro", {etag}', "*"):
+        assert cliente.get(URL, headers={**auth, "If-None-Match": valor}).status_code == 304
+
+
+def test_etag_muda_com_query_e_accept(cliente, auth):
+    base = cliente.get(URL, headers=auth).headers["etag"]
+    assert cliente.get(URL + "&funil=Ganho", headers=auth).headers["etag"] != base
+    msgpack = cliente.get(URL, headers={**auth, "Accept": "application/x-msgpack"})
+    assert msgpack.headers["etag"] != base
+    r = cliente.get(URL, headers={**auth, "If-None-Match": base, "Accept": "application/x-msgpack"})
+    assert r.status_code == 200
+
+
+def test_nova_versao_invalida(cliente, auth):
+    antigo = cliente.get(URL, headers=auth).headers["etag"]
+    nova_versao_dataset()
+    r = cliente.get(URL, headers={**auth, "If-None-Match": antigo})
+    assert r.status_code == 200
+    assert r.headers["etag"] != antigo
+    assert cliente.get(URL, headers={**auth, "If-None-Match": r.headers["etag"]}).status_code == 304
+
+
+def test_304_nao_dispensa_login(cliente, auth):
+    etag = cliente.get(URL, headers=auth).headers["etag"]
+    assert cliente.get(URL, headers={"If-None-Match": etag}).status_code == 401
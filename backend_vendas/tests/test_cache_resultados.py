@@ -0,0 +1,141 @@
+# test_cache_resultados.py
+"""Single-flight do cache de resultados: faltas simultâneas da mesma chave calculam uma vez só."""
+
+import asyncio
+import threading
+import time
+
+from cache_resultados import CacheResultados, RespostaCacheada
+
+N = 8
+
+
+class Falhou(Exception):
+    pass
+
+
+def _esperar(condicao, limite_s=5.0):
+    fim = time.monotonic() + limite_s
+    while not condicao():
+        assert time.monotonic() < fim, "timeout esperando os seguidores"
+        time.sleep(0.001)
+
+
+def _em_paralelo(cache, calcular):
+    """Dispara N `obter` da mesma chave em threads; devolve os resultados (ou erros) de cada uma."""
+    resultados = [None] * N
+
+    def chamar(i):
+        try:
+            resultados[i] = cache.obter(("dados", "k"), calcular)
+        except Exception as e:
+            resultados[i] = e
+
+    threads = [threading.Thread(target=chamar, args=(i,)) for i in range(N)]
+    for t in threads:
+        t.start()
+    return threads, resultados
+
+
+def test_sync_calcula_uma_vez():
+    cache, liberar, chamadas = CacheResultados(), threading.Event(), []
+
+    def calcular():
+        chamadas.append(1)
+        liberar.wait(5)
+        return RespostaCacheada(b"[1]", "application/json")
+
+    threads, resultados = _em_paralelo(cache, calcular)
+    _esperar(lambda: cache.estatisticas()["coalescidas"] == N - 1)
+    liberar.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(chamadas) == 1
+    assert all(r is resultados[0] for r in resultados)
+    assert cache.obter(("dados", "k"), calcular) is resultados[0]  # agora é acerto
+    assert len(chamadas) == 1
+
+
+def test_sync_erro_vai_para_os_seguidores_e_nao_fica_no_cache():
+    cache, liberar, chamadas = CacheResultados(), threading.Event(), []
+
+    def calcular():
+        chamadas.append(1)
+        liberar.wait(5)
+        raise Falhou("sqlite ocupado")
+
+    threads, resultados = _em_paralelo(cache, calcular)
+    _esperar(lambda: cache.estatisticas()["coalescidas"] == N - 1)
+    liberar.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(chamadas) == 1
+    assert all(isinstance(r, Falhou) for r in resultados)
+    assert cache.estatisticas()["itens"] == 0
+
+    resposta = cache.obter(("dados", "k"), lambda: RespostaCacheada(b"ok", "text/plain"))
+    assert resposta.corpo == b"ok"  # a próxima requisição calcula de novo
+
+
+def test_async_calcula_uma_vez():
+    async def cenario():
+        cache, liberar, chamadas = CacheResultados(), asyncio.Event(), []
+
+        async def calcular():
+            chamadas.append(1)
+            await liberar.wait()
+            return RespostaCacheada(b"[1]", "application/json")
+
+        tarefas = [asyncio.create_task(cache.obter_async(("dados", "k"), calcular)) for _ in range(N)]
+        while cache.estatisticas()["coalescidas"] < N - 1:
+            await asyncio.sleep(0)
+        liberar.set()
+        resultados = await asyncio.gather(*tarefas)
+
+        assert len(chamadas) == 1
+        assert all(r is resultados[0] for r in resultados)
+        assert await cache.obter_async(("dados", "k"), calcular) is resultados[0]
+        assert len(chamadas) == 1
+
+    asyncio.run(asyncio.wait_for(cenario(), 5))
+
+
+def test_async_erro_vai_para_os_seguidores_e_nao_fica_no_cache():
+    async def cenario():
+        cache, liberar, chamadas = CacheResultados(), asyncio.Event(), []
+
+        async def calcular():
+            chamadas.append(1)
+            await liberar.wait()
+            raise Falhou("sqlite ocupado")
+
+        tarefas = [asyncio.create_task(cache.obter_async(("dados", "k"), calcular)) for _ in range(N)]
+        while cache.estatisticas()["coalescidas"] < N - 1:
+            await asyncio.sleep(0)
+        liberar.set()
+        resultados = await asyncio.gather(*tarefas, return_exceptions=True)
+
+        assert len(chamadas) == 1
+        assert all(isinstance(r, Falhou) for r in resultados)
+        assert cache.estatisticas()["itens"] == 0
+
+        async def ok():
+            return RespostaCacheada(b"ok", "text/plain")
+
+        assert (await cache.obter_async(("dados", "k"), ok)).corpo == b"ok"
+
+    asyncio.run(asyncio.wait_for(cenario(), 5))
+
+
+def test_chaves_diferentes_nao_coalescem():
+    cache, chamadas = CacheResultados(), []
+
+    def calcular():
+        chamadas.append(1)
+        return RespostaCacheada(b"x", "text/plain")
+
+    cache.obter(("dados", "a"), calcular)
+    cache.obter(("dados", "b"), calcular)
+    assert len(chamadas) == 2
@@ -0,0 +1,65 @@
+# test_diagnostico.py
+"""Modo debug de SQL (LEDAX_SQL_DEBUG): o EXPLAIN QUERY PLAN sai no log nos engines sync e async."""
+
+import asyncio
+import logging
+import pytest
+from sqlalchemy import text
+
+import diagnostico
+from armazenamento import criar_engine_async_leitura, criar_engine_leitura
+
+CONSULTA = text("SELECT id, rede FROM clientes WHERE id = :id")
+
+
+@pytest.fixture
+def db_path(app_main):
+    from database import DB_PATH
+    return DB_PATH
+
+
+@pytest.fixture
+def debug_ligado(monkeypatch, caplog):
+    monkeypatch.setattr(diagnostico, "SQL_DEBUG", "all")
+    caplog.set_level(logging.INFO, logger=diagnostico.logger.name)
+    return caplog
+
+
+def _planos(caplog):
+    return [r.getMessage().split("PLANO:", 1)[1] for r in caplog.records if "PLANO:" in r.getMessage()]
+
+
+def _verificar(caplog):
+    planos = _planos(caplog)
+    assert planos, "nenhuma consulta logada"
+    assert all("indisponível" not in p for p in planos), planos
+    assert any("SEARCH clientes USING INTEGER PRIMARY KEY" in p for p in planos), planos
+
+
+def test_plano_engine_sync(db_path, debug_ligado):
+    engine = criar_engine_leitura(db_path)
+    assert diagnostico.instrumentar(engine)
+    with engine.connect() as conn:
+        conn.execute(CONSULTA, {"id": 1}).all()
+    engine.dispose()
+    _verificar(debug_ligado)
+
+
+def test_plano_engine_async(db_path, debug_ligado):
+    engine = criar_engine_async_leitura(db_path)
+    assert diagnostico.instrumentar(engine.sync_engine)
+
+    async def consultar():
+        async with engine.connect() as conn:
+            (await conn.execute(CONSULTA, {"id": 1})).all()
+        await engine.dispose()
+
+    asyncio.run(consultar())
+    _verificar(debug_ligado)
+
+
+def test_desligado_nao_instrumenta(db_path, monkeypatch):
+    monkeypatch.setattr(diagnostico, "SQL_DEBUG", "")
+    engine = criar_engine_leitura(db_path)
+    assert not diagnostico.instrumentar(engine)
+    engine.dispose()
@@ -0,0 +1,58 @@
+# test_formatos.py
+"""Respostas colunares (msgpack/Arrow): ida e volta dos valores, inclusive os nulos."""
+
+import msgpack
+import numpy as np
+import pytest
+
+import formatos
+
+COLUNAS = {
+    "id": [1, 2, 3, 4],
+    "teve_venda": [True, None, False, True],
+    "valor_venda": [10.5, None, 0.0, -3.0],
+    "rede": formatos.ColunaDicionario.de_lista(["MATEUS", None, "ASSAÍ", "MATEUS"]),
+    "cidade": ["Salvador", None, "Feira de Santana", "Ilhéus"],
+}
+
+
+def _decodificar_msgpack(corpo):
+    payload = msgpack.unpackb(corpo, raw=False)
+    saida = {}
+    for nome, col in payload["colunas"].items():
+        if col["tipo"] == "dicionario":
+            codigos = np.frombuffer(col["codigos"], dtype="<i4")
+            saida[nome] = [col["valores"][c] for c in codigos]
+        elif col["tipo"] == "lista":
+            saida[nome] = col["dados"]
+        elif col["tipo"] == "uint8":
+            dados = np.frombuffer(col["dados"], dtype=np.uint8)
+            saida[nome] = [None if v == formatos.BOOL_NULO else bool(v) for v in dados]
+        else:
+            dados = np.frombuffer(col["dados"], dtype=np.dtype(col["tipo"]).newbyteorder("<"))
+            saida[nome] = [None if np.isnan(v) else v.item() for v in dados.astype(np.float64)]
+    return payload["n"], saida
+
+
+def _esperado():
+    return {nome: [v for v in (c.valores[i] for i in c.codigos)] if isinstance(c, formatos.ColunaDicionario) else c
+            for nome, c in COLUNAS.items()}
+
+
+def test_msgpack_ida_e_volta():
+    n, colunas = _decodificar_msgpack(formatos.codificar(COLUNAS, "msgpack"))
+    assert n == 4
+    assert colunas == _esperado()
+
+
+def test_msgpack_booleano_nulo_nao_vira_false():
+    col = msgpack.unpackb(formatos.codificar({"b": [None, False]}, "msgpack"))["colunas"]["b"]
+    assert col["tipo"] == "uint8"
+    assert list(np.frombuffer(col["dados"], dtype=np.uint8)) == [formatos.BOOL_NULO, 0]
+
+
+def test_arrow_ida_e_volta():
+    pa = pytest.importorskip("pyarrow")
+    tabela = pa.ipc.open_stream(formatos.codificar(COLUNAS, "arrow")).read_all()
+    assert tabela.schema.field("teve_venda").type == pa.bool_()
+    assert tabela.to_pydict() == _esperado()
@@ -0,0 +1,81 @@
+# test_gazetteer.py
+import numpy as np
+import pandas as pd
+import pytest
+import gazetteer
+
+
+@pytest.fixture(scope="module")
+def gaz():
+    return gazetteer.Gazetteer.carregar()
+
+
+# (nome, UF, código IBGE, latitude e longitude da sede)
+MUNICIPIOS = [
+    ("Salvador", "BA", 2927408, -12.9718, -38.5011),
+    ("São Paulo", "SP", 3550308, -23.5329, -46.6395),
+    ("Brasília", "DF", 5300108, -15.7795, -47.9297),
+    ("Rio de Janeiro", "RJ", 3304557, -22.9129, -43.2003),
+    ("Camaçari", "BA", 2905701, -12.6996, -38.3263),
+    ("Feira de Santana", "BA", 2910800, -12.2664, -38.9663),
+    ("Manaus", "AM", 1302603, -3.1190, -60.0217),
+    ("Porto Alegre", "RS", 4314902, -30.0318, -51.2065),
+]
+
+
+def test_tabela_ibge_completa(gaz):
+    assert len(gaz) == 5570
+    assert (gaz.mun_codigo > 0).all()
+    assert len(set(gaz.mun_codigo.tolist())) == 5570
+
+
+@pytest.mark.parametrize("nome, uf, codigo, lat, lon", MUNICIPIOS)
+def test_municipio_codigo_e_centroide(gaz, nome, uf, codigo, lat, lon):
+    achado = gaz.municipio(nome, uf)
+    assert achado is not None
+    assert achado[2] == codigo
+    assert achado[0] == pytest.approx(lat, abs=0.05)
+    assert achado[1] == pytest.approx(lon, abs=0.05)
+
+
+def test_municipio_nome_dobrado(gaz):
+    assert gaz.municipio("DIAS D'ÁVILA", "ba") == gaz.municipio("Dias d Avila", "BA")
+    assert gaz.municipio("Salvador", "SP") is None
+
+
+def test_prefixos_cep_validos(gaz):
+    assert (gaz.cep_pontos >= gazetteer.MIN_PONTOS_CEP).all()
+    for prefixo in gaz.cep_prefixo:
+        assert gazetteer.uf_do_cep(prefixo.ljust(8, "0")) is not None, prefixo
+
+
+@pytest.mark.parametrize("cep, uf", [
+    ("01310-100", "SP"), ("40020000", "BA"), ("68906000", "AP"), ("69301000", "RR"),
+    ("70040000", "DF"), ("72800000", "GO"), ("99999999", "RS"),
+    ("00248000", None), ("00999999", None), ("4002", None), (None, None),
+])
+def test_uf_do_cep(cep, uf):
+    assert gazetteer.uf_do_cep(cep) == uf
+
+
+def test_construir_descarta_pontos_invalidos_e_prefixos_fracos(tmp_path):
+    municipios = pd.DataFrame([{"codigo": 2927408, "nome": "Salvador", "uf": "BA", "lat": -12.97, "lon": -38.50}])
+    pontos = pd.DataFrame(
+        # 3 pontos bons em 41740
+        [{"cep": f"41740-46{i}", "uf": "BA", "lat": -12.96 + i * 1e-3, "lon": -38.41} for i in range(3)]
+        # faixa inexistente, UF trocada (erro de geocoding) e prefixo com um ponto só
+        + [{"cep": "00248000", "uf": "SP", "lat": -23.5, "lon": -46.6}]
+        + [{"cep": "41740460", "uf": "SP", "lat": -23.5, "lon": -46.6}] * 5
+        + [{"cep": "42800000", "uf": "BA", "lat": -12.7, "lon": -38.3}]
+    )
+    caminho = tmp_path / "gaz.npz"
+    gazetteer.construir(municipios, pontos, caminho=str(caminho), min_pontos=3)
+
+    gaz = gazetteer.Gazetteer.carregar(str(caminho))
+    assert sorted(gaz.cep_prefixo.tolist()) == ["417", "41740"]
+    assert (gaz.cep_pontos == 3).all()
+    lat, lon, prefixo = gaz.cep("41740-999")
+    assert prefixo == "41740"
+    assert lat == pytest.approx(-12.959, abs=1e-3) and lon == pytest.approx(-38.41, abs=1e-3)
+    assert gaz.cep("42800000") is None
+    assert np.isclose(gaz.municipio("Salvador", "BA")[0], -12.97)
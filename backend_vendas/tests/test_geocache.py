@@ -0,0 +1,107 @@
+# test_geocache.py
+"""Geocache SQLite: abertura preguiçosa, importação dos JSONs antigos e TTL dos negativos."""
+
+import json
+import os
+import sqlite3
+import time
+import pytest
+
+import geocache
+from geocache import Geocache
+
+DIA = 86400
+
+
+@pytest.fixture
+def caminho(tmp_path):
+    return str(tmp_path / "geocache.db")
+
+
+@pytest.fixture
+def legado(tmp_path):
+    caminho_json = tmp_path / "geocache_brasil.json"
+    caminho_json.write_text(json.dumps({
+        "BRASILAPI::40000000": {"lat": -12.97, "lon": -38.5, "cidade": "Salvador", "uf": "BA"},
+        "NOMINATIM::RUA A, 1, SALVADOR": {"lat": -12.9, "lon": -38.4, "address": "Rua A, 1"},
+        "CITY_CENTER::Lapa, BA": {"lat": None, "lon": None},
+        "DESCONHECIDA": [1, 2],
+    }), encoding="utf-8")
+    return str(caminho_json)
+
+
+def _linhas(caminho):
+    with sqlite3.connect(caminho) as conn:
+        return conn.execute("SELECT COUNT(*) FROM geocache").fetchone()[0]
+
+
+def test_padrao_vem_do_ambiente():
+    assert geocache.GEOCACHE_DB == os.environ["LEDAX_GEOCACHE_DB"]
+
+
+def test_criar_nao_grava_nada(caminho):
+    cache = Geocache(caminho)
+    assert not os.path.exists(caminho)
+    assert cache.obter("CIDADE", "Lapa, BA") is None
+    assert os.path.exists(caminho)
+
+
+def test_nao_importa_legados_sozinho(caminho, legado, monkeypatch):
+    monkeypatch.setattr(geocache, "JSONS_LEGADOS", [legado])
+    assert len(Geocache(caminho)) == 0
+
+
+def test_importacao_idempotente(caminho, legado):
+    cache = Geocache(caminho)
+    assert cache.importar_legados([legado]) == 3
+    assert cache.importar_legados([legado]) == 0
+    assert _linhas(caminho) == 3
+
+    # Outra instância (outra carga do ETL) lê o banco e também não duplica
+    outra = Geocache(caminho)
+    assert outra.importar_legados([legado]) == 0
+    assert _linhas(caminho) == 3
+    assert outra.obter("BRASILAPI", "40000-000")["cidade"] == "Salvador"
+    assert outra.obter("NOMINATIM", "rua a,  1, salvador")["endereco"] == "Rua A, 1"
+
+
+def test_importacao_mantem_valor_existente(caminho, legado):
+    cache = Geocache(caminho)
+    cache.gravar("BRASILAPI", "40000000", -1.0, -2.0, cidade="Outra", uf="BA")
+    cache.salvar()
+    assert cache.importar_legados([legado]) == 2
+    assert cache.obter("BRASILAPI", "40000000")["lat"] == -1.0
+
+
+def test_negativo_expira_pelo_ttl(caminho):
+    cache = Geocache(caminho, ttl_negativo_s=30 * DIA)
+    agora = time.time()
+    cache.gravar("CIDADE", "Recente, BA", criado_em=agora - 29 * DIA)
+    cache.gravar("CIDADE", "Vencido, BA", criado_em=agora - 31 * DIA)
+    cache.gravar("CIDADE", "Antigo, BA", -12.0, -40.0, criado_em=agora - 365 * DIA)
+    cache.salvar()
+
+    for c in (cache, Geocache(caminho, ttl_negativo_s=30 * DIA)):
+        assert c.obter("CIDADE", "Recente, BA") == {
+            "lat": None, "lon": None, "endereco": None, "cidade": None, "uf": None,
+        }
+        assert c.obter("CIDADE", "Vencido, BA") is None  # volta a ser tentado
+        assert c.obter("CIDADE", "Antigo, BA")["lat"] == -12.0  # positivo não expira
+
+
+def test_legado_importado_conta_para_o_ttl(caminho, legado):
+    velho = time.time() - 60 * DIA
+    os.utime(legado, (velho, velho))
+    cache = Geocache(caminho, ttl_negativo_s=30 * DIA)
+    cache.importar_legados([legado])
+    assert cache.obter("CIDADE", "Lapa, BA") is None
+    assert cache.obter("BRASILAPI", "40000000") is not None
+
+
+def test_vale_a_gravacao_mais_recente(caminho):
+    cache = Geocache(caminho)
+    cache.gravar("NOMINATIM", "x", criado_em=time.time())
+    cache.gravar("NOMINATIM", "x", 1.0, 2.0)
+    cache.salvar()
+    assert Geocache(caminho).obter("NOMINATIM", "X")["lat"] == 1.0
+    assert _linhas(caminho) == 2
@@ -0,0 +1,137 @@
+# test_geografia.py
+"""Point-in-polygon em lote (faixas de latitude + ray casting) contra a verificação ingênua."""
+
+import json
+import numpy as np
+import pytest
+
+import geografia
+from geografia import CamadaPoligonos
+
+
+def _dentro_do_anel(x, y, anel):
+    """Ray casting clássico contra todas as arestas do anel, sem índice (vetorizado nos pontos)."""
+    dentro = np.zeros(len(x), dtype=bool)
+    pts = [tuple(p[:2]) for p in anel]
+    for (x1, y1), (x2, y2) in zip(pts, pts[1:] + pts[:1]):
+        if y1 == y2:
+            continue
+        cruza = (y1 > y) != (y2 > y)
+        dentro ^= cruza & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+    return dentro
+
+
+def forca_bruta(features, lon, lat):
+    """Primeira feição com paridade ímpar somando os anéis (buracos e partes do multipolígono)."""
+    lon, lat = np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+    resultado = np.full(len(lon), -1)
+    for i, f in enumerate(features):
+        paridade = np.zeros(len(lon), dtype=bool)
+        for anel in geografia._aneis(f["geometry"]):
+            paridade ^= _dentro_do_anel(lon, lat, anel)
+        resultado[(resultado == -1) & paridade] = i
+    return resultado
+
+
+def quadrado(x0, y0, lado):
+    return [[x0, y0], [x0 + lado, y0], [x0 + lado, y0 + lado], [x0, y0 + lado], [x0, y0]]
+
+
+FEICOES = [
+    # Polígono com buraco: quadrado 0..10 sem o miolo 4..6
+    {"properties": {"nome": "anel"}, "geometry": {"type": "Polygon", "coordinates": [
+        quadrado(0, 0, 10), quadrado(4, 4, 2)[::-1],
+    ]}},
+    # Multipolígono: duas ilhas, uma delas dentro do buraco do anel
+    {"properties": {"nome": "ilhas"}, "geometry": {"type": "MultiPolygon", "coordinates": [
+        [quadrado(20, 0, 3)],
+        [quadrado(4.5, 4.5, 1)],
+    ]}},
+    # Triângulo com arestas inclinadas cruzando várias faixas
+    {"properties": {"nome": "triangulo"}, "geometry": {"type": "Polygon", "coordinates": [
+        [[30, 0], [40, 7.3], [33, 9.9], [30, 0]],
+    ]}},
+]
+
+
+@pytest.mark.parametrize("ponto, esperado", [
+    ((1, 1), 0),
+    ((5, 5), 1),        # no buraco do anel, mas dentro da ilha do multipolígono
+    ((4.2, 4.2), -1),   # no buraco, fora da ilha
+    ((5.9, 4.1), -1),
+    ((21, 2), 1),
+    ((9.999, 9.999), 0),
+    ((10.001, 5), -1),
+    ((33, 5), 2),
+    ((-5, 5), -1),
+])
+def test_casos_sinteticos(ponto, esperado):
+    camada = CamadaPoligonos(FEICOES)
+    assert camada.localizar([ponto[0]], [ponto[1]])[0] == esperado
+
+
+def test_sintetico_igual_a_forca_bruta():
+    rng = np.random.default_rng(7)
+    lon, lat = rng.uniform(-2, 42, 5000), rng.uniform(-2, 12, 5000)
+    camada = CamadaPoligonos(FEICOES)
+    np.testing.assert_array_equal(camada.localizar(lon, lat), forca_bruta(FEICOES, lon, lat))
+
+
+def test_pontos_invalidos_e_camada_vazia():
+    camada = CamadaPoligonos(FEICOES)
+    assert list(camada.localizar([np.nan, 1.0], [1.0, np.inf])) == [-1, -1]
+    assert list(CamadaPoligonos([]).localizar([1.0], [1.0])) == [-1]
+
+
+@pytest.fixture(scope="module")
+def estados():
+    with open(geografia.GEOJSON_ESTADOS, encoding="utf-8") as f:
+        return json.load(f)["features"]
+
+
+def test_estados_perto_das_divisas_igual_a_forca_bruta(estados):
+    """Pontos a ~10 m dos vértices das divisas (os casos difíceis), comparados com a verificação ingênua."""
+    rng = np.random.default_rng(42)
+    vertices = np.concatenate([
+        np.asarray(anel, dtype=np.float64)[:, :2]
+        for f in estados for anel in geografia._aneis(f["geometry"])
+    ])
+    amostra = vertices[rng.choice(len(vertices), 400, replace=False)]
+    pontos = np.repeat(amostra, 3, axis=0) + rng.normal(0, 1e-4, (len(amostra) * 3, 2))
+    lon, lat = pontos[:, 0], pontos[:, 1]
+
+    obtido = CamadaPoligonos(estados).localizar(lon, lat)
+    np.testing.assert_array_equal(obtido, forca_bruta(estados, lon, lat))
+    assert (obtido >= 0).sum() > len(obtido) // 3  # a amostra cai mesmo dentro dos estados
+
+
+@pytest.mark.parametrize("lon, lat, uf, regiao", [
+    (-38.5014, -12.9714, "BA", "Nordeste"),    # Salvador
+    (-46.6333, -23.5505, "SP", "Sudeste"),     # São Paulo
+    (-60.0217, -3.1190, "AM", "Norte"),        # Manaus
+    (-47.8825, -15.7942, "DF", "Centro-Oeste"),
+    (-51.2177, -30.0346, "RS", "Sul"),
+    (-40.8, -9.4, "BA", "Nordeste"),           # Juazeiro, à beira do São Francisco (divisa BA/PE)
+    (-40.5, -9.38, "PE", "Nordeste"),          # Petrolina, do outro lado
+    (-58.3816, -34.6037, None, None),          # Buenos Aires
+    (-30.0, -10.0, None, None),                # Atlântico
+])
+def test_localizar_estados(lon, lat, uf, regiao):
+    ufs, regioes = geografia.localizar_estados(np.array([lon]), np.array([lat]))
+    assert (ufs[0], regioes[0]) == (uf, regiao)
+
+
+def test_sem_camada_de_municipios_retorna_none(tmp_path):
+    codigos, nomes = geografia.localizar_municipios(np.array([-38.5]), np.array([-12.97]), str(tmp_path / "nao.geojson"))
+    assert list(codigos) == [None] and list(nomes) == [None]
+
+
+def test_camada_de_municipios_opcional(tmp_path):
+    caminho = tmp_path / "municipios.geojson"
+    caminho.write_text(json.dumps({"features": [
+        {"properties": {"CD_MUN": "2927408", "NM_MUN": "Salvador"},
+         "geometry": {"type": "Polygon", "coordinates": [quadrado(-38.7, -13.1, 0.4)]}},
+    ]}), encoding="utf-8")
+    codigos, nomes = geografia.localizar_municipios(np.array([-38.5, -40.0]), np.array([-12.97, -12.97]), str(caminho))
+    assert list(codigos) == ["2927408", None]
+    assert list(nomes) == ["Salvador", None]
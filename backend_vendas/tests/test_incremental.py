@@ -0,0 +1,131 @@
+# test_incremental.py
+import pandas as pd
+import pytest
+from sqlalchemy import Column, Float, Integer, String, create_engine, select
+from sqlalchemy.orm import declarative_base
+import incremental
+
+Base = declarative_base()
+
+
+class Registro(Base):
+    __tablename__ = "registros"
+    id = Column(Integer, primary_key=True)
+    hash_origem = Column(String)
+    latitude = Column(Float)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def carregar(engine, linhas):
+    """linhas: [(id, hash, latitude)]"""
+    with engine.begin() as conn:
+        conn.execute(Registro.__table__.insert(), [
+            {"id": i, "hash_origem": h, "latitude": lat} for i, h, lat in linhas
+        ])
+
+
+def ids(engine):
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(Registro.id)).scalars())
+
+
+# ---------------------------
+# hash_linha
+# ---------------------------
+def test_hash_ignora_colunas_nao_lidas_e_espacos():
+    a = pd.Series({"nome": "Loja  Centro ", "cep": 41740460, "extra": "x"})
+    b = pd.Series({"nome": "Loja Centro", "cep": 41740460, "extra": "y"})
+    assert incremental.hash_linha(a, ["nome", "cep"]) == incremental.hash_linha(b, ["nome", "cep"])
+
+
+def test_hash_muda_com_o_conteudo():
+    a = pd.Series({"nome": "Loja", "valor": 10.0})
+    b = pd.Series({"nome": "Loja", "valor": 10.5})
+    assert incremental.hash_linha(a, ["nome", "valor"]) != incremental.hash_linha(b, ["nome", "valor"])
+
+
+def test_hash_vazios_equivalentes():
+    colunas = ["nome", "data", "valor"]
+    a = pd.Series({"nome": "", "data": pd.NaT, "valor": float("nan")})
+    b = pd.Series({"nome": None, "data": None, "valor": None})
+    c = pd.Series({})  # coluna ausente na planilha
+    assert incremental.hash_linha(a, colunas) == incremental.hash_linha(b, colunas) == incremental.hash_linha(c, colunas)
+
+
+def test_hash_datas_e_numpy():
+    a = pd.Series({"data": pd.Timestamp("2024-05-01"), "n": pd.Series([3]).iloc[0]})
+    b = pd.Series({"data": pd.Timestamp("2024-05-01"), "n": 3})
+    assert incremental.hash_linha(a, ["data", "n"]) == incremental.hash_linha(b, ["data", "n"])
+
+
+# ---------------------------
+# planejar / apagar
+# ---------------------------
+def test_planejar_sem_mudancas(engine):
+    carregar(engine, [(1, "a", 1.0), (2, "b", 1.0)])
+    with engine.connect() as conn:
+        assert incremental.planejar(conn, Registro, ["a", "b"]) == ([], [])
+
+
+def test_planejar_nova_alterada_e_sumida(engine):
+    carregar(engine, [(1, "a", 1.0), (2, "b", 1.0), (3, "c", 1.0)])
+    # "b" mudou para "b2", "c" sumiu, "d" é nova
+    with engine.connect() as conn:
+        inserir, apagar = incremental.planejar(conn, Registro, ["a", "b2", "d"])
+    assert inserir == [1, 2]
+    assert sorted(apagar) == [2, 3]
+
+
+def test_planejar_multiconjunto(engine):
+    # Duas linhas idênticas no banco, três na planilha: só uma entra
+    carregar(engine, [(1, "a", 1.0), (2, "a", 1.0)])
+    with engine.connect() as conn:
+        assert incremental.planejar(conn, Registro, ["a", "a", "a"]) == ([2], [])
+    # Uma só na planilha: um dos registros sai
+    with engine.connect() as conn:
+        inserir, apagar = incremental.planejar(conn, Registro, ["a"])
+    assert inserir == [] and len(apagar) == 1
+
+
+def test_planejar_sem_hash_ou_sem_coordenada_recarrega(engine):
+    # Registro antigo (sem hash) e geocoding que falhou (sem latitude) voltam a ser processados
+    carregar(engine, [(1, None, 1.0), (2, "b", None), (3, "c", 1.0)])
+    with engine.connect() as conn:
+        inserir, apagar = incremental.planejar(conn, Registro, ["a", "b", "c"])
+    assert inserir == [0, 1]
+    assert sorted(apagar) == [1, 2]
+
+
+def test_planejar_completo(engine):
+    carregar(engine, [(1, "a", 1.0), (2, "b", 1.0)])
+    with engine.connect() as conn:
+        inserir, apagar = incremental.planejar(conn, Registro, ["a", "b"], completo=True)
+    assert inserir == [0, 1]
+    assert sorted(apagar) == [1, 2]
+
+
+def test_apagar_em_lotes(engine, monkeypatch):
+    monkeypatch.setattr(incremental, "LOTE_DELETE", 3)
+    carregar(engine, [(i, f"h{i}", 1.0) for i in range(1, 11)])
+    with engine.begin() as conn:
+        incremental.apagar(conn, Registro, [1, 2, 3, 4, 5, 6, 7])
+    assert ids(engine) == [8, 9, 10]
+
+
+def test_apagar_desfeito_com_rollback(engine):
+    carregar(engine, [(1, "a", 1.0), (2, "b", 1.0)])
+    with pytest.raises(RuntimeError):
+        with engine.begin() as conn:
+            incremental.apagar(conn, Registro, [1, 2])
+            raise RuntimeError("falha no meio da carga")
+    assert ids(engine) == [1, 2]
+
+
+def test_resumo():
+    assert "2 novas/alteradas, 1 removidas, 8 inalteradas" in incremental.resumo(10, [0, 1], [5])
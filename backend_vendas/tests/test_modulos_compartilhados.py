@@ -0,0 +1,41 @@
+# test_modulos_compartilhados.py
+"""
+Os módulos comuns existem como cópias idênticas em cada backend (cada imagem Docker só
+enxerga a sua pasta). O original fica em backend_vendas: alterou aqui, copie para os outros.
+"""
+
+import filecmp
+import os
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAIZ = os.path.dirname(BACKEND_DIR)
+
+# arquivo (relativo ao backend) -> backends que têm a cópia, além de backend_vendas
+COMPARTILHADOS = {
+    "armazenamento.py": ("backend_uc", "backend_redes"),
+    "cache_http.py": ("backend_uc", "backend_redes"),
+    "espacial.py": ("backend_uc", "backend_redes"),
+    "formatos.py": ("backend_uc", "backend_redes"),
+    "geocache.py": ("backend_uc", "backend_redes"),
+    "incremental.py": ("backend_uc", "backend_redes"),
+    "migracoes.py": ("backend_uc", "backend_redes"),
+    "streaming.py": ("backend_uc", "backend_redes"),
+    "tiles.py": ("backend_uc", "backend_redes"),
+    "gazetteer.py": ("backend_uc",),
+    "geodistancia.py": ("backend_uc",),
+    os.path.join("data", "gazetteer.npz"): ("backend_uc",),
+}
+
+CASOS = [(arquivo, backend) for arquivo, backends in COMPARTILHADOS.items() for backend in backends]
+
+
+@pytest.mark.parametrize("arquivo, backend", CASOS, ids=[f"{b}/{a}" for a, b in CASOS])
+def test_copia_identica(arquivo, backend):
+    copia = os.path.join(RAIZ, backend, arquivo)
+    if not os.path.isdir(os.path.join(RAIZ, backend)):
+        pytest.skip(f"{backend} fora desta árvore (ex.: imagem Docker só do backend_vendas)")
+    assert os.path.exists(copia), f"{backend}/{arquivo} não existe"
+    assert filecmp.cmp(os.path.join(BACKEND_DIR, arquivo), copia, shallow=False), (
+        f"{backend}/{arquivo} divergiu de backend_vendas/{arquivo}: aplique a mudança nas cópias"
+    )
@@ -0,0 +1,31 @@
+# test_tiles.py
+import tiles
+from database import nova_versao_dataset
+
+# Tile z10 sobre Salvador (onde está a maior parte das vendas)
+TILE = "/tiles/clientes/10/402/549.pbf"
+
+
+def test_tile_mvt(cliente, auth):
+    r = cliente.get(TILE, headers=auth)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == tiles.MEDIA_TYPE
+    assert r.content  # tem feições
+
+
+def test_tile_revalida_pela_versao_do_dataset(cliente, auth):
+    r = cliente.get(TILE, headers=auth)
+    etag = r.headers["etag"]
+    assert r.headers["cache-control"] == "private, no-cache"
+    assert cliente.get(TILE, headers={**auth, "If-None-Match": etag}).status_code == 304
+
+    # Depois de um ETL o tile antigo não vale mais
+    nova_versao_dataset()
+    r = cliente.get(TILE, headers={**auth, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+
+
+def test_tile_fora_do_intervalo(cliente, auth):
+    assert cliente.get("/tiles/clientes/2/9/0.pbf", headers=auth).status_code == 404
+    assert cliente.get("/tiles/outra/2/1/1.pbf", headers=auth).status_code == 404